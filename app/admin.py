@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import MealLog, Profile, Recipe, Nutrition
+from .models import MealLog, Profile, Recipe, Nutrition, FoodAlias, UnresolvedLabel, DailyTotals
 
 admin.site.register(MealLog)
 admin.site.register(Recipe)
@@ -12,3 +12,25 @@ class ProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'sex', 'age', 'height_cm', 'weight_kg', 'created_at')
     search_fields = ('user__username', 'user__email')
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(FoodAlias)
+class FoodAliasAdmin(admin.ModelAdmin):
+    list_display = ('alias', 'recipe', 'nutrition', 'created_at')
+    search_fields = ('alias', 'recipe__name', 'nutrition__ingredient')
+    raw_id_fields = ('recipe', 'nutrition')
+
+
+@admin.register(UnresolvedLabel)
+class UnresolvedLabelAdmin(admin.ModelAdmin):
+    list_display = ('label', 'count', 'first_seen', 'last_seen')
+    search_fields = ('label',)
+    readonly_fields = ('label', 'count', 'first_seen', 'last_seen')
+
+
+@admin.register(DailyTotals)
+class DailyTotalsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'local_date', 'calories', 'meal_count', 'goal_achieved', 'updated_at')
+    list_filter = ('goal_achieved',)
+    search_fields = ('user__username',)
+    readonly_fields = ('updated_at',)
@@ -0,0 +1,172 @@
+import re
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import metrics
+from .models import Recipe, Nutrition, FoodAlias, UnresolvedLabel
+
+# shared cache key bumped whenever a recipe, ingredient or alias changes
+ALIAS_VERSION_KEY = 'alias_index_version'
+
+Resolved = namedtuple('Resolved', ['kind', 'pk', 'name'])  # kind: 'recipe' or 'ingredient'
+
+_SEPARATORS = re.compile(r'[\s_\-]+')
+
+
+def normalize_label(label):
+    """Canonical lookup key: lower-case, '_'/'-'/whitespace collapsed to one space."""
+    words = _SEPARATORS.split(str(label).strip().lower())
+    return ' '.join(w for w in words if w)
+
+
+def _candidates(key):
+    """The key, then plural/singular spellings of its last word to try against the known labels.
+
+    Nothing is inflected on the index side: 'cookies' finds 'cookie' (drop 's'),
+    'tomatoes' finds 'tomato' (drop 'es'), 'berries' finds 'berry' ('ies' -> 'y'), and
+    'pea' finds 'peas', but only when that spelling is actually a known label.
+    """
+    yield key
+    head, _, last = key.rpartition(' ')
+    prefix = head + ' ' if head else ''
+    if len(last) > 3 and last.endswith('s') and not last.endswith('ss'):
+        forms = [last[:-1]]
+        if last.endswith('es'):
+            forms.append(last[:-2])
+        if last.endswith('ies'):
+            forms.append(last[:-3] + 'y')
+    else:
+        forms = [last + 's', last + 'es']
+    for form in forms:
+        yield prefix + form
+
+
+class AliasIndex:
+    """In-memory normalized label -> Recipe/Nutrition index.
+
+    - Built once per worker from Recipe names/slugs, Nutrition ingredients and FoodAlias
+      rows (3 queries); recipes win over ingredients and explicit aliases win over both.
+    - Reloaded when the shared version counter changes (bumped by model signals), and
+      in any case once it is ALIAS_INDEX_MAX_AGE seconds old, so edits whose bump this
+      worker cannot see (per-process cache, another process) still arrive.
+    - Unresolved labels are counted in UnresolvedLabel only (nothing per label is kept in
+      memory, since labels come from clients).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._loaded_at = 0.0
+
+    def _current_version(self):
+        try:
+            return cache.get(ALIAS_VERSION_KEY, 0)
+        except Exception:
+            return None
+
+    def _fresh(self, version):
+        max_age = getattr(settings, 'ALIAS_INDEX_MAX_AGE', 60)
+        return (self._index is not None and version == self._version
+                and time.monotonic() - self._loaded_at < max_age)
+
+    def ensure_loaded(self):
+        version = self._current_version()
+        if self._fresh(version):
+            return self._index
+        with self._lock:
+            if not self._fresh(version):
+                index = {}
+                for pk, ingredient in Nutrition.objects.order_by().values_list('id', 'ingredient'):
+                    index[normalize_label(ingredient)] = Resolved('ingredient', pk, ingredient)
+                for pk, name, slug in Recipe.objects.order_by().values_list('id', 'name', 'slug'):
+                    for key in (name, slug):
+                        if key:
+                            index[normalize_label(key)] = Resolved('recipe', pk, name)
+                aliases = FoodAlias.objects.order_by().values_list('alias', 'recipe_id', 'recipe__name', 'nutrition_id', 'nutrition__ingredient')
+                for alias, recipe_id, recipe_name, nutrition_id, ingredient in aliases:
+                    if recipe_id:
+                        index[normalize_label(alias)] = Resolved('recipe', recipe_id, recipe_name)
+                    elif nutrition_id:
+                        index[normalize_label(alias)] = Resolved('ingredient', nutrition_id, ingredient)
+                self._index = index
+                self._version = version
+                self._loaded_at = time.monotonic()
+        return self._index
+
+    @staticmethod
+    def _find(index, label):
+        for key in _candidates(normalize_label(label)):
+            hit = index.get(key)
+            if hit is not None:
+                return hit
+        return None
+
+    def resolve(self, label):
+        """Return a Resolved(kind, pk, name) for the label or None."""
+        return self._find(self.ensure_loaded(), label)
+
+    def resolve_many(self, labels):
+        """Return ({label: Resolved}, [unresolved labels])."""
+        index = self.ensure_loaded()
+        found = {}
+        missing = []
+        for label in labels:
+            hit = self._find(index, label)
+            if hit is None:
+                missing.append(label)
+            else:
+                found[label] = hit
+        return found, missing
+
+    def report_unresolved(self, labels):
+        """Upsert unresolved labels (truncated to the column length) in two queries."""
+        max_length = UnresolvedLabel._meta.get_field('label').max_length
+        labels = sorted({str(l).strip()[:max_length] for l in labels if str(l).strip()})
+        if not labels:
+            return
+        try:
+            UnresolvedLabel.objects.bulk_create([UnresolvedLabel(label=l) for l in labels], ignore_conflicts=True)
+            UnresolvedLabel.objects.filter(label__in=labels).update(count=F('count') + 1, last_seen=timezone.now())
+        except Exception:
+            # reporting must never break meal saving
+            pass
+
+    def stats(self):
+        return {
+            'size': len(self._index) if self._index is not None else 0,
+            'version': self._version,
+            'unresolved': dict(UnresolvedLabel.objects.order_by('-count', 'label').values_list('label', 'count')[:20]),
+        }
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+        try:
+            cache.incr(ALIAS_VERSION_KEY)
+        except ValueError:
+            cache.set(ALIAS_VERSION_KEY, 1, None)
+        except Exception:
+            pass
+
+
+alias_index = AliasIndex()
+metrics.register('alias_index', alias_index.stats)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Nutrition)
+@receiver(post_delete, sender=Nutrition)
+@receiver(post_save, sender=FoodAlias)
+@receiver(post_delete, sender=FoodAlias)
+def invalidate_alias_index(sender, **kwargs):
+    alias_index.invalidate()
@@ -0,0 +1,167 @@
+import json
+from collections import OrderedDict
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .logs import MEAL_TYPES, calendar_grid, meal_type_for_hour
+from .models import MealLog
+from .timezones import local_today, user_timezone
+
+MEAL_ICONS = {'Breakfast': '🍳', 'Lunch': '🍛', 'Dinner': '🍽', 'Snack': '🍪', 'Other': '🍽'}
+MACROS = ('calories', 'protein_g', 'fat_g', 'carbs_g', 'fiber_g')
+
+
+def _zero():
+    return {k: 0.0 for k in MACROS}
+
+
+class HistoryPass:
+    """Accumulators for the history page, filled by one pass over the meals of a date window.
+
+    `add()` takes meals newest first and annotates those in the window with the fields
+    the templates read (`local_created`, `computed_type`, `computed_icon`), so every
+    timestamp is localized exactly once. Meals before `start_date` (the previous
+    period) only feed `prev_total`.
+    """
+
+    def __init__(self, start_date, today, tz):
+        self.start_date = start_date
+        self.today = today
+        self.tz = tz
+        self.logs = []
+        self.groups = OrderedDict()
+        self.per_day = {}
+        self.today_totals = _zero()
+        self.prev_total = 0.0
+        self.macros = {'protein_g': 0, 'fat_g': 0, 'carbs_g': 0}
+        self.meal_types = {k: 0.0 for k in MEAL_TYPES}
+        self.heatmap = [[0 for _ in range(24)] for _ in range(7)]
+
+    def add(self, log):
+        d = log.local_date
+        if d < self.start_date:
+            self.prev_total += log.calories
+            return
+        lt = timezone.localtime(log.created_at, self.tz)
+        bucket = meal_type_for_hour(lt.hour)
+        log.local_created = lt
+        log.computed_type = bucket
+        log.computed_icon = MEAL_ICONS.get(bucket, '🍽')
+        self.logs.append(log)
+        self.groups.setdefault(d, []).append(log)
+
+        day = self.per_day.get(d)
+        if day is None:
+            day = self.per_day[d] = _zero()
+        for k in MACROS:
+            v = getattr(log, k)
+            day[k] += v
+            if d == self.today:
+                self.today_totals[k] += v
+        for k in self.macros:
+            self.macros[k] += getattr(log, k)
+        self.meal_types[bucket] += log.calories
+        self.heatmap[lt.weekday()][lt.hour] += log.calories
+
+    def series(self, days):
+        out = []
+        for i in range(days):
+            d = self.start_date + timezone.timedelta(days=i)
+            day = self.per_day.get(d) or {}
+            out.append({
+                'date': d,
+                'calories': round(day.get('calories') or 0, 2),
+                'protein_g': round(day.get('protein_g') or 0, 2),
+                'fat_g': round(day.get('fat_g') or 0, 2),
+                'carbs_g': round(day.get('carbs_g') or 0, 2),
+            })
+        return out
+
+    def day_groups(self):
+        """Meals grouped by local day (newest first) with parsed items, hints and day totals."""
+        days = []
+        for d, items in self.groups.items():
+            meals = []
+            for log in items:
+                try:
+                    parsed_items = json.loads(log.items_json) if log.items_json else []
+                except Exception:
+                    parsed_items = []
+                hints = []
+                if log.calories and (log.protein_g * 4) < (log.calories * 0.1):
+                    hints.append('⚠️ Low protein')
+                if log.calories and (log.fat_g * 9) > (log.calories * 0.35):
+                    hints.append('⚠️ High fat')
+                # outside the meal-time windows the stored meal type is shown instead of 'Other'
+                computed_type = log.computed_type
+                if computed_type == 'Other':
+                    computed_type = getattr(log, 'meal_type', 'Other') or 'Other'
+                meals.append({
+                    'log': log,
+                    'items': parsed_items,
+                    'hints': hints,
+                    'icon': MEAL_ICONS.get(computed_type, '🍽'),
+                    'computed_type': computed_type,
+                    'local_time': log.local_created.strftime('%H:%M (%Z)'),
+                })
+            totals = self.per_day[d]
+            days.append({
+                'date': d,
+                'items': meals,
+                'total': {k: round(totals[k], 2) for k in MACROS},
+            })
+        return days
+
+    def meal_type_items(self):
+        items = [(k, round(self.meal_types[k], 1)) for k in MEAL_TYPES]
+        return [it for it in items if it[1] > 0]
+
+
+def day_flags(user, start_date, end_date):
+    """Per-day goal bookkeeping for start_date..end_date in one grouped query.
+
+    Returns {date: {'calories', 'pending', 'achieved'}}: the day's total, how many rows
+    still have no running total (running_calories == 0) and how many are flagged
+    day_goal_achieved. Days without meals are absent.
+    """
+    rows = (MealLog.objects.filter(user=user, local_date__gte=start_date, local_date__lte=end_date)
+            .values('local_date')
+            .annotate(calories=Sum('calories'),
+                      pending=Count('id', filter=Q(running_calories=0)),
+                      achieved=Count('id', filter=Q(day_goal_achieved=True)))
+            .order_by())
+    return {row.pop('local_date'): row for row in rows}
+
+
+def history_analytics(user, days, today=None, tz=None):
+    """Everything the history page shows for the last `days` local days, from one query and one pass.
+
+    The query covers the window plus the previous period of the same length (for the
+    comparison), bounded on the (user, local_date, created_at) index.
+    """
+    tz = tz or user_timezone(user)
+    today = today or local_today(tz)
+    start_date = today - timezone.timedelta(days=days - 1)
+    prev_start = start_date - timezone.timedelta(days=days)
+
+    acc = HistoryPass(start_date, today, tz)
+    rows = (MealLog.objects.filter(user=user, local_date__gte=prev_start, local_date__lte=today)
+            .order_by('-created_at'))
+    for log in rows.iterator(chunk_size=500):
+        acc.add(log)
+
+    series = acc.series(days)
+    return {
+        'start_date': start_date,
+        'today': today,
+        'logs': acc.logs,
+        'days': acc.day_groups(),
+        'series': series,
+        'total_today': {k: round(acc.today_totals[k], 2) for k in MACROS},
+        'prev_total': round(acc.prev_total, 2),
+        'macros_totals': acc.macros,
+        'meal_type_items': acc.meal_type_items(),
+        'hourly_heatmap': acc.heatmap,
+        'calendar_heatmap': calendar_grid(start_date, days, {s['date']: s['calories'] for s in series}),
+    }
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        # register signal receivers that keep the in-memory lookup tables, rollups and goal flags fresh
+        from . import aliases, goals, nutrition, recipe, recipe_nutrition, rollups  # noqa: F401
@@ -0,0 +1,246 @@
+import hashlib
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from . import metrics
+from .yolo import predict_foods as remote_predict_foods, dedupe_foods
+
+try:
+    from ultralytics import YOLO
+except ImportError:  # only needed by the in-process 'local' backend
+    YOLO = None
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class DetectionBackend:
+    """Interface every detection backend implements: `predict(image_path) -> [labels]`.
+
+    `cache_namespace` separates cached results of different backends in
+    `DetectionResult` (the remote backend keeps the plain image digest).
+    """
+    name = ''
+    cache_namespace = ''
+
+    def predict(self, image_path):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class RemoteBackend(DetectionBackend):
+    """The YOLO microservice over HTTP (`app.yolo.predict_foods`)."""
+    name = 'remote'
+
+    def predict(self, image_path):
+        return remote_predict_foods(image_path)
+
+
+class StandInBackend(RemoteBackend):
+    """The remote client pointed at a local stand-in (`manage.py yolo_standin`, load tests).
+
+    Its fake detections are cached under their own namespace so they are never
+    served to the real remote backend.
+    """
+    name = 'standin'
+    cache_namespace = 'standin'
+
+
+class StubBackend(DetectionBackend):
+    """Deterministic fake for tests and load tests: the same bytes always give the same labels.
+
+    DETECTION_STUB_LATENCY (seconds) simulates inference time.
+    """
+    name = 'stub'
+    cache_namespace = 'stub'
+    LABELS = ('rice', 'dal', 'chapati', 'sambar', 'idli', 'dosa', 'curd', 'paneer', 'chicken curry', 'salad')
+
+    def __init__(self, latency=None, labels=None):
+        self.latency = _setting('DETECTION_STUB_LATENCY', 0.0) if latency is None else latency
+        self.labels = tuple(labels or _setting('DETECTION_STUB_LABELS', None) or self.LABELS)
+
+    def predict(self, image_path):
+        with open(image_path, 'rb') as fh:
+            digest = hashlib.sha256(fh.read()).digest()
+        if self.latency:
+            time.sleep(self.latency)
+        count = 1 + digest[0] % 3
+        return dedupe_foods(self.labels[b % len(self.labels)] for b in digest[1:1 + count])
+
+
+class MicroBatcher:
+    """Collects concurrent single-image requests into one `batch_fn(paths)` call.
+
+    A worker thread takes the first queued request, waits up to `max_wait` seconds for
+    more (at most `max_batch`), runs one batch and resolves each caller's future.
+    """
+
+    def __init__(self, batch_fn, max_batch=8, max_wait=0.01):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, image_path):
+        self._ensure_worker()
+        fut = Future()
+        self._queue.put((image_path, fut))
+        return fut
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='detection-batcher', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            paths = [path for path, _ in batch]
+            try:
+                results = self.batch_fn(paths)
+                if len(results) != len(batch):
+                    raise RuntimeError(f'Batch of {len(batch)} images returned {len(results)} results')
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, fut), labels in zip(batch, results):
+                fut.set_result(labels)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch': round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+def _load_ultralytics(model_path):
+    if YOLO is None:
+        raise ImproperlyConfigured("DETECTION_BACKEND='local' needs the 'ultralytics' package")
+    model = YOLO(model_path)
+
+    def run(paths):
+        results = model.predict(paths, verbose=False)
+        return [[r.names[int(c)] for c in r.boxes.cls] for r in results]
+
+    return run
+
+
+class LocalBackend(DetectionBackend):
+    """In-process CPU inference from DETECTION_MODEL_PATH, loaded once per worker.
+
+    Concurrent scans are batched into one model call (DETECTION_BATCH_SIZE images,
+    waiting at most DETECTION_BATCH_WAIT_MS for the batch to fill). `loader(model_path)`
+    must return a callable mapping a list of image paths to a list of label lists.
+    """
+    name = 'local'
+    cache_namespace = 'local'
+
+    def __init__(self, model_path=None, loader=None, max_batch=None, max_wait_ms=None):
+        self.model_path = model_path or _setting('DETECTION_MODEL_PATH', '')
+        self.loader = loader or _load_ultralytics
+        self._lock = threading.Lock()
+        self._model = None
+        self.load_seconds = None
+        self.batcher = MicroBatcher(
+            self._run_batch,
+            max_batch=max_batch or _setting('DETECTION_BATCH_SIZE', 8),
+            max_wait=(_setting('DETECTION_BATCH_WAIT_MS', 10) if max_wait_ms is None else max_wait_ms) / 1000.0,
+        )
+
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    if not self.model_path:
+                        raise ImproperlyConfigured("DETECTION_BACKEND='local' needs DETECTION_MODEL_PATH")
+                    started = time.monotonic()
+                    self._model = self.loader(self.model_path)
+                    self.load_seconds = round(time.monotonic() - started, 3)
+                    logger.info('Loaded detection model %s in %.2fs', self.model_path, self.load_seconds)
+        return self._model
+
+    def _run_batch(self, paths):
+        return [dedupe_foods(labels) for labels in self.model()(paths)]
+
+    def predict(self, image_path):
+        return self.batcher.submit(image_path).result()
+
+    def stats(self):
+        return dict(self.batcher.stats(), model_path=self.model_path, load_seconds=self.load_seconds)
+
+
+BACKENDS = {
+    'remote': RemoteBackend,
+    'standin': StandInBackend,
+    'stub': StubBackend,
+    'local': LocalBackend,
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def register_backend(name, cls):
+    """Make a DetectionBackend subclass selectable via DETECTION_BACKEND."""
+    BACKENDS[name] = cls
+
+
+def get_backend(name=None):
+    """Per-process backend instance for `name` (default: settings.DETECTION_BACKEND)."""
+    name = name or _setting('DETECTION_BACKEND', 'remote')
+    backend = _instances.get(name)
+    if backend is None:
+        with _instances_lock:
+            backend = _instances.get(name)
+            if backend is None:
+                try:
+                    cls = BACKENDS[name]
+                except KeyError:
+                    raise ImproperlyConfigured(f"Unknown DETECTION_BACKEND {name!r}; choose from {sorted(BACKENDS)}")
+                backend = _instances[name] = cls()
+    return backend
+
+
+def predict_foods(image_path):
+    """Detect foods with the configured backend."""
+    return get_backend().predict(image_path)
+
+
+def stats():
+    return {
+        'backend': _setting('DETECTION_BACKEND', 'remote'),
+        'loaded': {name: backend.stats() for name, backend in _instances.items()},
+    }
+
+
+metrics.register('detection_backend', stats)
@@ -1,33 +1,16 @@
-from zoneinfo import ZoneInfo
-from django.utils import timezone
-from .logs import date_range_series
-
-TZ = ZoneInfo('Asia/Kolkata')
+from .streaks import current_streak, local_today
 
 
 def streak(request):
     """Context processor providing current streak for authenticated users.
     Streak definition: consecutive local-calendar days up to today with at least one meal logged.
+    The run is maintained incrementally by app.streaks, so a warm render costs no queries.
     """
     if not request.user or not request.user.is_authenticated:
         return {}
 
-    # check last 365 days (sane bound)
-    days = 365
-    series = date_range_series(request.user, days=days)
-    # build a set of ISO dates where calories > 0
-    active_dates = {s['date'].isoformat() for s in series if s['calories'] > 0}
-
-    # get today's local date
-    today = timezone.localtime(timezone.now(), TZ).date()
-    # compute streak backwards
-    streak_count = 0
-    for i in range(days):
-        d = (today - timezone.timedelta(days=i)).isoformat()
-        if d in active_dates:
-            streak_count += 1
-        else:
-            break
+    today = local_today(request.user.pk)
+    streak_count = current_streak(request.user.pk, today)
 
     # quick badge color ramp similar to leetcode (small, medium, large)
     if streak_count >= 30:
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import metrics
+from .models import DetectionResult
+from .backends import get_backend, predict_foods
+
+
+def file_sha256(path, chunk_size=1 << 16):
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(digest, namespace=''):
+    """`DetectionResult.sha256` for an image digest under a backend's cache namespace."""
+    if not namespace:
+        return digest
+    return hashlib.sha256(f'{namespace}:{digest}'.encode()).hexdigest()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one in-flight execution."""
+
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Run fn() once per key at a time; returns (result, shared) where shared means we waited."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+class DetectionCache:
+    """Content-addressed cache of detection results stored in `DetectionResult`.
+
+    - Keyed by SHA-256 of the image bytes, so re-uploads of the same photo skip inference.
+    - Entries expire after DETECTION_CACHE_TTL seconds. Each row records its payload
+      size and the table is kept under DETECTION_CACHE_MAX_BYTES, least recently used
+      rows first; the check runs when this worker's running size estimate goes over
+      budget, or every DETECTION_CACHE_EVICT_EVERY stores otherwise.
+    - Concurrent identical uploads share one in-flight lookup and inference call.
+    - Empty results are not stored (failures raise and are never stored either).
+    """
+
+    def __init__(self):
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._bytes = None          # estimated table size, re-read on every eviction pass
+        self._stores = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'DETECTION_CACHE_TTL', 7 * 24 * 3600)
+
+    @property
+    def max_bytes(self):
+        return getattr(settings, 'DETECTION_CACHE_MAX_BYTES', 8 * 1024 * 1024)
+
+    @property
+    def evict_every(self):
+        return getattr(settings, 'DETECTION_CACHE_EVICT_EVERY', 100)
+
+    def lookup(self, digest):
+        cutoff = timezone.now() - timedelta(seconds=self.ttl)
+        row = DetectionResult.objects.filter(sha256=digest, created_at__gte=cutoff).values_list('foods', flat=True).first()
+        if row is None:
+            return None
+        DetectionResult.objects.filter(sha256=digest).update(hits=F('hits') + 1, last_used_at=timezone.now())
+        return list(row)
+
+    def store(self, digest, foods, image_size=0):
+        foods = list(foods)
+        size = len(digest) + len(json.dumps(foods).encode())
+        DetectionResult.objects.update_or_create(sha256=digest, defaults={
+            'foods': foods, 'image_size': image_size, 'size_bytes': size, 'hits': 0, 'created_at': timezone.now(),
+        })
+        with self._lock:
+            self._stores += 1
+            if self._bytes is not None:
+                self._bytes += size
+            due = self._bytes is None or self._bytes > self.max_bytes or self._stores % self.evict_every == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Drop expired rows, then least recently used rows until the table fits max_bytes."""
+        cutoff = timezone.now() - timedelta(seconds=self.ttl)
+        removed, _ = DetectionResult.objects.filter(created_at__lt=cutoff).delete()
+        total = DetectionResult.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+        if total > self.max_bytes:
+            stale = []
+            rows = DetectionResult.objects.order_by('last_used_at', 'id').values_list('id', 'size_bytes')
+            for pk, size in rows.iterator(chunk_size=500):
+                if total <= self.max_bytes:
+                    break
+                stale.append(pk)
+                total -= size
+            for i in range(0, len(stale), 500):
+                removed += DetectionResult.objects.filter(id__in=stale[i:i + 500]).delete()[0]
+        with self._lock:
+            self._bytes = total
+            self.evictions += removed
+        return removed
+
+    def detect(self, image_path, predict=None, digest=None):
+        """Return detected foods for the image, from cache when the same bytes were seen before.
+
+        `digest` is the SHA-256 of the image bytes when the caller already knows it
+        (content-addressed uploads); otherwise the file is hashed here.
+        """
+        digest = digest or file_sha256(image_path)
+        if predict is None:
+            predict = predict_foods
+            # results of the stub/local backends must not be served to the remote one (and vice versa)
+            digest = cache_key(digest, get_backend().cache_namespace)
+        def run():
+            # looked up inside the flight: a request arriving just after the leader
+            # finished finds the stored row instead of starting a second inference
+            cached = self.lookup(digest)
+            if cached is not None:
+                return cached, True
+            foods = predict(image_path)
+            # an empty answer may be a transient model hiccup: ask again next time
+            if foods:
+                try:
+                    size = os.path.getsize(image_path)
+                except OSError:
+                    size = 0
+                self.store(digest, foods, size)
+            return foods, False
+
+        (foods, hit), shared = self._flight.do(digest, run)
+        with self._lock:
+            if shared:
+                self.coalesced += 1
+            elif hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return list(foods)
+
+    def forget(self, digests):
+        """Delete the rows for these keys (e.g. results a load test produced)."""
+        digests = list(digests)
+        removed = 0
+        for i in range(0, len(digests), 500):
+            removed += DetectionResult.objects.filter(sha256__in=digests[i:i + 500]).delete()[0]
+        with self._lock:
+            self._bytes = None
+        return removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hit_rate': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
+
+
+detection_cache = DetectionCache()
+metrics.register('detection_cache', detection_cache.stats)
+
+
+def detect_foods(image_path, digest=None):
+    """Cached, coalesced replacement for `predict_foods` used by the views."""
+    return detection_cache.detect(image_path, digest=digest)
@@ -0,0 +1,198 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Max, Min, Sum, Window
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import metrics
+from .models import MealLog, Profile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GOAL = 2000
+
+_executor = None
+_executor_lock = threading.Lock()
+# users with a history recompute queued but not yet started (repeat saves coalesce)
+_queued = set()
+_queue_stats = {'enqueued': 0, 'coalesced': 0, 'completed': 0, 'failed': 0}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def user_goal(user):
+    """The user's calorie goal: profile BMR when it can be computed, else 2000 kcal."""
+    try:
+        profile = getattr(user, 'profile', None)
+        bmr = profile.bmr() if profile else None
+        return int(bmr) if bmr else DEFAULT_GOAL
+    except Exception:
+        return DEFAULT_GOAL
+
+
+def _ordered(user, start_date, end_date):
+    return (MealLog.objects.filter(user=user, local_date__gte=start_date, local_date__lte=end_date)
+            .order_by('local_date', 'created_at', 'id'))
+
+
+def _running_sql(user, start_date, end_date):
+    """Rows with `running` = SUM(calories) OVER (PARTITION BY local_date ORDER BY created_at, id)."""
+    running = Window(Sum('calories'), partition_by=[F('local_date')], order_by=[F('created_at').asc(), F('id').asc()])
+    return list(_ordered(user, start_date, end_date)
+                .only('id', 'local_date', 'calories', 'running_calories', 'day_goal_achieved')
+                .annotate(running=running))
+
+
+def _running_numpy(user, start_date, end_date):
+    """Same rows as `_running_sql`, with the per-day running sum taken by np.cumsum."""
+    rows = list(_ordered(user, start_date, end_date)
+                .only('id', 'local_date', 'calories', 'running_calories', 'day_goal_achieved'))
+    for _, day in groupby(rows, key=lambda r: r.local_date):
+        day = list(day)
+        for row, running in zip(day, np.cumsum([float(r.calories or 0) for r in day])):
+            row.running = float(running)
+    return rows
+
+
+def recompute_running_totals(user, start_date, end_date=None, goal=None, batch_size=500):
+    """Recompute running_calories and day_goal_achieved for every meal of the user in start_date..end_date.
+
+    Running totals come from one window-function query (NumPy cumsum where the
+    database has no OVER clause); a row is achieved once its day's running total has
+    reached the goal, and so is every later row that day. Only changed rows are
+    written, with bulk_update. Returns {local_date: achieved} for days with meals.
+    """
+    end_date = end_date or start_date
+    goal = user_goal(user) if goal is None else goal
+    if connection.features.supports_over_clause:
+        rows = _running_sql(user, start_date, end_date)
+    else:
+        rows = _running_numpy(user, start_date, end_date)
+
+    achieved = {}
+    changed = []
+    for d, day in groupby(rows, key=lambda r: r.local_date):
+        achieved_once = False
+        for row in day:
+            running = round(float(row.running or 0), 2)
+            if not achieved_once and running >= goal and running > 0:
+                achieved_once = True
+            if row.running_calories != running or row.day_goal_achieved != achieved_once:
+                row.running_calories = running
+                row.day_goal_achieved = achieved_once
+                changed.append(row)
+        achieved[d] = achieved_once
+    if changed:
+        MealLog.objects.bulk_update(changed, ['running_calories', 'day_goal_achieved'], batch_size=batch_size)
+    return achieved
+
+
+def recompute_user_history(user_id, chunk_days=None):
+    """Recompute running totals and goal flags over the user's whole history, `chunk_days` local days per pass.
+
+    Each chunk is one window query plus at most one bulk_update, so the write lock is
+    held briefly however long the history is. Returns the number of days with meals.
+    """
+    chunk_days = chunk_days or _setting('GOAL_RECOMPUTE_CHUNK_DAYS', 90)
+    user = User.objects.select_related('profile').filter(pk=user_id).first()
+    if user is None:
+        return 0
+    bounds = MealLog.objects.filter(user_id=user_id).aggregate(first=Min('local_date'), last=Max('local_date'))
+    if bounds['first'] is None:
+        return 0
+    goal = user_goal(user)
+    days = 0
+    start = bounds['first']
+    while start <= bounds['last']:
+        end = min(start + timezone.timedelta(days=chunk_days - 1), bounds['last'])
+        days += len(recompute_running_totals(user, start, end, goal=goal))
+        start = end + timezone.timedelta(days=1)
+    return days
+
+
+def get_executor():
+    """Per-process pool for history recomputes (one worker: they are write-heavy)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='goal-recompute')
+    return _executor
+
+
+def enqueue_history_recompute(user_id):
+    """Schedule `recompute_user_history` for the user according to GOAL_RECOMPUTE_MODE.
+
+    - 'thread' (default): on the in-process pool; a user already queued is not queued twice.
+    - 'sync': inline (tests, single-process debugging).
+    - 'off': leave it to `manage.py backfill_goal_flags` and the history page.
+    """
+    mode = _setting('GOAL_RECOMPUTE_MODE', 'thread')
+    if mode == 'sync':
+        recompute_user_history(user_id)
+        with _executor_lock:
+            _queue_stats['completed'] += 1
+        return True
+    if mode != 'thread':
+        return False
+    with _executor_lock:
+        if user_id in _queued:
+            _queue_stats['coalesced'] += 1
+            return False
+        _queued.add(user_id)
+        _queue_stats['enqueued'] += 1
+    get_executor().submit(_run_in_thread, user_id)
+    return True
+
+
+def _run_in_thread(user_id):
+    with _executor_lock:
+        # saves arriving from now on need another run
+        _queued.discard(user_id)
+    close_old_connections()
+    outcome = 'completed'
+    try:
+        recompute_user_history(user_id)
+    except Exception:
+        outcome = 'failed'
+        logger.exception('goal flag recompute failed for user %s', user_id)
+    finally:
+        close_old_connections()
+        with _executor_lock:
+            _queue_stats[outcome] += 1
+
+
+def stats():
+    with _executor_lock:
+        return dict(_queue_stats, queued=len(_queued))
+
+
+metrics.register('goal_recompute', stats)
+
+
+def _goal_inputs_changed(instance):
+    previous = getattr(instance, '_previous_profile', None)  # stashed by app.rollups
+    if previous is None:
+        return False
+    if previous['timezone'] != instance.timezone:
+        return True  # meals moved to other days
+    before = Profile(sex=previous['sex'], age=previous['age'], height_cm=previous['height_cm'], weight_kg=previous['weight_kg'])
+    return before.bmr() != instance.bmr()
+
+
+@receiver(post_save, sender=Profile)
+def recompute_history_on_goal_change(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created or not _goal_inputs_changed(instance):
+        return
+    # after commit, so the worker reads the new profile
+    transaction.on_commit(lambda: enqueue_history_recompute(instance.user_id))
@@ -0,0 +1,97 @@
+import io
+import logging
+import os
+import threading
+from collections import namedtuple
+
+from . import metrics
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: without it uploads are sent unchanged
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# Longest side (pixels) sent to the detector; YOLO models are typically trained at 640
+YOLO_INPUT_SIZE = int(os.environ.get('YOLO_INPUT_SIZE', '640'))
+YOLO_JPEG_QUALITY = int(os.environ.get('YOLO_JPEG_QUALITY', '85'))
+# Set YOLO_PREPROCESS=0 to post the original file bytes
+YOLO_PREPROCESS = os.environ.get('YOLO_PREPROCESS', '1') in ('1', 'true', 'True')
+
+PreparedImage = namedtuple('PreparedImage', ['data', 'filename', 'content_type', 'original_size', 'size'])
+
+
+class _ImageStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.resized = 0
+        self.passthrough = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def record(self, original, prepared, resized):
+        with self._lock:
+            self.images += 1
+            self.bytes_in += original
+            self.bytes_out += prepared
+            if resized:
+                self.resized += 1
+            else:
+                self.passthrough += 1
+
+    def stats(self):
+        return {
+            'images': self.images,
+            'resized': self.resized,
+            'passthrough': self.passthrough,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'saved_ratio': round(1 - self.bytes_out / self.bytes_in, 4) if self.bytes_in else 0.0,
+        }
+
+
+image_stats = _ImageStats()
+metrics.register('image_preprocessing', image_stats.stats)
+
+
+def prepare_image(image_path, max_side=None, quality=None):
+    """Decode the upload once, apply EXIF orientation, downscale and re-encode it as JPEG in memory.
+
+    Falls back to the original bytes when Pillow is missing, preprocessing is disabled,
+    the file cannot be decoded, or re-encoding would not make it smaller. The returned
+    buffer is meant to be reused for every retry of the same upload.
+    """
+    max_side = max_side or YOLO_INPUT_SIZE
+    quality = quality or YOLO_JPEG_QUALITY
+    with open(image_path, 'rb') as fh:
+        raw = fh.read()
+    filename = os.path.basename(image_path)
+    original = PreparedImage(raw, filename, 'application/octet-stream', len(raw), len(raw))
+
+    if Image is None or not YOLO_PREPROCESS:
+        image_stats.record(len(raw), len(raw), False)
+        return original
+    try:
+        with Image.open(io.BytesIO(raw)) as img:
+            rotated = img.getexif().get(0x0112, 1) not in (0, 1)
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+            buf = io.BytesIO()
+            img.save(buf, format='JPEG', quality=quality, optimize=True)
+    except Exception as e:
+        logger.info('Image preprocessing skipped for %s: %s', filename, e)
+        image_stats.record(len(raw), len(raw), False)
+        return original
+
+    data = buf.getvalue()
+    if len(data) >= len(raw) and not rotated:
+        image_stats.record(len(raw), len(raw), False)
+        return original
+    image_stats.record(len(raw), len(data), True)
+    stem = os.path.splitext(filename)[0] or 'upload'
+    return PreparedImage(data, f'{stem}.jpg', 'image/jpeg', len(raw), len(data))
@@ -0,0 +1,181 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .backends import get_backend
+from .detection_cache import cache_key, detection_cache
+
+STEPS = ('login', 'upload', 'weights')
+USER_PREFIX = 'loadtest_'
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(q / 100.0 * len(values)) - 1))]
+
+
+class StepStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {step: [] for step in STEPS}
+        self.queries = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+
+    def record(self, step, seconds, queries, ok):
+        with self._lock:
+            self.latencies[step].append(seconds * 1000)
+            self.queries[step].append(queries)
+            if not ok:
+                self.errors[step] += 1
+
+    def summary(self):
+        out = {}
+        for step in STEPS:
+            ms = sorted(self.latencies[step])
+            queries = self.queries[step]
+            out[step] = {
+                'count': len(ms),
+                'errors': self.errors[step],
+                'p50_ms': percentile(ms, 50),
+                'p95_ms': percentile(ms, 95),
+                'p99_ms': percentile(ms, 99),
+                'avg_queries': round(sum(queries) / len(queries), 1) if queries else 0.0,
+                'max_queries': max(queries) if queries else 0,
+            }
+        return out
+
+
+class ScanLoadTest:
+    """Drives virtual users through login -> upload -> weights against the real views.
+
+    Each user has its own test `Client` (sessions, cookies) and runs on its own thread;
+    every step is timed and its DB queries counted on that thread's connection. The
+    upload step includes polling `/scan/<token>/` until the job has finished, so it
+    measures the full scan whatever SCAN_JOBS_MODE is. The digests of uploaded images
+    are recorded so `delete_detections` can remove the cached results afterwards.
+    """
+
+    def __init__(self, users=10, iterations=5, concurrency=None, grams='150', same_image=False,
+                 image_kb=64, scan_timeout=60.0, password='loadtest-pw'):
+        self.users = users
+        self.iterations = iterations
+        self.concurrency = concurrency or users
+        self.grams = grams
+        self.same_image = same_image
+        self.image_kb = image_kb
+        self.scan_timeout = scan_timeout
+        self.password = password
+        self.stats = StepStats()
+        self._fixed_image = os.urandom(image_kb * 1024)
+        self._digests = set()
+        self._digests_lock = threading.Lock()
+
+    def usernames(self):
+        return [f'{USER_PREFIX}{i}' for i in range(self.users)]
+
+    def create_users(self):
+        names = self.usernames()
+        User.objects.filter(username__in=names).delete()
+        hashed = make_password(self.password)
+        User.objects.bulk_create([User(username=n, password=hashed) for n in names])
+
+    def delete_users(self):
+        return User.objects.filter(username__in=self.usernames()).delete()[0]
+
+    def delete_detections(self, backend=None):
+        """Remove the `DetectionResult` rows this run's uploads produced under `backend`."""
+        namespace = get_backend(backend).cache_namespace
+        with self._digests_lock:
+            digests = list(self._digests)
+        return detection_cache.forget(cache_key(d, namespace) for d in digests)
+
+    def _timed(self, step, fn):
+        started = time.perf_counter()
+        ok = False
+        with CaptureQueriesContext(connection) as ctx:
+            try:
+                ok, result = fn()
+            except Exception:
+                result = None
+        self.stats.record(step, time.perf_counter() - started, len(ctx.captured_queries), ok)
+        return ok, result
+
+    def _login(self, client, username):
+        resp = client.post('/login/', {'username': username, 'password': self.password})
+        return resp.status_code == 302, None
+
+    def _upload(self, client, index, iteration):
+        data = self._fixed_image if self.same_image else os.urandom(self.image_kb * 1024)
+        with self._digests_lock:
+            self._digests.add(hashlib.sha256(data).hexdigest())
+        image = SimpleUploadedFile(f'plate_{index}_{iteration}.jpg', data, content_type='image/jpeg')
+        resp = client.post('/dashboard/', {'image': image})
+        token = client.session.get('scan_job')
+        if resp.status_code != 302 or not token:
+            return False, None
+        deadline = time.monotonic() + self.scan_timeout
+        while time.monotonic() < deadline:
+            status = client.get(f'/scan/{token}/').json()
+            if status['status'] == 'done':
+                return True, status['foods']
+            if status['status'] == 'failed':
+                return False, None
+            time.sleep(0.05)
+        return False, None
+
+    def _weights(self, client, foods):
+        data = {'detected_items': foods}
+        for food in foods:
+            data[f'grams_{food}'] = self.grams
+        resp = client.post('/dashboard/', data)
+        # nothing resolvable -> the view stores an error instead of saving a meal
+        return resp.status_code == 302 and 'scan_error' not in client.session, None
+
+    def run_user(self, index):
+        client = Client()
+        username = self.usernames()[index]
+        try:
+            ok, _ = self._timed('login', lambda: self._login(client, username))
+            if not ok:
+                return 0
+            done = 0
+            for iteration in range(self.iterations):
+                ok, foods = self._timed('upload', lambda: self._upload(client, index, iteration))
+                if not ok:
+                    continue
+                ok, _ = self._timed('weights', lambda: self._weights(client, foods))
+                done += ok
+            return done
+        finally:
+            if self.concurrency > 1:
+                close_old_connections()
+
+    def run(self):
+        """Run every virtual user; returns a summary dict (wall time, throughput, per-step stats)."""
+        started = time.perf_counter()
+        if self.concurrency > 1:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='vuser') as pool:
+                completed = sum(pool.map(self.run_user, range(self.users)))
+        else:
+            completed = sum(self.run_user(i) for i in range(self.users))
+        wall = time.perf_counter() - started
+        return {
+            'users': self.users,
+            'iterations': self.iterations,
+            'completed_meals': completed,
+            'wall_seconds': round(wall, 3),
+            'meals_per_second': round(completed / wall, 2) if wall else 0.0,
+            'steps': self.stats.summary(),
+        }
@@ -1,100 +1,141 @@
-from collections import defaultdict
-from zoneinfo import ZoneInfo
+from django.db.models import Case, CharField, Count, Sum, Value, When
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
 from django.utils import timezone
 
-from .models import MealLog
+from .models import DailyTotals, MealLog
+from .timezones import local_today, user_timezone
 
-TZ = ZoneInfo('Asia/Kolkata')
+
+def daily_totals(user, start_date, end_date):
+    """Per-day sums for local dates start_date..end_date (inclusive) in one grouped query.
+
+    Returns {date: {'calories', 'protein_g', 'fat_g', 'carbs_g', 'fiber_g', 'meals'}} for
+    days that have logs; grouped on the stored `local_date`, a range scan of the
+    (user, local_date, created_at) index.
+    """
+    rows = (MealLog.objects
+            .filter(user=user, local_date__gte=start_date, local_date__lte=end_date)
+            .values('local_date')
+            .annotate(calories=Sum('calories'), protein_g=Sum('protein_g'), fat_g=Sum('fat_g'),
+                      carbs_g=Sum('carbs_g'), fiber_g=Sum('fiber_g'), meals=Count('id'))
+            .order_by())
+    return {row.pop('local_date'): row for row in rows}
+
+
+def rollup_totals(user, start_date, end_date):
+    """Per-day sums for start_date..end_date read from the DailyTotals rollup (O(days) rows).
+
+    Same shape as `daily_totals`, plus 'goal_achieved'.
+    """
+    rows = (DailyTotals.objects
+            .filter(user=user, local_date__gte=start_date, local_date__lte=end_date)
+            .values('local_date', 'calories', 'protein_g', 'fat_g', 'carbs_g', 'fiber_g', 'meal_count', 'goal_achieved'))
+    totals = {}
+    for row in rows:
+        row['meals'] = row.pop('meal_count')
+        totals[row.pop('local_date')] = row
+    return totals
 
 
 def date_range_series(user, days=30):
-    today = timezone.localtime(timezone.now(), TZ).date()
+    today = local_today(user_timezone(user))
     start_date = today - timezone.timedelta(days=days - 1)
+    totals = rollup_totals(user, start_date, today)
     series = []
     for i in range(days):
         d = start_date + timezone.timedelta(days=i)
-        day_logs = MealLog.objects.filter(user=user)
-        # filter in python by localdate (DB timezone may be UTC)
-        day_logs = [l for l in day_logs if timezone.localtime(l.created_at, TZ).date() == d]
+        day = totals.get(d, {})
         series.append({
             'date': d,
-            'calories': round(sum(l.calories for l in day_logs), 2),
-            'protein_g': round(sum(l.protein_g for l in day_logs), 2),
-            'fat_g': round(sum(l.fat_g for l in day_logs), 2),
-            'carbs_g': round(sum(l.carbs_g for l in day_logs), 2),
+            'calories': round(day.get('calories') or 0, 2),
+            'protein_g': round(day.get('protein_g') or 0, 2),
+            'fat_g': round(day.get('fat_g') or 0, 2),
+            'carbs_g': round(day.get('carbs_g') or 0, 2),
         })
     return series
 
 
+MEAL_TYPES = ['Breakfast', 'Lunch', 'Snack', 'Dinner', 'Other']
+
+
+def meal_type_for_hour(hour):
+    """The rule used by `meal_type_breakdown`, for one local hour."""
+    if 4 <= hour < 11:
+        return 'Breakfast'
+    if 11 <= hour < 15:
+        return 'Lunch'
+    if 15 <= hour < 18:
+        return 'Snack'
+    if 18 <= hour < 23:
+        return 'Dinner'
+    return 'Other'
+
+
+def _window(user, start_date):
+    """The user's meals from local start_date onwards (index range on user, local_date)."""
+    return MealLog.objects.filter(user=user, local_date__gte=start_date)
+
+
 def meal_type_breakdown(user, start_date):
     """Rule-based meal type breakdown using local time buckets:
-    Breakfast 04:00-10:59, Lunch 11:00-14:59, Snack 15:00-17:59, Dinner 18:00-22:59, Other otherwise."""
-    counts = defaultdict(float)
-    for l in MealLog.objects.filter(user=user):
-        lt = timezone.localtime(l.created_at, TZ)
-        ld = lt.date()
-        if ld < start_date:
-            continue
-        hour = lt.hour
-        if 4 <= hour < 11:
-            m = 'Breakfast'
-        elif 11 <= hour < 15:
-            m = 'Lunch'
-        elif 15 <= hour < 18:
-            m = 'Snack'
-        elif 18 <= hour < 23:
-            m = 'Dinner'
-        else:
-            m = 'Other'
-        counts[m] += l.calories
+    Breakfast 04:00-10:59, Lunch 11:00-14:59, Snack 15:00-17:59, Dinner 18:00-22:59, Other otherwise.
+    Bucketed and summed in SQL (one grouped query over the window)."""
+    bucket = Case(
+        When(hour__gte=4, hour__lt=11, then=Value('Breakfast')),
+        When(hour__gte=11, hour__lt=15, then=Value('Lunch')),
+        When(hour__gte=15, hour__lt=18, then=Value('Snack')),
+        When(hour__gte=18, hour__lt=23, then=Value('Dinner')),
+        default=Value('Other'),
+        output_field=CharField(),
+    )
+    rows = (_window(user, start_date)
+            .annotate(hour=ExtractHour('created_at', tzinfo=user_timezone(user)))
+            .annotate(bucket=bucket)
+            .values('bucket')
+            .annotate(calories=Sum('calories'))
+            .order_by())
+    counts = {row['bucket']: row['calories'] or 0.0 for row in rows}
     # return as list of tuples (label, rounded_value) using canonical labels only
-    canonical = ['Breakfast','Lunch','Snack','Dinner','Other']
-    items = []
-    for k in canonical:
-        v = counts.get(k, 0.0)
-        items.append((k, round(v, 1)))
+    items = [(k, round(counts.get(k, 0.0), 1)) for k in MEAL_TYPES]
     # trim out zero-value items for UI clarity
-    items = [it for it in items if it[1] > 0]
-    return items
+    return [it for it in items if it[1] > 0]
 
 
 def macros_totals(user, start_date):
-    totals = {'protein_g': 0, 'fat_g': 0, 'carbs_g': 0}
-    for l in MealLog.objects.filter(user=user):
-        ld = timezone.localtime(l.created_at, TZ).date()
-        if ld < start_date:
-            continue
-        totals['protein_g'] += l.protein_g
-        totals['fat_g'] += l.fat_g
-        totals['carbs_g'] += l.carbs_g
-    return totals
+    sums = _window(user, start_date).aggregate(protein_g=Sum('protein_g'), fat_g=Sum('fat_g'), carbs_g=Sum('carbs_g'))
+    return {k: v or 0 for k, v in sums.items()}
 
 
 def hourly_heatmap(user, start_date):
-    # 7 rows (Mon-Sun) x 24 hours
+    # 7 rows (Mon-Sun) x 24 hours, summed per local weekday/hour in SQL
     heatmap = [[0 for _ in range(24)] for _ in range(7)]
-    for l in MealLog.objects.filter(user=user):
-        lt = timezone.localtime(l.created_at, TZ)
-        if lt.date() < start_date:
-            continue
-        wd = lt.weekday()
-        h = lt.hour
-        heatmap[wd][h] += l.calories
+    tz = user_timezone(user)
+    rows = (_window(user, start_date)
+            .annotate(weekday=ExtractIsoWeekDay('created_at', tzinfo=tz), hour=ExtractHour('created_at', tzinfo=tz))
+            .values('weekday', 'hour')
+            .annotate(calories=Sum('calories'))
+            .order_by())
+    for row in rows:
+        heatmap[row['weekday'] - 1][row['hour']] += row['calories'] or 0
     return heatmap
 
 
 def calendar_heatmap(user, days=30):
     """Return a LeetCode-style calendar heatmap for the last `days` days."""
-    today = timezone.localtime(timezone.now(), TZ).date()
+    today = local_today(user_timezone(user))
     start_date = today - timezone.timedelta(days=days - 1)
+    totals = rollup_totals(user, start_date, today)
+    return calendar_grid(start_date, days, {d: row['calories'] for d, row in totals.items()})
+
+
+def calendar_grid(start_date, days, calories_by_day):
+    """Lay out `days` days from start_date as calendar cells (weekday/week index) with their calories."""
     start_wd = start_date.weekday()
     days_list = []
     max_cal = 0
-    all_logs = MealLog.objects.filter(user=user)
     for i in range(days):
         d = start_date + timezone.timedelta(days=i)
-        day_logs = [l for l in all_logs if timezone.localtime(l.created_at, TZ).date() == d]
-        cals = round(sum(l.calories for l in day_logs), 2)
+        cals = round(calories_by_day.get(d) or 0, 2)
         weekday = d.weekday()
         week_index = (start_wd + i) // 7
         days_list.append({'date': d.isoformat(), 'calories': cals, 'weekday': weekday, 'week': week_index})
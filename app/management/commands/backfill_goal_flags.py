@@ -0,0 +1,67 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from app.models import MealLog
+
+
+def _backfill_chunk(user_ids, chunk_days):
+    """Recompute goal flags for a chunk of users; returns (users, days)."""
+    from app.goals import recompute_user_history
+    return len(user_ids), sum(recompute_user_history(user_id, chunk_days) for user_id in user_ids)
+
+
+def _backfill_chunk_in_worker(user_ids, chunk_days):
+    """Process-pool entry point: same as `_backfill_chunk` on the worker's own connection."""
+    import django
+    from django.apps import apps
+    if not apps.ready:  # spawned (not forked) workers start without Django
+        django.setup()
+    try:
+        return _backfill_chunk(user_ids, chunk_days)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Recompute running_calories and day_goal_achieved for every user with meals (e.g. after a goal rule '
+            'change or a bulk import), in chunks of users spread over a process pool')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only this user id (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=50, help='Users per task')
+        parser.add_argument('--chunk-days', type=int, default=None, help='Local days per recompute pass (GOAL_RECOMPUTE_CHUNK_DAYS)')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes; 1 runs inline. Keep it low on SQLite, which has a single writer')
+
+    def handle(self, *args, **options):
+        user_ids = options['users'] or list(MealLog.objects.order_by('user_id').values_list('user_id', flat=True).distinct())
+        size = max(1, options['chunk_size'])
+        chunks = [user_ids[i:i + size] for i in range(0, len(user_ids), size)]
+        total = len(user_ids)
+        started = time.perf_counter()
+        done_users = done_days = 0
+
+        def report(users, days):
+            nonlocal done_users, done_days
+            done_users += users
+            done_days += days
+            rate = done_users / max(time.perf_counter() - started, 1e-9)
+            self.stdout.write(f'[{done_users}/{total} users] {done_days} day(s) recomputed, {rate:.1f} users/s')
+
+        processes = max(1, min(options['processes'], len(chunks) or 1))
+        if processes == 1:
+            for chunk in chunks:
+                report(*_backfill_chunk(chunk, options['chunk_days']))
+        else:
+            # children must not inherit this process's open database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                futures = [pool.submit(_backfill_chunk_in_worker, chunk, options['chunk_days']) for chunk in chunks]
+                for future in as_completed(futures):
+                    report(*future.result())
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed goal flags for {done_users} user(s), {done_days} day(s) in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,120 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from app.analytics import history_analytics
+from app.logs import date_range_series, calendar_heatmap, hourly_heatmap, macros_totals, meal_type_breakdown
+from app.models import MealLog
+from app.rollups import rebuild
+from app.timezones import DEFAULT_TIMEZONE, get_zone
+from app.views import history
+import random
+import time
+
+
+TZ = get_zone(DEFAULT_TIMEZONE)  # the synthetic user keeps the default timezone
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _legacy_date_range_series(user, days):
+    """The original per-day loop (one full history load per day), kept as the baseline."""
+    today = timezone.localtime(timezone.now(), TZ).date()
+    start_date = today - timezone.timedelta(days=days - 1)
+    series = []
+    for i in range(days):
+        d = start_date + timezone.timedelta(days=i)
+        day_logs = [l for l in MealLog.objects.filter(user=user) if timezone.localtime(l.created_at, TZ).date() == d]
+        series.append({
+            'date': d,
+            'calories': round(sum(l.calories for l in day_logs), 2),
+            'protein_g': round(sum(l.protein_g for l in day_logs), 2),
+            'fat_g': round(sum(l.fat_g for l in day_logs), 2),
+            'carbs_g': round(sum(l.carbs_g for l in day_logs), 2),
+        })
+    return series
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the analytics helpers on a synthetic user history (created in a transaction and rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=float, default=3.0, help='Length of the synthetic history')
+        parser.add_argument('--meals-per-day', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per function (best is reported)')
+        parser.add_argument('--skip-legacy', action='store_true', help='Do not time the original per-day loop')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user = self._seed(random.Random(options['seed']), options['years'], options['meals_per_day'])
+                self._run(user, options)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _seed(self, rng, years, per_day):
+        user = User.objects.create(username='bench_analytics_user')
+        today = timezone.localtime(timezone.now(), TZ).date()
+        n_days = int(years * 365)
+        logs = []
+        for i in range(n_days):
+            d = today - timezone.timedelta(days=i)
+            for _ in range(per_day):
+                cal = round(rng.uniform(150, 900), 1)
+                logs.append(MealLog(
+                    user=user, meal_name='bench', calories=cal, protein_g=round(cal * 0.05, 1), fat_g=round(cal * 0.03, 1),
+                    carbs_g=round(cal * 0.12, 1), fiber_g=2,
+                    created_at=timezone.datetime(d.year, d.month, d.day, rng.randint(6, 22), rng.randint(0, 59), tzinfo=TZ),
+                    local_date=d,  # bulk_create bypasses MealLog.save()
+                ))
+        logs = MealLog.objects.bulk_create(logs, batch_size=500)
+        # bulk writes skip the rollup signals
+        rebuild(user_ids=[user.pk])
+        self.stdout.write(f'user history: {len(logs)} meals over {n_days} days')
+        return user
+
+    def _time(self, fn, repeat):
+        best, queries, result = None, 0, None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                t0 = time.perf_counter()
+                result = fn()
+                elapsed = time.perf_counter() - t0
+            queries = len(ctx.captured_queries)
+            best = elapsed if best is None else min(best, elapsed)
+        return best * 1000, queries, result
+
+    def _report(self, label, ms, queries):
+        self.stdout.write(f'{label:36s} {ms:10.1f} ms  {queries:5d} queries')
+
+    def _run(self, user, options):
+        repeat = options['repeat']
+        for days in (30, 365):
+            ms, q, new = self._time(lambda: date_range_series(user, days), repeat)
+            self._report(f'date_range_series(days={days})', ms, q)
+            if not options['skip_legacy']:
+                legacy_ms, legacy_q, old = self._time(lambda: _legacy_date_range_series(user, days), 1)
+                self._report(f'  legacy per-day loop', legacy_ms, legacy_q)
+                mismatches = sum(1 for a, b in zip(old, new) if abs(a['calories'] - b['calories']) > 0.01)
+                self.stdout.write(f'  speedup {legacy_ms / ms:.0f}x, mismatched days: {mismatches}')
+            ms, q, _ = self._time(lambda: calendar_heatmap(user, days), repeat)
+            self._report(f'calendar_heatmap(days={days})', ms, q)
+            start = timezone.localtime(timezone.now(), TZ).date() - timezone.timedelta(days=days - 1)
+            for fn in (meal_type_breakdown, macros_totals, hourly_heatmap):
+                ms, q, _ = self._time(lambda: fn(user, start), repeat)
+                self._report(f'{fn.__name__}(days={days})', ms, q)
+        factory = RequestFactory()
+        for days in (7, 30):
+            request = factory.get('/history/', {'days': days})
+            request.user = user
+            history(request)  # first render fills running totals; time the steady state
+            ms, q, _ = self._time(lambda: history_analytics(user, days), repeat)
+            self._report(f'history_analytics(days={days})', ms, q)
+            ms, q, _ = self._time(lambda: history(request), repeat)
+            self._report(f'history view (days={days})', ms, q)
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from app.backends import get_backend, BACKENDS
+import os
+import statistics
+import tempfile
+import time
+
+
+class Command(BaseCommand):
+    help = 'Benchmark detection backends through the common backend interface (throughput and latency per image)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', action='append', choices=sorted(BACKENDS),
+                            help='Backend to benchmark (repeatable; default: stub)')
+        parser.add_argument('--images', type=int, default=64, help='Distinct images to detect')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent callers')
+        parser.add_argument('--image-dir', help='Use the images in this directory instead of generated files')
+
+    def handle(self, *args, **options):
+        backends = options['backend'] or ['stub']
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = self._images(options, tmp)
+            for name in backends:
+                self._bench(name, paths, options['concurrency'])
+
+    def _images(self, options, tmp):
+        if options['image_dir']:
+            names = sorted(os.listdir(options['image_dir']))
+            return [os.path.join(options['image_dir'], n) for n in names][:options['images']]
+        paths = []
+        for i in range(options['images']):
+            path = os.path.join(tmp, f'bench_{i}.jpg')
+            with open(path, 'wb') as fh:
+                fh.write(os.urandom(32 * 1024))
+            paths.append(path)
+        return paths
+
+    def _bench(self, name, paths, concurrency):
+        backend = get_backend(name)
+        backend.predict(paths[0])  # load models / open connections before timing
+
+        def timed(path):
+            t0 = time.perf_counter()
+            backend.predict(path)
+            return (time.perf_counter() - t0) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = sorted(pool.map(timed, paths))
+        wall = time.perf_counter() - started
+        self.stdout.write(
+            f'{name:8s} {len(paths) / wall:8.1f} images/s  p50={statistics.median(samples):.2f} ms  '
+            f'p95={samples[max(0, int(len(samples) * 0.95) - 1)]:.2f} ms  {backend.stats()}'
+        )
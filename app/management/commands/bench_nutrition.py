@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app.models import Recipe, Nutrition
+from app.nutrition import calculate_nutrition_from_recipe, nutrition_table, NUTRIENT_COLS
+from app.nutrition_engine import RecipeNutritionEngine
+import random
+import time
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the per-ingredient recipe loop against the vectorized recipe matrix engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=5000, help='Number of (recipe, grams) computations')
+        parser.add_argument('--synthetic', action='store_true', help='Benchmark on generated recipes/ingredients (rolled back afterwards)')
+        parser.add_argument('--recipes', type=int, default=500, help='Synthetic recipe count')
+        parser.add_argument('--ingredients', type=int, default=300, help='Synthetic ingredient count')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if not options['synthetic']:
+            self._run(rng, options['items'])
+            return
+        try:
+            with transaction.atomic():
+                self._seed(rng, options['recipes'], options['ingredients'])
+                self._run(rng, options['items'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+        nutrition_table.invalidate()
+
+    def _seed(self, rng, n_recipes, n_ingredients):
+        names = [f'bench_ing_{i}' for i in range(n_ingredients)]
+        Nutrition.objects.bulk_create([
+            Nutrition(ingredient=n, **{c: round(rng.uniform(0, 400 if c == 'calories' else 40), 2) for c in NUTRIENT_COLS})
+            for n in names
+        ])
+        Recipe.objects.bulk_create([
+            Recipe(name=f'Bench Dish {i}', slug=f'bench-dish-{i}',
+                   ingredients={n: round(rng.uniform(5, 120), 1) for n in rng.sample(names, rng.randint(3, 12))})
+            for i in range(n_recipes)
+        ])
+        nutrition_table.invalidate()
+
+    def _run(self, rng, n_items):
+        recipes = list(Recipe.objects.values_list('id', 'ingredients'))
+        if not recipes:
+            self.stdout.write(self.style.WARNING('No recipes found; use --synthetic or import recipes first'))
+            return
+        picks = [rng.choice(recipes) for _ in range(n_items)]
+        grams = [round(rng.uniform(50, 500), 1) for _ in range(n_items)]
+
+        # warm the nutrition table so the loop is measured without DB round trips
+        nutrition_table.get_many([])
+        t0 = time.perf_counter()
+        loop_results = [calculate_nutrition_from_recipe(ing, g) for (_, ing), g in zip(picks, grams)]
+        loop_s = time.perf_counter() - t0
+
+        engine = RecipeNutritionEngine()
+        t0 = time.perf_counter()
+        engine.build()
+        build_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        engine_results = engine.compute([(rid, g) for (rid, _), g in zip(picks, grams)])
+        engine_s = time.perf_counter() - t0
+
+        max_diff = 0.0
+        for a, b in zip(loop_results, engine_results):
+            if a is None or b is None:
+                if (a is None) != (b is None):
+                    max_diff = float('inf')
+                continue
+            for c in NUTRIENT_COLS:
+                max_diff = max(max_diff, abs(a[c] - b[c]))
+
+        self.stdout.write(f'items={n_items} recipes={len(recipes)}')
+        self.stdout.write(f'loop:   {loop_s * 1000:.1f} ms')
+        self.stdout.write(f'engine: {engine_s * 1000:.1f} ms (+ {build_s * 1000:.1f} ms one-off build)')
+        if engine_s > 0:
+            self.stdout.write(f'speedup: {loop_s / engine_s:.1f}x')
+        self.stdout.write(self.style.SUCCESS(f'max abs difference after rounding: {max_diff:.2f}'))
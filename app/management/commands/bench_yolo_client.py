@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+import statistics
+import time
+import requests
+from app.standin import start_in_thread
+from app.yolo import get_session
+
+
+class Command(BaseCommand):
+    help = 'Compare fresh-connection requests.post against the pooled YOLO session on a local stand-in /predict server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per client')
+        parser.add_argument('--payload-kb', type=int, default=64, help='Size of the fake image upload')
+
+    def handle(self, *args, **options):
+        server = start_in_thread()
+        url = server.url
+        payload = b'\xff' * (options['payload_kb'] * 1024)
+        n = options['requests']
+        try:
+            fresh = self._run(lambda: requests.post(url, files={'file': ('x.jpg', payload)}, timeout=(5, 30)), n)
+            session = get_session()
+            session.post(url, files={'file': ('x.jpg', payload)}, timeout=(5, 30))  # open the pooled connection
+            pooled = self._run(lambda: session.post(url, files={'file': ('x.jpg', payload)}, timeout=(5, 30)), n)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        for label, samples in (('requests.post (new connection)', fresh), ('pooled session (keep-alive)', pooled)):
+            self.stdout.write(
+                f'{label:32s} mean={statistics.mean(samples):.2f} ms  p50={statistics.median(samples):.2f} ms  '
+                f'p95={sorted(samples)[int(len(samples) * 0.95) - 1]:.2f} ms'
+            )
+        saved = statistics.mean(fresh) - statistics.mean(pooled)
+        self.stdout.write(self.style.SUCCESS(f'saved per scan: {saved:.2f} ms on loopback (TLS to a remote Space saves far more)'))
+
+    def _run(self, call, n):
+        samples = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            resp = call()
+            resp.json()
+            samples.append((time.perf_counter() - t0) * 1000)
+        return samples
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from app.rollups import check_consistency
+
+
+class Command(BaseCommand):
+    help = 'Compare the DailyTotals rollup with MealLog and report (or --fix) drifted days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only check this user id (repeatable)')
+        parser.add_argument('--fix', action='store_true', help='Refresh every day that does not match')
+        parser.add_argument('--limit', type=int, default=50, help='Problems to print')
+
+    def handle(self, *args, **options):
+        problems = check_consistency(user_ids=options['users'], fix=options['fix'])
+        for user_id, d, problem in problems[:options['limit']]:
+            self.stdout.write(f'user={user_id} date={d}: {problem}')
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('DailyTotals is consistent with MealLog'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(problems)} day(s)'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(problems)} inconsistent day(s); rerun with --fix'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from app.scan_jobs import cleanup_stale_jobs
+
+
+class Command(BaseCommand):
+    help = 'Fail scan jobs stuck past SCAN_JOB_TIMEOUT and delete finished jobs older than SCAN_JOB_RETENTION'
+
+    def handle(self, *args, **options):
+        timed_out, deleted = cleanup_stale_jobs()
+        self.stdout.write(self.style.SUCCESS(f"Cleanup complete: timed_out={timed_out}, deleted={deleted}"))
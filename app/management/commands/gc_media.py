@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from app.storage import collect_garbage
+
+
+class Command(BaseCommand):
+    help = ('Delete stored scan images older than MEDIA_RETENTION, and images no ScanJob references once they are '
+            'older than MEDIA_GC_GRACE. Streams through the sharded directory tree.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=float, help='Override MEDIA_RETENTION')
+        parser.add_argument('--grace-seconds', type=float, help='Override MEDIA_GC_GRACE')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        max_age = options['max_age_days'] * 86400 if options['max_age_days'] is not None else None
+        result = collect_garbage(max_age=max_age, grace=options['grace_seconds'], dry_run=options['dry_run'])
+        prefix = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {result['expired']} expired and {result['unreferenced']} unreferenced image(s) "
+            f"({result['bytes_freed'] / 1048576:.1f} MB) of {result['scanned']} scanned; "
+            f"removed {result['dirs_removed']} empty director(ies)"
+        ))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand, CommandError
 from app.models import Nutrition
+from app.recipe_nutrition import deferred_rebuild
 import os
 import pandas as pd
 
@@ -27,34 +28,36 @@ class Command(BaseCommand):
         updated = 0
         skipped = 0
 
-        for _, row in df.iterrows():
-            try:
-                ingredient = str(row['ingredient']).strip()
-                if not ingredient:
+        # defer RecipeNutrition recomputation to one batched rebuild after the import
+        with deferred_rebuild():
+            for _, row in df.iterrows():
+                try:
+                    ingredient = str(row['ingredient']).strip()
+                    if not ingredient:
+                        skipped += 1
+                        continue
+                    data = {
+                        'calories': float(row.get('calories') or 0.0),
+                        'protein_g': float(row.get('protein_g') or 0.0),
+                        'fat_g': float(row.get('fat_g') or 0.0),
+                        'carbs_g': float(row.get('carbs_g') or 0.0),
+                        'fiber_g': float(row.get('fiber_g') or 0.0),
+                    }
+
+                    if dry_run:
+                        self.stdout.write(f"Would import: {ingredient} -> {data}")
+                        continue
+
+                    obj, created_flag = Nutrition.objects.update_or_create(
+                        ingredient=ingredient,
+                        defaults=data
+                    )
+                    if created_flag:
+                        created += 1
+                    else:
+                        updated += 1
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING(f"Skipping row due to error: {e}"))
                     skipped += 1
-                    continue
-                data = {
-                    'calories': float(row.get('calories') or 0.0),
-                    'protein_g': float(row.get('protein_g') or 0.0),
-                    'fat_g': float(row.get('fat_g') or 0.0),
-                    'carbs_g': float(row.get('carbs_g') or 0.0),
-                    'fiber_g': float(row.get('fiber_g') or 0.0),
-                }
-
-                if dry_run:
-                    self.stdout.write(f"Would import: {ingredient} -> {data}")
-                    continue
-
-                obj, created_flag = Nutrition.objects.update_or_create(
-                    ingredient=ingredient,
-                    defaults=data
-                )
-                if created_flag:
-                    created += 1
-                else:
-                    updated += 1
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f"Skipping row due to error: {e}"))
-                skipped += 1
 
         self.stdout.write(self.style.SUCCESS(f"Import complete: created={created}, updated={updated}, skipped={skipped}"))
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand, CommandError
 from app.models import Recipe
+from app.recipe_nutrition import deferred_rebuild
 import os
 import json
 
@@ -21,43 +22,45 @@ class Command(BaseCommand):
         updated = 0
         skipped = 0
 
-        with open(path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    dish, ing_part = line.split('::', 1)
-                except ValueError:
-                    self.stdout.write(self.style.WARNING(f"Skipping invalid line: {line}"))
-                    skipped += 1
-                    continue
-
-                dish = dish.strip()
-                ingredients = {}
-                for item in ing_part.split(','):
-                    item = item.strip()
-                    if not item:
+        # defer RecipeNutrition recomputation to one batched rebuild after the import
+        with deferred_rebuild():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
                         continue
                     try:
-                        name, grams = item.split('=', 1)
-                        ingredients[name.strip()] = float(grams.strip())
-                    except Exception:
-                        self.stdout.write(self.style.WARNING(f"Skipping invalid ingredient '{item}' for dish '{dish}'"))
-
-                if dry_run:
-                    self.stdout.write(f"Would import: {dish} -> {json.dumps(ingredients)}")
-                    continue
-
-                obj, created_flag = Recipe.objects.update_or_create(
-                    name=dish,
-                    defaults={
-                        'ingredients': ingredients
-                    }
-                )
-                if created_flag:
-                    created += 1
-                else:
-                    updated += 1
+                        dish, ing_part = line.split('::', 1)
+                    except ValueError:
+                        self.stdout.write(self.style.WARNING(f"Skipping invalid line: {line}"))
+                        skipped += 1
+                        continue
+
+                    dish = dish.strip()
+                    ingredients = {}
+                    for item in ing_part.split(','):
+                        item = item.strip()
+                        if not item:
+                            continue
+                        try:
+                            name, grams = item.split('=', 1)
+                            ingredients[name.strip()] = float(grams.strip())
+                        except Exception:
+                            self.stdout.write(self.style.WARNING(f"Skipping invalid ingredient '{item}' for dish '{dish}'"))
+
+                    if dry_run:
+                        self.stdout.write(f"Would import: {dish} -> {json.dumps(ingredients)}")
+                        continue
+
+                    obj, created_flag = Recipe.objects.update_or_create(
+                        name=dish,
+                        defaults={
+                            'ingredients': ingredients
+                        }
+                    )
+                    if created_flag:
+                        created += 1
+                    else:
+                        updated += 1
 
         self.stdout.write(self.style.SUCCESS(f"Import complete: created={created}, updated={updated}, skipped={skipped}"))
\ No newline at end of file
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from unittest.mock import patch
+from app import yolo
+from app.loadtest import ScanLoadTest, STEPS
+from app.standin import start_in_thread
+from .yolo_standin import add_standin_arguments, config_from_options
+import tempfile
+
+
+class Command(BaseCommand):
+    help = ('Load-test the scan path: N concurrent virtual users run login -> upload -> weights against the dashboard view. '
+            'Reports throughput, latency percentiles and DB queries per step. Creates loadtest_* users and removes them, '
+            'and the detection results of their uploads, afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Virtual users (one thread each)')
+        parser.add_argument('--iterations', type=int, default=5, help='Meals scanned per user')
+        parser.add_argument('--backend', choices=['standin', 'stub', 'remote'], default='standin',
+                            help="'standin' starts a local /predict server (default); 'remote' uses YOLO_API_URL")
+        parser.add_argument('--mode', choices=['sync', 'thread'], default='sync', help='SCAN_JOBS_MODE during the run')
+        parser.add_argument('--same-image', action='store_true', help='Upload identical bytes (exercises the detection cache)')
+        parser.add_argument('--image-kb', type=int, default=64)
+        parser.add_argument('--grams', default='150')
+        parser.add_argument('--keep-users', action='store_true')
+        add_standin_arguments(parser)
+
+    def handle(self, *args, **options):
+        test = ScanLoadTest(users=options['users'], iterations=options['iterations'], grams=options['grams'],
+                            same_image=options['same_image'], image_kb=options['image_kb'])
+        server = None
+        overrides = {
+            'SCAN_JOBS_MODE': options['mode'],
+            # stand-in results get their own cache namespace, never the real 'remote' one
+            'DETECTION_BACKEND': options['backend'],
+            'ALLOWED_HOSTS': list(settings.ALLOWED_HOSTS) + ['testserver'],
+        }
+        with tempfile.TemporaryDirectory() as media:
+            overrides['MEDIA_ROOT'] = media
+            url_patch = None
+            if options['backend'] == 'standin':
+                server = start_in_thread(config_from_options(options))
+                url_patch = patch.object(yolo, 'YOLO_API_URL', server.url)
+                url_patch.start()
+            test.create_users()
+            try:
+                with override_settings(**overrides):
+                    result = test.run()
+            finally:
+                if url_patch:
+                    url_patch.stop()
+                if server:
+                    server.shutdown()
+                    server.server_close()
+                test.delete_detections(overrides['DETECTION_BACKEND'])
+                if not options['keep_users']:
+                    test.delete_users()
+
+        self.stdout.write(f"{result['users']} users x {result['iterations']} meals: {result['completed_meals']} completed "
+                          f"in {result['wall_seconds']}s ({result['meals_per_second']} meals/s)")
+        self.stdout.write(f"{'step':8s} {'count':>6s} {'errors':>6s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'queries avg/max':>16s}")
+        fmt = lambda v: f'{v:9.1f}' if v is not None else f"{'-':>9s}"
+        for step in STEPS:
+            s = result['steps'][step]
+            self.stdout.write(f"{step:8s} {s['count']:6d} {s['errors']:6d} {fmt(s['p50_ms'])} {fmt(s['p95_ms'])} {fmt(s['p99_ms'])} "
+                              f"{s['avg_queries']:>10.1f}/{s['max_queries']:<5d}")
+        if server:
+            self.stdout.write(f'stand-in served {server.config.requests} predictions ({server.config.errors} injected errors)')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from app.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyTotals rollup from MealLog (all users, or --user ID ...). Run once after migrating.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only rebuild this user id (repeatable)')
+
+    def handle(self, *args, **options):
+        written = rebuild(user_ids=options['users'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily total row(s)'))
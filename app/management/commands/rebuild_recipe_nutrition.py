@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from app.recipe_nutrition import rebuild_recipe_nutrition
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized per-100g RecipeNutrition table and its ingredient dependency index'
+
+    def handle(self, *args, **options):
+        count = rebuild_recipe_nutrition()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt nutrition for {count} recipes"))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from app.scan_jobs import run_pending, cleanup_stale_jobs
+import time
+
+
+class Command(BaseCommand):
+    help = 'Run pending scan jobs (use with SCAN_JOBS_MODE=worker). Also times out and cleans up stale jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0.5, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--batch', type=int, default=10, help='Jobs to claim per iteration')
+        parser.add_argument('--once', action='store_true', help='Process the current queue once and exit')
+
+    def handle(self, *args, **options):
+        last_cleanup = 0.0
+        while True:
+            if time.monotonic() - last_cleanup > 60:
+                timed_out, deleted = cleanup_stale_jobs()
+                if timed_out or deleted:
+                    self.stdout.write(f"Cleanup: timed_out={timed_out}, deleted={deleted}")
+                last_cleanup = time.monotonic()
+            done = run_pending(limit=options['batch'])
+            if done:
+                self.stdout.write(self.style.SUCCESS(f"Processed {done} scan job(s)"))
+            if options['once']:
+                return
+            if not done:
+                time.sleep(options['interval'])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from app.models import UnresolvedLabel
+
+
+class Command(BaseCommand):
+    help = 'List detected food labels that matched no recipe, ingredient or alias (most frequent first)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50, help='Number of labels to show')
+        parser.add_argument('--clear', action='store_true', help='Delete the recorded labels after listing them')
+
+    def handle(self, *args, **options):
+        rows = list(UnresolvedLabel.objects.all()[:options['limit']])
+        if not rows:
+            self.stdout.write(self.style.SUCCESS('No unresolved labels recorded'))
+            return
+        for row in rows:
+            self.stdout.write(f"{row.count:6d}  {row.label}  (last seen {row.last_seen:%Y-%m-%d %H:%M})")
+        if options['clear']:
+            UnresolvedLabel.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS('Cleared unresolved labels'))
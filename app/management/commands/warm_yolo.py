@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from app.warmer import warmer, YOLO_WARM_INTERVAL
+import time
+
+
+class Command(BaseCommand):
+    help = 'Ping the detection Space on a schedule so scans do not pay its cold start. Run one per deployment.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=YOLO_WARM_INTERVAL or 300,
+                            help='Seconds between pings (default: YOLO_WARM_INTERVAL or 300)')
+        parser.add_argument('--once', action='store_true', help='Ping once, print the state and exit')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Pinging {warmer.url} every {options['interval']}s")
+        while True:
+            state = warmer.ping()
+            latency_ms = warmer.last_latency * 1000
+            line = f"{state} ({latency_ms:.0f} ms, cold starts so far: {warmer.cold_starts})"
+            self.stdout.write(self.style.SUCCESS(line) if state == warmer.WARM else self.style.WARNING(line))
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from app.standin import StandInConfig, make_server
+
+
+def add_standin_arguments(parser):
+    parser.add_argument('--latency-ms', type=float, default=150.0, help='Typical inference latency')
+    parser.add_argument('--distribution', choices=StandInConfig.DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--sigma', type=float, default=0.5, help='Spread of the lognormal distribution')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--foods', default='Rice,Dal', help='Comma-separated labels to return')
+    parser.add_argument('--foods-per-image', type=int, default=0, help='Return a random subset of this size (0 = all)')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def config_from_options(options):
+    return StandInConfig(
+        latency_ms=options['latency_ms'], distribution=options['distribution'], sigma=options['sigma'],
+        error_rate=options['error_rate'], error_status=options['error_status'],
+        foods=[f.strip() for f in options['foods'].split(',') if f.strip()],
+        foods_per_image=options['foods_per_image'], seed=options['seed'],
+    )
+
+
+class Command(BaseCommand):
+    help = 'Run a local stand-in for the YOLO /predict service with configurable latency, errors and payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        add_standin_arguments(parser)
+
+    def handle(self, *args, **options):
+        server = make_server(config_from_options(options), options['host'], options['port'])
+        self.stdout.write(self.style.SUCCESS(f'Stand-in listening on {server.url}'))
+        self.stdout.write(f'Point the app at it with YOLO_API_URL={server.url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            config = server.config
+            self.stdout.write(f'Served {config.requests} requests ({config.errors} injected errors)')
@@ -0,0 +1,39 @@
+import hmac
+
+from django.conf import settings
+from django.http import JsonResponse, HttpResponseForbidden
+
+# name -> zero-argument callable returning a JSON-serializable dict
+_providers = {}
+
+
+def register(name, provider):
+    """Expose `provider()` under `name` on the /metrics/ endpoint."""
+    _providers[name] = provider
+
+
+def snapshot():
+    out = {}
+    for name, provider in sorted(_providers.items()):
+        try:
+            out[name] = provider()
+        except Exception as e:
+            out[name] = {'error': str(e)}
+    return out
+
+
+def _authorized(request):
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return False
+    header = request.headers.get('Authorization', '')
+    return hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+
+
+def metrics_view(request):
+    """JSON snapshot of in-process caches and counters (staff users or METRICS_TOKEN)."""
+    if not _authorized(request):
+        return HttpResponseForbidden('metrics: staff login or METRICS_TOKEN required')
+    return JsonResponse(snapshot())
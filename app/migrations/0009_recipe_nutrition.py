@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_nutrition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeNutrition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('calories', models.FloatField(default=0.0)),
+                ('protein_g', models.FloatField(default=0.0)),
+                ('fat_g', models.FloatField(default=0.0)),
+                ('carbs_g', models.FloatField(default=0.0)),
+                ('fiber_g', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='per_100g', to='app.recipe')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ingredient', models.CharField(db_index=True, max_length=200)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_links', to='app.recipe')),
+            ],
+            options={
+                'unique_together': {('recipe', 'ingredient')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_recipe_nutrition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnresolvedLabel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=200, unique=True)),
+                ('count', models.IntegerField(default=0)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-count'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FoodAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=200, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('nutrition', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='app.nutrition')),
+                ('recipe', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='app.recipe')),
+            ],
+            options={
+                'verbose_name_plural': 'food aliases',
+                'ordering': ['alias'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_scan_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanjob',
+            name='image_paths',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
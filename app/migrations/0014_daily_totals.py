@@ -0,0 +1,86 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:34
+
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# MealLog has no local_date yet: days are taken in the default profile timezone,
+# which is what 0016 assigns to every existing profile
+DEFAULT_TIMEZONE = 'Asia/Kolkata'
+DEFAULT_GOAL = 2000
+TOTAL_FIELDS = ('calories', 'protein_g', 'fat_g', 'carbs_g', 'fiber_g')
+
+
+def _goal(sex, age, height_cm, weight_kg):
+    # Profile.bmr() (Mifflin-St Jeor); model methods are not available in migrations
+    if not (age and height_cm and weight_kg):
+        return DEFAULT_GOAL
+    base = 10 * weight_kg + 6.25 * height_cm - 5 * age
+    if sex == 'M':
+        val = base + 5
+    elif sex == 'F':
+        val = base - 161
+    else:
+        val = base - 78
+    return int(round(val)) or DEFAULT_GOAL
+
+
+def backfill_daily_totals(apps, schema_editor):
+    MealLog = apps.get_model('app', 'MealLog')
+    Profile = apps.get_model('app', 'Profile')
+    DailyTotals = apps.get_model('app', 'DailyTotals')
+    tz = ZoneInfo(DEFAULT_TIMEZONE)
+    goals = {row[0]: _goal(*row[1:]) for row in Profile.objects.values_list('user_id', 'sex', 'age', 'height_cm', 'weight_kg')}
+    days = {}
+    for row in MealLog.objects.values_list('user_id', 'created_at', *TOTAL_FIELDS).iterator(chunk_size=2000):
+        key = (row[0], django.utils.timezone.localtime(row[1], tz).date())
+        sums = days.get(key)
+        if sums is None:
+            sums = days[key] = [0.0] * len(TOTAL_FIELDS) + [0]
+        for i, value in enumerate(row[2:]):
+            sums[i] += value or 0
+        sums[-1] += 1
+    rows = []
+    for (user_id, d), sums in days.items():
+        values = {f: round(v, 2) for f, v in zip(TOTAL_FIELDS, sums)}
+        rows.append(DailyTotals(
+            user_id=user_id, local_date=d, meal_count=sums[-1],
+            goal_achieved=values['calories'] > 0 and values['calories'] >= goals.get(user_id, DEFAULT_GOAL),
+            **values,
+        ))
+    DailyTotals.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0013_scanjob_image_paths'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('local_date', models.DateField()),
+                ('calories', models.FloatField(default=0.0)),
+                ('protein_g', models.FloatField(default=0.0)),
+                ('fat_g', models.FloatField(default=0.0)),
+                ('carbs_g', models.FloatField(default=0.0)),
+                ('fiber_g', models.FloatField(default=0.0)),
+                ('meal_count', models.IntegerField(default=0)),
+                ('goal_achieved', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'daily totals',
+                'unique_together': {('user', 'local_date')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_daily_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='streak_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='streak_last_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
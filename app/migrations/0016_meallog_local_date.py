@@ -0,0 +1,64 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db import migrations, models
+import django.utils.timezone
+
+DEFAULT_TIMEZONE = 'Asia/Kolkata'
+
+
+def _zone(name):
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def backfill_local_date(apps, schema_editor):
+    MealLog = apps.get_model('app', 'MealLog')
+    Profile = apps.get_model('app', 'Profile')
+    zones = {user_id: _zone(name) for user_id, name in Profile.objects.values_list('user_id', 'timezone')}
+    default = _zone(DEFAULT_TIMEZONE)
+    batch = []
+    for meal in MealLog.objects.only('id', 'user_id', 'created_at').iterator(chunk_size=2000):
+        meal.local_date = django.utils.timezone.localtime(meal.created_at, zones.get(meal.user_id, default)).date()
+        batch.append(meal)
+        if len(batch) >= 2000:
+            MealLog.objects.bulk_update(batch, ['local_date'])
+            batch = []
+    if batch:
+        MealLog.objects.bulk_update(batch, ['local_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_profile_streak'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='timezone',
+            field=models.CharField(default='Asia/Kolkata', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='meallog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='meallog',
+            name='local_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_local_date, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='meallog',
+            name='local_date',
+            field=models.DateField(db_index=True, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='meallog',
+            index=models.Index(fields=['user', 'local_date', 'created_at'], name='meallog_user_day_idx'),
+        ),
+    ]
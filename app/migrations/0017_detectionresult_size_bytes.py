@@ -0,0 +1,27 @@
+import json
+
+from django.db import migrations, models
+
+
+def backfill_size_bytes(apps, schema_editor):
+    DetectionResult = apps.get_model('app', 'DetectionResult')
+    rows = list(DetectionResult.objects.only('id', 'sha256', 'foods'))
+    for row in rows:
+        row.size_bytes = len(row.sha256) + len(json.dumps(row.foods).encode())
+    DetectionResult.objects.bulk_update(rows, ['size_bytes'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_meallog_local_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionresult',
+            name='size_bytes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_size_bytes, migrations.RunPython.noop),
+    ]
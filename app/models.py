@@ -1,7 +1,11 @@
+import uuid
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.text import slugify
 
+from .timezones import DEFAULT_TIMEZONE, local_date, user_timezone
+
 # MealLog_Model
 class MealLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -14,14 +18,49 @@ class MealLog(models.Model):
     carbs_g = models.FloatField()
     fiber_g = models.FloatField()
     items_json = models.TextField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # calendar day of created_at in the user's timezone, filled in by save()
+    local_date = models.DateField(db_index=True, editable=False)
     running_calories = models.FloatField(default=0)
     day_goal_achieved = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', 'local_date', 'created_at'], name='meallog_user_day_idx')]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'created_at', 'user'} & set(update_fields):
+            self.local_date = local_date(self.created_at, user_timezone(self.user_id, fresh=True))
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'local_date'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.user.username} - {self.meal_name} - {self.created_at}"
 
 
+# DailyTotals_Model
+class DailyTotals(models.Model):
+    """Per-user, per-local-day sums of MealLog, kept current by `app.rollups`."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_totals')
+    local_date = models.DateField()
+    calories = models.FloatField(default=0.0)
+    protein_g = models.FloatField(default=0.0)
+    fat_g = models.FloatField(default=0.0)
+    carbs_g = models.FloatField(default=0.0)
+    fiber_g = models.FloatField(default=0.0)
+    meal_count = models.IntegerField(default=0)
+    goal_achieved = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'local_date')
+        verbose_name_plural = 'daily totals'
+
+    def __str__(self):
+        return f"{self.user.username} {self.local_date}: {self.calories} kcal"
+
+
 # Profile_Model
 class Profile(models.Model):
     SEX_CHOICES = (
@@ -35,6 +74,11 @@ class Profile(models.Model):
     age = models.IntegerField(null=True, blank=True)
     height_cm = models.FloatField(null=True, blank=True)
     weight_kg = models.FloatField(null=True, blank=True)
+    # current run of consecutive active days, maintained by app.streaks
+    streak_count = models.PositiveIntegerField(default=0)
+    streak_last_date = models.DateField(null=True, blank=True)
+    # IANA name used to assign meals to calendar days (MealLog.local_date)
+    timezone = models.CharField(max_length=64, default=DEFAULT_TIMEZONE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -131,6 +175,129 @@ class Nutrition(models.Model):
         return self.ingredient
 
 
+class RecipeNutrition(models.Model):
+    """Materialized per-100g nutrition of a Recipe (see `app.recipe_nutrition`)."""
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE, related_name='per_100g')
+    calories = models.FloatField(default=0.0)
+    protein_g = models.FloatField(default=0.0)
+    fat_g = models.FloatField(default=0.0)
+    carbs_g = models.FloatField(default=0.0)
+    fiber_g = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.recipe} per 100g"
+
+
+class RecipeIngredient(models.Model):
+    """Dependency index: which recipes use which ingredient."""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='ingredient_links')
+    ingredient = models.CharField(max_length=200, db_index=True)
+
+    class Meta:
+        unique_together = ('recipe', 'ingredient')
+
+    def __str__(self):
+        return f"{self.recipe} <- {self.ingredient}"
+
+
+class FoodAlias(models.Model):
+    """Admin-editable alternative label for a Recipe or a Nutrition ingredient."""
+    alias = models.CharField(max_length=200, unique=True)
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, null=True, blank=True, related_name='aliases')
+    nutrition = models.ForeignKey(Nutrition, on_delete=models.CASCADE, null=True, blank=True, related_name='aliases')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['alias']
+        verbose_name_plural = 'food aliases'
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if bool(self.recipe_id) == bool(self.nutrition_id):
+            raise ValidationError('Link the alias to exactly one of recipe or nutrition.')
+
+    def __str__(self):
+        return f"{self.alias} -> {self.recipe or self.nutrition}"
+
+
+class UnresolvedLabel(models.Model):
+    """Detected food labels that matched no recipe, ingredient or alias."""
+    label = models.CharField(max_length=200, unique=True)
+    count = models.IntegerField(default=0)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-count']
+
+    def __str__(self):
+        return f"{self.label} ({self.count})"
+
+
+class DetectionResult(models.Model):
+    """Cached detection output keyed by the SHA-256 of the uploaded image bytes."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    foods = models.JSONField(default=list)
+    image_size = models.IntegerField(default=0)
+    # bytes of the stored payload (key + JSON), counted against DETECTION_CACHE_MAX_BYTES
+    size_bytes = models.IntegerField(default=0)
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} -> {self.foods}"
+
+
+class ScanJob(models.Model):
+    """Background food detection for one meal's uploaded images (see `app.scan_jobs`)."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scan_jobs')
+    image_path = models.CharField(max_length=500)
+    # every photo of the meal when more than one was uploaded (image_path is the first)
+    image_paths = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    foods = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    @property
+    def paths(self):
+        return list(self.image_paths) or [self.image_path]
+
+    def as_dict(self):
+        return {
+            'token': str(self.token),
+            'status': self.status,
+            'foods': self.foods if self.status == self.DONE else [],
+            'error': self.error,
+        }
+
+    def __str__(self):
+        return f"{self.user.username} scan {self.token} ({self.status})"
+
+
 # Ensure a Profile exists for every User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -1,8 +1,121 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import metrics
+from .aliases import alias_index
 from .models import Nutrition
 
 
-def calculate_nutrition_from_recipe(recipe_dict, user_grams):
-    # recipe_dict = proportional grams (NOT final grams)
+NUTRIENT_COLS = ["calories", "protein_g", "fat_g", "carbs_g", "fiber_g"]
+
+# shared cache key bumped whenever a Nutrition row changes; every worker compares
+# it with the version its in-memory table was loaded at
+NUTRITION_VERSION_KEY = 'nutrition_table_version'
+
+
+class NutritionTable:
+    """In-memory ingredient -> per-100g nutrient vector table.
+
+    - Loaded from the DB once per worker on first use (one query for all rows).
+    - Reloaded when the shared version counter changes (bumped by post_save/post_delete),
+      and in any case once it is NUTRITION_TABLE_MAX_AGE seconds old, so changes this
+      worker cannot see a bump for (per-process cache, another process, bulk updates)
+      are picked up within that bound.
+    - Keeps hit/miss counters for lookups, see `stats()`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = None
+        self._version = None
+        self._loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def _current_version(self):
+        try:
+            return cache.get(NUTRITION_VERSION_KEY, 0)
+        except Exception:
+            return None
+
+    def _fresh(self, version):
+        max_age = getattr(settings, 'NUTRITION_TABLE_MAX_AGE', 60)
+        return (self._rows is not None and version == self._version
+                and time.monotonic() - self._loaded_at < max_age)
+
+    def _ensure_loaded(self):
+        version = self._current_version()
+        if self._fresh(version):
+            return self._rows
+        with self._lock:
+            if not self._fresh(version):
+                rows = {}
+                for row in Nutrition.objects.values_list('ingredient', *NUTRIENT_COLS):
+                    rows[row[0]] = tuple(float(v or 0.0) for v in row[1:])
+                self._rows = rows
+                self._version = version
+                self._loaded_at = time.monotonic()
+                self.loads += 1
+        return self._rows
+
+    def get(self, ingredient):
+        """Return the nutrient vector (tuple in NUTRIENT_COLS order) or None."""
+        return self.get_many([ingredient]).get(ingredient)
+
+    def get_many(self, ingredients):
+        """Return {ingredient: vector} for the known ingredients only."""
+        rows = self._ensure_loaded()
+        out = {}
+        for ing in ingredients:
+            vec = rows.get(ing)
+            if vec is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                out[ing] = vec
+        return out
+
+    def invalidate(self):
+        """Drop the local table and bump the shared version so other workers reload too."""
+        with self._lock:
+            self._rows = None
+        try:
+            cache.incr(NUTRITION_VERSION_KEY)
+        except ValueError:
+            cache.set(NUTRITION_VERSION_KEY, 1, None)
+        except Exception:
+            pass
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._rows) if self._rows is not None else 0,
+            'version': self._version,
+            'loads': self.loads,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+nutrition_table = NutritionTable()
+metrics.register('nutrition_table', nutrition_table.stats)
+
+
+@receiver(post_save, sender=Nutrition)
+@receiver(post_delete, sender=Nutrition)
+def invalidate_nutrition_table(sender, **kwargs):
+    nutrition_table.invalidate()
+
+
+def _recipe_totals(recipe_dict, user_grams, vectors):
+    """Scale `recipe_dict` (proportional grams) to `user_grams` using the given ingredient vectors."""
     recipe_total = sum(recipe_dict.values())
 
     if recipe_total <= 0:
@@ -18,33 +131,38 @@ def calculate_nutrition_from_recipe(recipe_dict, user_grams):
         "fiber_g": 0.0
     }
 
+    for ingredient, base_grams in recipe_dict.items():
+        vec = vectors.get(ingredient)
+        if vec is None:
+            # ingredient not found in DB -> skip
+            continue
+
+        actual_grams = base_grams * scale
+        factor = actual_grams / 100.0
+
+        for col, val in zip(NUTRIENT_COLS, vec):
+            totals[col] += val * factor
+
+    for k in totals:
+        totals[k] = round(totals[k], 2)
+
+    return totals
+
+
+def _ingredient_totals(vec, grams):
+    return {col: round((val * grams) / 100.0, 2) for col, val in zip(NUTRIENT_COLS, vec)}
+
+
+def calculate_nutrition_from_recipe(recipe_dict, user_grams):
+    # recipe_dict = proportional grams (NOT final grams)
+    if sum(recipe_dict.values()) <= 0:
+        return None
     try:
-        for ingredient, base_grams in recipe_dict.items():
-            try:
-                ni = Nutrition.objects.get(ingredient=ingredient)
-            except Nutrition.DoesNotExist:
-                # ingredient not found in DB -> skip
-                continue
-
-            actual_grams = base_grams * scale
-            factor = actual_grams / 100.0
-
-            totals["calories"] += ni.calories * factor
-            totals["protein_g"] += ni.protein_g * factor
-            totals["fat_g"] += ni.fat_g * factor
-            totals["carbs_g"] += ni.carbs_g * factor
-            totals["fiber_g"] += ni.fiber_g * factor
-
-        for k in totals:
-            totals[k] = round(totals[k], 2)
-
-        return totals
+        vectors = nutrition_table.get_many(recipe_dict.keys())
     except Exception:
         # If DB access fails, return None
         return None
-
-
-NUTRIENT_COLS = ["calories", "protein_g", "fat_g", "carbs_g", "fiber_g"]
+    return _recipe_totals(recipe_dict, user_grams, vectors)
 
 
 def calculate_nutrition_for_raw_ingredient(ingredient, grams):
@@ -53,15 +171,75 @@ def calculate_nutrition_for_raw_ingredient(ingredient, grams):
     grams: consumed grams
     """
     try:
-        ni = Nutrition.objects.get(ingredient=ingredient)
-    except Nutrition.DoesNotExist:
-        return None
+        vec = nutrition_table.get(ingredient)
     except Exception:
         return None
+    if vec is None:
+        return None
 
-    totals = {}
-    for col in NUTRIENT_COLS:
-        val = getattr(ni, col)
-        totals[col] = round((val * grams) / 100.0, 2)
+    return _ingredient_totals(vec, grams)
 
-    return totals
\ No newline at end of file
+
+def calculate_meal(items):
+    """Compute nutrition for a whole meal in a constant number of queries.
+
+    items: list of (food, grams) where food is a detected label for a recipe or a raw ingredient.
+    - Labels are resolved through the in-memory alias index (case, spacing, underscores,
+      plurals and admin-defined aliases); unresolved labels are reported once per call.
+    - Matched recipes come from `recipe_cache`; cold ones are fetched with one `pk__in`
+      query, joined with their materialized per-100g row.
+    - Recipes without a materialized row and raw ingredients use `nutrition_table`
+      (one query when cold, none when warm).
+    Returns {'items': [{'food', 'grams', 'nutrition'}, ...], 'total': {...}}; foods
+    without nutrition data are left out of both.
+    """
+    from .recipe import get_recipes_by_id  # app.recipe imports NUTRIENT_COLS from here
+
+    items = list(items)
+    resolved, unresolved = alias_index.resolve_many({food for food, _ in items})
+    if unresolved:
+        alias_index.report_unresolved(unresolved)
+
+    recipe_ids = {hit.pk for hit in resolved.values() if hit.kind == 'recipe'}
+    by_id = get_recipes_by_id(recipe_ids) if recipe_ids else {}
+
+    per_100g = {}
+    recipes = {}
+    ingredient_of = {}
+    needed = set()
+    for food, hit in resolved.items():
+        r = by_id.get(hit.pk) if hit.kind == 'recipe' else None
+        if r is None or not r.ingredients:
+            # raw ingredient (or a recipe with no ingredients, looked up as an ingredient like before)
+            name = hit.name if hit.kind == 'ingredient' else food
+            ingredient_of[food] = name
+            needed.add(name)
+            continue
+        materialized = getattr(r, 'per_100g', None)
+        if materialized is not None:
+            per_100g[food] = tuple(getattr(materialized, c) for c in NUTRIENT_COLS)
+        else:
+            recipes[food] = r.ingredients
+            needed.update(r.ingredients.keys())
+    vectors = nutrition_table.get_many(needed) if needed else {}
+
+    out = []
+    total = {"grams": 0, "calories": 0, "protein_g": 0, "fat_g": 0, "carbs_g": 0, "fiber_g": 0}
+    for food, grams in items:
+        if food in per_100g:
+            nutrition = _ingredient_totals(per_100g[food], grams)
+        elif food in recipes:
+            nutrition = _recipe_totals(recipes[food], grams, vectors)
+        else:
+            vec = vectors.get(ingredient_of.get(food))
+            nutrition = _ingredient_totals(vec, grams) if vec is not None else None
+        if not nutrition:
+            continue
+        out.append({"food": food, "grams": grams, "nutrition": nutrition})
+        total["grams"] += grams
+        for k in NUTRIENT_COLS:
+            total[k] += nutrition[k]
+
+    for k in total:
+        total[k] = round(total[k], 2)
+    return {"items": out, "total": total}
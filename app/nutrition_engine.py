@@ -0,0 +1,227 @@
+import threading
+
+import numpy as np
+
+from .models import Recipe, Nutrition
+from .nutrition import NUTRIENT_COLS
+
+
+class RecipeNutritionEngine:
+    """Vectorized recipe nutrition backed by precompiled matrices.
+
+    - W: sparse recipe x ingredient matrix (CSR arrays) holding each ingredient's share
+      of the recipe weight (base_grams / recipe_total).
+    - N: dense ingredient x nutrient matrix (per 100g, NUTRIENT_COLS order).
+    - P = W @ N: per-100g nutrient vector per recipe, so any number of (recipe, grams)
+      pairs is a single product `grams @ P[rows] / 100`.
+
+    Results follow `calculate_nutrition_from_recipe` (ingredients missing from Nutrition
+    contribute nothing but still count towards the recipe total); the summation order
+    differs, so a value sitting exactly on a rounding boundary may differ by 0.01.
+    Single recipe or ingredient changes only recompute the affected rows of P.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._reset()
+
+    def _reset(self):
+        self._ing_index = {}                        # ingredient name -> column
+        self._N = np.zeros((0, len(NUTRIENT_COLS)))
+        self._rows = {}                             # recipe id -> (cols, weights) or None
+        self._row_index = {}                        # recipe id -> row in P
+        self._P = np.zeros((0, len(NUTRIENT_COLS)))
+        self._valid = np.zeros(0, dtype=bool)
+        self._users = {}                            # column -> set(recipe ids)
+        self._keys = {}                             # slug/name -> recipe id
+        self._recipe_keys = {}                      # recipe id -> (slug, name)
+        self._csr = None
+
+    # -- building -----------------------------------------------------------------
+
+    def build(self):
+        """Compile all Recipe and Nutrition rows (two queries) into the matrices."""
+        with self._lock:
+            self._reset()
+            for row in Nutrition.objects.values_list('ingredient', *NUTRIENT_COLS):
+                self._set_ingredient_vector(row[0], row[1:])
+            recipes = list(Recipe.objects.values_list('id', 'slug', 'name', 'ingredients'))
+            self._P = np.zeros((len(recipes), len(NUTRIENT_COLS)))
+            self._valid = np.zeros(len(recipes), dtype=bool)
+            for rid, slug, name, ingredients in recipes:
+                self._row_index[rid] = len(self._row_index)
+                self._index_recipe(rid, slug, name, ingredients)
+            indptr, indices, data = self.matrix()
+            self._P = _segment_dot(indptr, indices, data, self._N)
+            self._valid = np.array([self._rows[rid] is not None for rid in self._row_index], dtype=bool)
+            self._built = True
+
+    def ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def matrix(self):
+        """Return the recipe x ingredient weight matrix as CSR arrays (indptr, indices, data)."""
+        with self._lock:
+            if self._csr is None:
+                order = sorted(self._row_index, key=self._row_index.get)
+                indptr = [0]
+                indices = []
+                data = []
+                for rid in order:
+                    row = self._rows.get(rid)
+                    if row is not None:
+                        indices.append(row[0])
+                        data.append(row[1])
+                        indptr.append(indptr[-1] + len(row[0]))
+                    else:
+                        indptr.append(indptr[-1])
+                self._csr = (
+                    np.asarray(indptr, dtype=np.int64),
+                    np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+                    np.concatenate(data) if data else np.zeros(0),
+                )
+            return self._csr
+
+    def _column(self, ingredient):
+        col = self._ing_index.get(ingredient)
+        if col is None:
+            col = len(self._ing_index)
+            self._ing_index[ingredient] = col
+            if col >= self._N.shape[0]:
+                grow = max(16, self._N.shape[0])
+                self._N = np.vstack([self._N, np.zeros((grow, len(NUTRIENT_COLS)))])
+        return col
+
+    def _set_ingredient_vector(self, ingredient, values):
+        col = self._column(ingredient)
+        self._N[col] = [float(v or 0.0) for v in values]
+        return col
+
+    def _index_recipe(self, rid, slug, name, ingredients):
+        old = self._rows.get(rid)
+        if old is not None:
+            for col in old[0]:
+                self._users.get(int(col), set()).discard(rid)
+        old_keys = self._recipe_keys.pop(rid, None)
+        if old_keys:
+            for key in old_keys:
+                if self._keys.get(key) == rid:
+                    del self._keys[key]
+
+        ingredients = ingredients or {}
+        total = sum(ingredients.values())
+        if total <= 0:
+            self._rows[rid] = None
+        else:
+            cols = np.array([self._column(ing) for ing in ingredients], dtype=np.int64)
+            weights = np.array([float(g) / total for g in ingredients.values()])
+            self._rows[rid] = (cols, weights)
+            for col in cols:
+                self._users.setdefault(int(col), set()).add(rid)
+        for key in (slug, name):
+            if key:
+                self._keys[key] = rid
+        self._recipe_keys[rid] = (slug, name)
+        self._csr = None
+
+    def _recompute_rows(self, rids):
+        for rid in rids:
+            pos = self._row_index[rid]
+            row = self._rows.get(rid)
+            if row is None:
+                self._P[pos] = 0.0
+                self._valid[pos] = False
+            else:
+                cols, weights = row
+                self._P[pos] = weights @ self._N[cols]
+                self._valid[pos] = True
+
+    # -- incremental updates ------------------------------------------------------
+
+    def update_recipe(self, recipe):
+        with self._lock:
+            if not self._built:
+                return
+            if recipe.pk not in self._row_index:
+                self._row_index[recipe.pk] = len(self._row_index)
+                self._P = np.vstack([self._P, np.zeros((1, len(NUTRIENT_COLS)))])
+                self._valid = np.append(self._valid, False)
+            self._index_recipe(recipe.pk, recipe.slug, recipe.name, recipe.ingredients)
+            self._recompute_rows([recipe.pk])
+
+    def remove_recipe(self, recipe_id):
+        with self._lock:
+            if not self._built or recipe_id not in self._row_index:
+                return
+            # keep the row slot (positions stay stable) but make it unreachable
+            self._index_recipe(recipe_id, None, None, {})
+            self._recipe_keys.pop(recipe_id, None)
+            self._recompute_rows([recipe_id])
+
+    def update_ingredient(self, ingredient, values):
+        with self._lock:
+            if not self._built:
+                return
+            col = self._set_ingredient_vector(ingredient, values)
+            self._recompute_rows(self._users.get(col, ()))
+
+    def remove_ingredient(self, ingredient):
+        self.update_ingredient(ingredient, [0.0] * len(NUTRIENT_COLS))
+
+    # -- reads --------------------------------------------------------------------
+
+    def resolve(self, dish_name):
+        """Return the recipe id for a slug or exact name, or None."""
+        self.ensure_built()
+        return self._keys.get(dish_name)
+
+    def per_100g(self, recipe_ids):
+        """Return an array (len(recipe_ids) x nutrients) of per-100g vectors and a validity mask."""
+        self.ensure_built()
+        with self._lock:
+            pos = np.array([self._row_index[rid] for rid in recipe_ids], dtype=np.int64)
+            return self._P[pos], self._valid[pos]
+
+    def compute(self, pairs):
+        """Compute nutrition for [(recipe_id, grams), ...] in one product.
+
+        Returns a list with a totals dict (rounded like `calculate_nutrition_from_recipe`)
+        or None per pair.
+        """
+        if not pairs:
+            return []
+        rids = [rid for rid, _ in pairs]
+        grams = np.array([float(g) for _, g in pairs])
+        P, valid = self.per_100g(rids)
+        values = P * (grams / 100.0)[:, None]
+        out = []
+        for ok, vec in zip(valid.tolist(), values.tolist()):
+            if not ok:
+                out.append(None)
+                continue
+            out.append({col: round(v, 2) for col, v in zip(NUTRIENT_COLS, vec)})
+        return out
+
+    def compute_meal(self, items):
+        """Compute nutrition for [(dish_name, grams), ...]; unknown dishes give None."""
+        self.ensure_built()
+        known = [(self._keys.get(name), grams) for name, grams in items]
+        results = self.compute([(rid, g) for rid, g in known if rid is not None])
+        it = iter(results)
+        return [next(it) if rid is not None else None for rid, _ in known]
+
+
+def _segment_dot(indptr, indices, data, N):
+    """Row-wise sparse (CSR) x dense product without scipy."""
+    n_rows = len(indptr) - 1
+    out = np.zeros((n_rows, N.shape[1]))
+    if len(data) == 0:
+        return out
+    contrib = data[:, None] * N[indices]
+    lengths = np.diff(indptr)
+    nonempty = lengths > 0
+    out[nonempty] = np.add.reduceat(contrib, indptr[:-1][nonempty], axis=0)
+    return out
+
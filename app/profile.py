@@ -3,6 +3,8 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.urls import reverse
 from .models import Profile
+from .timezones import is_valid_timezone
+from zoneinfo import available_timezones
 
 #Profile_View
 @login_required(login_url='/login/')
@@ -45,6 +47,11 @@ def profile_view(request):
         else:
             profile.sex = None
 
+        # Timezone: keep the current one unless a valid IANA name was submitted
+        tz_name = (request.POST.get('timezone') or '').strip()
+        if tz_name and is_valid_timezone(tz_name):
+            profile.timezone = tz_name
+
         profile.save()
         messages.success(request, 'Profile updated successfully')
         return redirect(reverse('profile'))
@@ -56,5 +63,6 @@ def profile_view(request):
         'bmi_category': profile.bmi_category,
         'bmr': profile.bmr(),
         'ideal_weight': profile.ideal_weight_kg(),
+        'timezones': sorted(available_timezones()),
     }
     return render(request, 'profile.html', context)
@@ -1,18 +1,175 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import metrics
 from .models import Recipe
+from .nutrition import NUTRIENT_COLS
+
+_MISSING = object()
+
+# shared cache key bumped whenever a recipe or its materialized nutrition changes
+RECIPE_VERSION_KEY = 'recipe_cache_version'
+
+
+class RecipeCache:
+    """Bounded LRU cache with a TTL for recipe lookups (by name/slug and by id).
+
+    Misses are cached too (negative caching) so unknown labels do not hit the DB on
+    every save. Recipe saves/deletes and RecipeNutrition rebuilds bump a shared version
+    counter; every worker drops its entries when the counter moves.
+    """
+
+    def __init__(self, maxsize=512, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()   # key -> (expires_at, value or _MISSING)
+        self._version = None
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _current_version(self):
+        try:
+            return cache.get(RECIPE_VERSION_KEY, 0)
+        except Exception:
+            return None
+
+    def sync(self):
+        """Drop every entry if another worker (or this one) bumped the shared version."""
+        version = self._current_version()
+        if version != self._version:
+            with self._lock:
+                self._data.clear()
+                self._version = version
+
+    def get(self, key, sync=True):
+        """Return the cached value, None for a cached miss, or _MISSING if not cached."""
+        if sync:
+            self.sync()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            if value is _MISSING:
+                self.negative_hits += 1
+                return None
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, _MISSING if value is None else value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def invalidate(self):
+        """Drop the local entries and bump the shared version so other workers drop theirs."""
+        self.clear()
+        try:
+            cache.incr(RECIPE_VERSION_KEY)
+        except ValueError:
+            cache.set(RECIPE_VERSION_KEY, 1, None)
+        except Exception:
+            pass
+
+    def stats(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            'size': len(self._data),
+            'version': self._version,
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+recipe_cache = RecipeCache(
+    maxsize=getattr(settings, 'RECIPE_CACHE_SIZE', 512),
+    ttl=getattr(settings, 'RECIPE_CACHE_TTL', 300),
+)
+metrics.register('recipe_cache', recipe_cache.stats)
+
+
+def _lookup_recipe(dish_name):
+    """Single query matching slug or name; a slug match wins like the old two-step lookup."""
+    match = None
+    for r in Recipe.objects.filter(Q(slug=dish_name) | Q(name=dish_name)).only('slug', 'name', 'ingredients')[:2]:
+        if r.slug == dish_name:
+            return r.ingredients
+        match = r
+    return match.ingredients if match else None
 
 
 def get_recipe(dish_name):
     """Return dict of ingredient->grams by looking up `Recipe` model only.
 
-    - Looks up by slug first, then by name.
-    - Returns the ingredients dict (ingredient -> grams float) or None if not found.
+    - Looks up by slug first, then by name (one query, cached in `recipe_cache`).
+    - Returns a copy of the ingredients dict (ingredient -> grams float) or None if not found.
     """
-    # Expect dish_name to be either slug or exact name
+    cached = recipe_cache.get(dish_name)
+    if cached is not _MISSING:
+        return dict(cached) if cached is not None else None
     try:
-        r = Recipe.objects.filter(slug=dish_name).first() or Recipe.objects.filter(name=dish_name).first()
-        if r:
-            return r.ingredients
+        ingredients = _lookup_recipe(dish_name)
     except Exception:
-        # If DB access fails, return None (no fallback to file)
+        # If DB access fails, return None (no fallback to file) and do not cache the failure
         return None
-    return None
+    recipe_cache.set(dish_name, ingredients or None)
+    return dict(ingredients) if ingredients else None
+
+
+def get_recipes_by_id(recipe_ids):
+    """Return {id: recipe} for the existing ids; `calculate_meal` reads these.
+
+    Each recipe carries its ingredients and materialized `per_100g` row; ids missing
+    from `recipe_cache` are fetched together with one joined `pk__in` query.
+    """
+    recipe_cache.sync()
+    out = {}
+    missing = []
+    for rid in recipe_ids:
+        cached = recipe_cache.get(('id', rid), sync=False)
+        if cached is _MISSING:
+            missing.append(rid)
+        elif cached is not None:
+            out[rid] = cached
+    if missing:
+        qs = (Recipe.objects.filter(pk__in=missing).select_related('per_100g').order_by()
+              .only('ingredients', *(f'per_100g__{c}' for c in NUTRIENT_COLS)))
+        found = {r.pk: r for r in qs}
+        for rid in missing:
+            recipe_cache.set(('id', rid), found.get(rid))
+        out.update(found)
+    return out
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_cache(sender, **kwargs):
+    recipe_cache.invalidate()
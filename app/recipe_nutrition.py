@@ -0,0 +1,123 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Recipe, Nutrition, RecipeNutrition, RecipeIngredient
+from .nutrition import NUTRIENT_COLS
+from .recipe import recipe_cache
+
+_state = threading.local()
+
+
+def recipe_vector(recipe_dict, vectors):
+    """Return the unrounded per-100g nutrient tuple of a recipe, or None if it has no weight.
+
+    Ingredients missing from `vectors` contribute nothing but still count towards the
+    recipe total, exactly like `calculate_nutrition_from_recipe`.
+    """
+    recipe_total = sum(recipe_dict.values())
+    if recipe_total <= 0:
+        return None
+    out = [0.0] * len(NUTRIENT_COLS)
+    for ingredient, base_grams in recipe_dict.items():
+        vec = vectors.get(ingredient)
+        if vec is None:
+            continue
+        share = base_grams / recipe_total
+        for i, val in enumerate(vec):
+            out[i] += val * share
+    return tuple(out)
+
+
+def rebuild_recipe_nutrition(recipe_ids=None):
+    """Recompute RecipeNutrition rows and the ingredient dependency index.
+
+    recipe_ids=None rebuilds every recipe; otherwise only the given ids. Runs in a
+    fixed number of queries regardless of how many recipes are rebuilt.
+    Returns the number of recipes materialized.
+    """
+    recipes = Recipe.objects.all()
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return 0
+        recipes = recipes.filter(pk__in=recipe_ids)
+    recipes = list(recipes.only('id', 'ingredients'))
+
+    ingredients = set()
+    for r in recipes:
+        ingredients.update((r.ingredients or {}).keys())
+    nutrition = Nutrition.objects.all() if recipe_ids is None else Nutrition.objects.filter(ingredient__in=ingredients)
+    vectors = {row[0]: tuple(float(v or 0.0) for v in row[1:])
+               for row in nutrition.values_list('ingredient', *NUTRIENT_COLS)}
+
+    materialized = []
+    links = []
+    for r in recipes:
+        ing = r.ingredients or {}
+        links.extend(RecipeIngredient(recipe_id=r.pk, ingredient=name) for name in ing)
+        vec = recipe_vector(ing, vectors)
+        if vec is not None:
+            materialized.append(RecipeNutrition(recipe_id=r.pk, **dict(zip(NUTRIENT_COLS, vec))))
+
+    with transaction.atomic():
+        if recipe_ids is None:
+            RecipeNutrition.objects.all().delete()
+            RecipeIngredient.objects.all().delete()
+        else:
+            RecipeNutrition.objects.filter(recipe_id__in=recipe_ids).delete()
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeNutrition.objects.bulk_create(materialized, batch_size=500)
+        RecipeIngredient.objects.bulk_create(links, batch_size=500)
+    # cached recipes carry their per-100g row
+    recipe_cache.invalidate()
+    return len(materialized)
+
+
+def recipes_using(ingredient):
+    """Return the ids of recipes that depend on `ingredient` (indexed lookup)."""
+    return list(RecipeIngredient.objects.filter(ingredient=ingredient).values_list('recipe_id', flat=True))
+
+
+@contextmanager
+def deferred_rebuild():
+    """Suspend per-row recomputation; one full batched rebuild runs on exit if anything changed.
+
+    Used by the import commands so thousands of saves cost a single rebuild.
+    """
+    depth = getattr(_state, 'depth', 0)
+    _state.depth = depth + 1
+    if depth == 0:
+        _state.dirty = False
+    try:
+        yield
+    finally:
+        _state.depth = depth
+        if depth == 0 and _state.dirty:
+            _state.dirty = False
+            rebuild_recipe_nutrition()
+
+
+def _deferred():
+    if getattr(_state, 'depth', 0):
+        _state.dirty = True
+        return True
+    return False
+
+
+@receiver(post_save, sender=Recipe)
+def _recipe_saved(sender, instance, raw=False, **kwargs):
+    if raw or _deferred():
+        return
+    rebuild_recipe_nutrition([instance.pk])
+
+
+@receiver(post_save, sender=Nutrition)
+@receiver(post_delete, sender=Nutrition)
+def _nutrition_changed(sender, instance, raw=False, **kwargs):
+    if raw or _deferred():
+        return
+    rebuild_recipe_nutrition(recipes_using(instance.ingredient))
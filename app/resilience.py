@@ -0,0 +1,182 @@
+import math
+import threading
+import time
+from collections import deque
+
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker.
+
+    - closed: calls pass; `failure_threshold` consecutive failures open the circuit.
+    - open: calls are rejected until `recovery_timeout` seconds have passed.
+    - half-open: up to `half_open_max_calls` trial calls pass; a success closes the
+      circuit, a failure opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, half_open_max_calls=1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._opened_at = 0.0
+            self._trials = 0
+            self.times_opened = 0
+            self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Return True if a call may proceed (reserves a trial slot when half-open)."""
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    self.rejected += 1
+                    return False
+                self._state = self.HALF_OPEN
+                self._trials = 0
+            if self._state == self.HALF_OPEN:
+                if self._trials >= self.half_open_max_calls:
+                    self.rejected += 1
+                    return False
+                self._trials += 1
+            return True
+
+    def release(self):
+        """Hand back a trial slot reserved by `allow()` whose call ended without an outcome."""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+            self._trials = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trials = 0
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self._failures,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected,
+        }
+
+
+class Counters:
+    """Named integer counters that may be bumped from several threads."""
+
+    def __init__(self, *names):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(names, 0)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + n
+
+    def __getitem__(self, name):
+        with self._lock:
+            return self._counts.get(name, 0)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+class RetryBudget:
+    """Process-wide token bucket limiting retries to a fraction of first attempts.
+
+    Every request deposits `ratio` tokens (capped at `max_tokens`); every retry spends
+    one. When upstream is failing, retries dry up instead of multiplying the load.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10.0, initial_tokens=None):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._lock = threading.Lock()
+        self._tokens = max_tokens if initial_tokens is None else initial_tokens
+        self.exhausted = 0
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            self.exhausted += 1
+            return False
+
+    def reset(self):
+        with self._lock:
+            self._tokens = self.max_tokens
+            self.exhausted = 0
+
+    def stats(self):
+        return {'tokens': round(self._tokens, 2), 'exhausted': self.exhausted}
+
+
+class LatencyWindow:
+    """Rolling window of call latencies and outcomes (last `window` seconds, at most `max_samples`)."""
+
+    def __init__(self, window=300.0, max_samples=2000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=max_samples)  # (timestamp, seconds, ok)
+
+    def record(self, seconds, ok=True):
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds, ok))
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            return list(self._samples)
+
+    def percentile(self, q, samples=None):
+        samples = self._recent() if samples is None else samples
+        values = sorted(s[1] for s in samples)
+        if not values:
+            return None
+        # nearest-rank percentile
+        idx = min(len(values) - 1, max(0, math.ceil(q / 100.0 * len(values)) - 1))
+        return values[idx]
+
+    def stats(self):
+        samples = self._recent()
+        errors = sum(1 for s in samples if not s[2])
+        ms = lambda v: round(v * 1000, 1) if v is not None else None
+        return {
+            'count': len(samples),
+            'p50_ms': ms(self.percentile(50, samples)),
+            'p95_ms': ms(self.percentile(95, samples)),
+            'p99_ms': ms(self.percentile(99, samples)),
+            'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        }
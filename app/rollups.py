@@ -0,0 +1,202 @@
+from django.db import transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q, Sum
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import streaks
+from .logs import daily_totals
+from .models import DailyTotals, MealLog, Profile
+from .timezones import forget_user_timezone, get_zone, local_date
+
+TOTAL_FIELDS = ('calories', 'protein_g', 'fat_g', 'carbs_g', 'fiber_g')
+# saves touching none of these (e.g. goal flag updates) leave the rollup alone
+_ROLLUP_INPUTS = frozenset(TOTAL_FIELDS + ('user', 'user_id', 'created_at'))
+DEFAULT_GOAL = 2000
+
+
+def daily_goal(user_id):
+    """Calorie goal for the user: the profile BMR when it can be computed, else 2000 kcal."""
+    profile = Profile.objects.filter(user_id=user_id).first()
+    bmr = profile.bmr() if profile else None
+    return int(bmr) if bmr else DEFAULT_GOAL
+
+
+def refresh_day(user_id, d, goal=None):
+    """Recompute the DailyTotals row of one user/day from its MealLog rows (deleted when the day is empty)."""
+    with transaction.atomic():
+        # taken before aggregating: concurrent saves for one user then refresh one after
+        # another, so the last write always includes every committed meal
+        stored = streaks.lock(user_id)
+        day = daily_totals(user_id, d, d).get(d)
+        if not day:
+            DailyTotals.objects.filter(user_id=user_id, local_date=d).delete()
+            streaks.note_day(user_id, d, active=False, stored=stored)
+            return None
+        goal = daily_goal(user_id) if goal is None else goal
+        values = {f: round(day[f] or 0, 2) for f in TOTAL_FIELDS}
+        values['meal_count'] = day['meals']
+        values['goal_achieved'] = values['calories'] > 0 and values['calories'] >= goal
+        row, _ = DailyTotals.objects.update_or_create(user_id=user_id, local_date=d, defaults=values)
+        streaks.note_day(user_id, d, active=values['calories'] > 0, stored=stored)
+        return row
+
+
+def _grouped_history(user_ids=None):
+    """Yield (user_id, local_date, sums) for every logged day, straight from MealLog."""
+    qs = MealLog.objects.all()
+    if user_ids is not None:
+        qs = qs.filter(user_id__in=user_ids)
+    rows = (qs.values('user_id', 'local_date')
+            .annotate(calories=Sum('calories'), protein_g=Sum('protein_g'), fat_g=Sum('fat_g'),
+                      carbs_g=Sum('carbs_g'), fiber_g=Sum('fiber_g'), meals=Count('id'))
+            .order_by('user_id', 'local_date'))
+    for row in rows.iterator():
+        yield row['user_id'], row['local_date'], row
+
+
+def _expected_row(user_id, d, sums, goal):
+    calories = round(sums['calories'] or 0, 2)
+    return DailyTotals(
+        user_id=user_id, local_date=d, meal_count=sums['meals'],
+        goal_achieved=calories > 0 and calories >= goal,
+        **{f: round(sums[f] or 0, 2) for f in TOTAL_FIELDS},
+    )
+
+
+def _goals(user_ids):
+    profiles = Profile.objects.all() if user_ids is None else Profile.objects.filter(user_id__in=user_ids)
+    goals = {}
+    for profile in profiles:
+        bmr = profile.bmr()
+        goals[profile.user_id] = int(bmr) if bmr else DEFAULT_GOAL
+    return goals
+
+
+def rebuild(user_ids=None, batch_size=1000):
+    """Recreate DailyTotals from MealLog for the given users (all users when None). Returns rows written."""
+    goals = _goals(user_ids)
+    written = 0
+    with transaction.atomic():
+        stale = DailyTotals.objects.all() if user_ids is None else DailyTotals.objects.filter(user_id__in=user_ids)
+        stale.delete()
+        batch = []
+        for user_id, d, sums in _grouped_history(user_ids):
+            batch.append(_expected_row(user_id, d, sums, goals.get(user_id, DEFAULT_GOAL)))
+            if len(batch) >= batch_size:
+                DailyTotals.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            DailyTotals.objects.bulk_create(batch)
+            written += len(batch)
+        streaks.forget(user_ids)
+    return written
+
+
+def check_consistency(user_ids=None, fix=False):
+    """Compare DailyTotals with a fresh aggregation of MealLog.
+
+    Returns a list of (user_id, local_date, problem) tuples; with fix=True the affected
+    days are refreshed.
+    """
+    goals = _goals(user_ids)
+    actual_qs = DailyTotals.objects.all() if user_ids is None else DailyTotals.objects.filter(user_id__in=user_ids)
+    actual = {(r.user_id, r.local_date): r for r in actual_qs.iterator()}
+    problems = []
+    for user_id, d, sums in _grouped_history(user_ids):
+        expected = _expected_row(user_id, d, sums, goals.get(user_id, DEFAULT_GOAL))
+        row = actual.pop((user_id, d), None)
+        if row is None:
+            problems.append((user_id, d, 'missing'))
+            continue
+        diffs = [f for f in TOTAL_FIELDS if abs(getattr(row, f) - getattr(expected, f)) > 0.01]
+        diffs += [f for f in ('meal_count', 'goal_achieved') if getattr(row, f) != getattr(expected, f)]
+        if diffs:
+            problems.append((user_id, d, 'mismatch: ' + ', '.join(diffs)))
+    problems.extend((user_id, d, 'orphan') for (user_id, d) in actual)
+    if fix:
+        for user_id, d, _ in problems:
+            refresh_day(user_id, d, goals.get(user_id, DEFAULT_GOAL))
+    return problems
+
+
+def refresh_goal_flags(user_id, goal=None):
+    """Re-evaluate goal_achieved for every stored day of the user in one UPDATE (after a goal change)."""
+    goal = daily_goal(user_id) if goal is None else goal
+    achieved = ExpressionWrapper(Q(calories__gt=0) & Q(calories__gte=goal), output_field=BooleanField())
+    return DailyTotals.objects.filter(user_id=user_id).update(goal_achieved=achieved)
+
+
+@receiver(pre_save, sender=MealLog)
+def remember_previous_day(sender, instance, raw=False, update_fields=None, **kwargs):
+    # an edit may move the meal to another user/day: that day has to be refreshed too
+    if raw or (update_fields is not None and not _ROLLUP_INPUTS & set(update_fields)):
+        return
+    instance._rollup_previous = None
+    if instance.pk is not None:
+        instance._rollup_previous = (MealLog.objects.filter(pk=instance.pk)
+                                     .values_list('user_id', 'local_date', *TOTAL_FIELDS).first())
+
+
+def _rollup_unchanged(instance, previous):
+    """True when a saved meal kept its user, day and totals (e.g. a rename or a goal flag update)."""
+    return (previous[:2] == (instance.user_id, instance.local_date)
+            and all(float(getattr(instance, f) or 0) == float(v or 0) for f, v in zip(TOTAL_FIELDS, previous[2:])))
+
+
+@receiver(post_save, sender=MealLog)
+def update_daily_totals_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not _ROLLUP_INPUTS & set(update_fields)):
+        return
+    days = {(instance.user_id, instance.local_date)}
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        if _rollup_unchanged(instance, previous):
+            return
+        days.add(previous[:2])
+    for user_id, d in days:
+        refresh_day(user_id, d)
+
+
+@receiver(post_delete, sender=MealLog)
+def update_daily_totals_on_delete(sender, instance, **kwargs):
+    refresh_day(instance.user_id, instance.local_date)
+
+
+def relocalize(user_id, tz, batch_size=1000):
+    """Reassign every meal of the user to its calendar day in `tz`, then rebuild the user's rollup."""
+    changed = []
+    with transaction.atomic():
+        for meal in MealLog.objects.filter(user_id=user_id).only('id', 'created_at', 'local_date').iterator(chunk_size=batch_size):
+            d = local_date(meal.created_at, tz)
+            if d != meal.local_date:
+                meal.local_date = d
+                changed.append(meal)
+        MealLog.objects.bulk_update(changed, ['local_date'], batch_size=batch_size)
+        rebuild(user_ids=[user_id])
+    return len(changed)
+
+
+# stored values that decide a user's days (timezone) and calorie goal (BMR inputs)
+PROFILE_TRACKED_FIELDS = ('timezone', 'sex', 'age', 'height_cm', 'weight_kg')
+
+
+@receiver(pre_save, sender=Profile)
+def remember_previous_profile(sender, instance, raw=False, **kwargs):
+    # read by the post_save receivers here and in app.goals
+    if raw or instance.pk is None:
+        return
+    instance._previous_profile = Profile.objects.filter(pk=instance.pk).values(*PROFILE_TRACKED_FIELDS).first()
+
+
+@receiver(post_save, sender=Profile)
+def update_goal_flags_on_profile_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    forget_user_timezone(instance.user_id)
+    previous = (getattr(instance, '_previous_profile', None) or {}).get('timezone')
+    if previous is not None and previous != instance.timezone:
+        relocalize(instance.user_id, get_zone(instance.timezone))
+    # also after a relocalize: the same save may have changed the BMR inputs
+    bmr = instance.bmr()
+    refresh_goal_flags(instance.user_id, int(bmr) if bmr else DEFAULT_GOAL)
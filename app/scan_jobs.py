@@ -0,0 +1,158 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count
+from django.utils import timezone
+
+from . import metrics
+from .detection_cache import detect_foods
+from .models import ScanJob
+from .storage import media_storage
+from .yolo import dedupe_foods
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_executor():
+    """Per-process bounded pool running scan jobs (SCAN_JOB_WORKERS threads)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_setting('SCAN_JOB_WORKERS', 4), thread_name_prefix='scan-job')
+    return _executor
+
+
+def submit_scan(user, image_paths):
+    """Create a pending ScanJob for one image path or a list of paths and dispatch it according to SCAN_JOBS_MODE.
+
+    - 'thread' (default): run on the in-process pool.
+    - 'worker': leave it pending for `manage.py scan_worker`.
+    - 'sync': run inline before returning (tests, single-process debugging).
+    """
+    if isinstance(image_paths, (str, bytes)) or not hasattr(image_paths, '__iter__'):
+        image_paths = [image_paths]
+    paths = [str(p) for p in image_paths]
+    job = ScanJob.objects.create(user=user, image_path=paths[0], image_paths=paths if len(paths) > 1 else [])
+    mode = _setting('SCAN_JOBS_MODE', 'thread')
+    if mode == 'sync':
+        run_job(job.pk)
+        job.refresh_from_db()
+    elif mode == 'thread':
+        get_executor().submit(_run_in_thread, job.pk)
+    return job
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def _detect(image_path):
+    # uploads are stored under their SHA-256, so the detection cache need not hash them again
+    return detect_foods(image_path, digest=media_storage.digest_of(image_path))
+
+
+def _detect_in_thread(image_path):
+    try:
+        return _detect(image_path)
+    finally:
+        close_old_connections()
+
+
+def detect_many(image_paths):
+    """Detect foods on several photos of one meal concurrently and merge the labels.
+
+    At most SCAN_IMAGE_CONCURRENCY images are in flight at once, so wall time is close to
+    the slowest image rather than the sum. Labels are deduplicated in image order like
+    `predict_foods` does for one image. Photos that fail are skipped; the first error is
+    raised only if every photo failed.
+    """
+    image_paths = list(image_paths)
+    if len(image_paths) == 1:
+        return _detect(image_paths[0])
+    workers = max(1, min(_setting('SCAN_IMAGE_CONCURRENCY', 3), len(image_paths)))
+    results, errors = [], []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan-image') as pool:
+        futures = [pool.submit(_detect_in_thread, path) for path in image_paths]
+        for path, fut in zip(image_paths, futures):
+            try:
+                results.append(fut.result())
+            except Exception as e:
+                logger.warning('Detection failed for %s: %s', path, e)
+                errors.append(e)
+    if not results:
+        raise errors[0]
+    return dedupe_foods(label for foods in results for label in foods)
+
+
+def run_job(job_id):
+    """Claim a pending job and run detection on it. Returns False if another runner claimed it."""
+    claimed = ScanJob.objects.filter(pk=job_id, status=ScanJob.PENDING).update(
+        status=ScanJob.RUNNING, started_at=timezone.now())
+    if not claimed:
+        return False
+    job = ScanJob.objects.get(pk=job_id)
+    try:
+        foods = detect_many(job.paths)
+        ScanJob.objects.filter(pk=job_id, status=ScanJob.RUNNING).update(
+            status=ScanJob.DONE, foods=list(foods), finished_at=timezone.now())
+    except Exception as e:
+        logger.warning('Scan job %s failed: %s', job.token, e)
+        ScanJob.objects.filter(pk=job_id, status=ScanJob.RUNNING).update(
+            status=ScanJob.FAILED, error=str(e)[:1000], finished_at=timezone.now())
+    return True
+
+
+def run_pending(limit=10):
+    """Run up to `limit` pending jobs, oldest first (used by the scan_worker command)."""
+    ids = list(ScanJob.objects.filter(status=ScanJob.PENDING).order_by('created_at').values_list('pk', flat=True)[:limit])
+    return sum(1 for pk in ids if run_job(pk))
+
+
+def cleanup_stale_jobs():
+    """Fail jobs stuck past SCAN_JOB_TIMEOUT and delete finished jobs past SCAN_JOB_RETENTION.
+
+    Returns (timed_out, deleted).
+    """
+    now = timezone.now()
+    timeout = timedelta(seconds=_setting('SCAN_JOB_TIMEOUT', 120))
+    timed_out = ScanJob.objects.filter(status=ScanJob.RUNNING, started_at__lt=now - timeout).update(
+        status=ScanJob.FAILED, error='Scan timed out', finished_at=now)
+    timed_out += ScanJob.objects.filter(status=ScanJob.PENDING, created_at__lt=now - timeout).update(
+        status=ScanJob.FAILED, error='Scan was not picked up in time', finished_at=now)
+    retention = timedelta(seconds=_setting('SCAN_JOB_RETENTION', 24 * 3600))
+    deleted, _ = ScanJob.objects.filter(status__in=(ScanJob.DONE, ScanJob.FAILED), created_at__lt=now - retention).delete()
+    return timed_out, deleted
+
+
+def is_expired(job):
+    """True when an unfinished job has outlived SCAN_JOB_TIMEOUT (status readers treat it as failed)."""
+    if job.finished:
+        return False
+    started = job.started_at or job.created_at
+    return timezone.now() - started > timedelta(seconds=_setting('SCAN_JOB_TIMEOUT', 120))
+
+
+def stats():
+    counts = {status: 0 for status, _ in ScanJob.STATUS_CHOICES}
+    for row in ScanJob.objects.values('status').annotate(n=Count('id')):
+        counts[row['status']] = row['n']
+    return counts
+
+
+metrics.register('scan_jobs', stats)
@@ -0,0 +1,105 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_FOODS = ('Rice', 'Dal')
+
+
+class StandInConfig:
+    """Behaviour of the stand-in /predict server.
+
+    - latency: 'fixed' (always `latency_ms`), 'uniform' (0..2x `latency_ms`) or
+      'lognormal' (median `latency_ms`, spread `sigma`) — a long tail like a real GPU queue.
+    - error_rate: fraction of requests answered with `error_status`.
+    - foods: labels returned; with `foods_per_image` set, a random subset of that size.
+    """
+    DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+    def __init__(self, latency_ms=0.0, distribution='fixed', sigma=0.5, error_rate=0.0, error_status=500,
+                 foods=DEFAULT_FOODS, foods_per_image=0, seed=None):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f'distribution must be one of {self.DISTRIBUTIONS}')
+        self.latency_ms = latency_ms
+        self.distribution = distribution
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.foods = list(foods)
+        self.foods_per_image = foods_per_image
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def delay(self):
+        with self._lock:
+            if self.distribution == 'uniform':
+                ms = self._rng.uniform(0, 2 * self.latency_ms)
+            elif self.distribution == 'lognormal' and self.latency_ms > 0:
+                ms = self.latency_ms * self._rng.lognormvariate(0, self.sigma)
+            else:
+                ms = self.latency_ms
+        return ms / 1000.0
+
+    def respond(self):
+        """Return (status, payload dict) for one /predict call."""
+        with self._lock:
+            self.requests += 1
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.errors += 1
+                return self.error_status, {'detail': 'stand-in injected error'}
+            foods = self.foods
+            if self.foods_per_image and self.foods_per_image < len(foods):
+                foods = self._rng.sample(foods, self.foods_per_image)
+        return 200, {'foods': list(foods)}
+
+
+class PredictHandler(BaseHTTPRequestHandler):
+    """Implements the `/predict` contract used by `app.yolo.predict_foods` (multipart `file` in, {'foods': [...]} out)."""
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        if not self.path.rstrip('/').endswith('/predict'):
+            self._send(404, {'detail': 'Not Found'})
+            return
+        config = self.server.config
+        delay = config.delay()
+        if delay:
+            time.sleep(delay)
+        self._send(*config.respond())
+
+    def do_GET(self):
+        # health / warm-up pings
+        self._send(200, {'status': 'ok'})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_server(config=None, host='127.0.0.1', port=0):
+    """Build (not start) a threaded stand-in server; `server.url` is its /predict endpoint."""
+    server = ThreadingHTTPServer((host, port), PredictHandler)
+    server.daemon_threads = True
+    server.config = config or StandInConfig()
+    server.url = f'http://{host}:{server.server_address[1]}/predict'
+    return server
+
+
+def start_in_thread(config=None, host='127.0.0.1', port=0):
+    """Start a stand-in server on a daemon thread and return it (call `shutdown()` and `server_close()` when done)."""
+    server = make_server(config, host, port)
+    threading.Thread(target=server.serve_forever, name='yolo-standin', daemon=True).start()
+    return server
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+from . import metrics
+
+_DIGEST = re.compile(r'[0-9a-f]{64}')
+_EXTENSIONS = {'.jpg': '.jpg', '.jpeg': '.jpg', '.png': '.png', '.webp': '.webp', '.gif': '.gif', '.bmp': '.bmp', '.heic': '.heic'}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores uploads under MEDIA_ROOT by the SHA-256 of their bytes.
+
+    - Layout: `<MEDIA_SCANS_DIR>/ab/cd/<sha256>.<ext>`, so no directory grows past a
+      few files per 65k shards however many scans accumulate.
+    - Identical uploads map to the same file: the second copy is discarded and the
+      existing file's mtime is refreshed (it counts as recently used for GC).
+    - Uploads are streamed to a temp file in the same tree while hashing, then moved
+      into place atomically.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self.saved = 0
+        self.deduplicated = 0
+        self.bytes_saved = 0
+
+    @property
+    def scans_dir(self):
+        return _setting('MEDIA_SCANS_DIR', 'scans')
+
+    def hashed_name(self, digest, original_name=''):
+        ext = _EXTENSIONS.get(os.path.splitext(original_name)[1].lower(), '.jpg')
+        return f'{self.scans_dir}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+    def save_upload(self, uploaded):
+        """Store an uploaded file by content hash; returns (absolute path, sha256)."""
+        tmp_dir = self.path(f'{self.scans_dir}/tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        h = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in uploaded.chunks():
+                    h.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            digest = h.hexdigest()
+            final = self.path(self.hashed_name(digest, getattr(uploaded, 'name', '') or ''))
+            if self._touch(final):
+                os.unlink(tmp_path)
+                with self._lock:
+                    self.deduplicated += 1
+                    self.bytes_saved += size
+            else:
+                self._move_into_place(tmp_path, final)
+                with self._lock:
+                    self.saved += 1
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return final, digest
+
+    @staticmethod
+    def _touch(path):
+        """Refresh an existing file's mtime; False if it is missing (or GC removed it meanwhile)."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @staticmethod
+    def _move_into_place(tmp_path, final):
+        # GC may remove an emptied shard directory between makedirs and the move: retry once
+        for attempt in (1, 2):
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            try:
+                os.replace(tmp_path, final)
+                return
+            except FileNotFoundError:
+                if attempt == 2 or not os.path.exists(tmp_path):
+                    raise
+
+    def digest_of(self, path):
+        """The SHA-256 encoded in a stored file's name, or None for paths not written by `save_upload`."""
+        root = os.path.join(os.path.abspath(self.path(self.scans_dir)), '')
+        if not os.path.abspath(path).startswith(root):
+            return None
+        digest = os.path.splitext(os.path.basename(path))[0]
+        return digest if _DIGEST.fullmatch(digest) else None
+
+    def iter_files(self):
+        """Yield os.DirEntry objects for every stored file (tmp included), streaming shard by shard."""
+        stack = [self.path(self.scans_dir)]
+        while stack:
+            try:
+                it = os.scandir(stack.pop())
+            except FileNotFoundError:
+                continue
+            with it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+
+    def stats(self):
+        return {'saved': self.saved, 'deduplicated': self.deduplicated, 'bytes_saved': self.bytes_saved}
+
+
+media_storage = ContentAddressedStorage()
+metrics.register('media_storage', media_storage.stats)
+
+
+def referenced_paths():
+    """Absolute image paths still linked to a ScanJob."""
+    from .models import ScanJob
+    refs = set()
+    for image_path, image_paths in ScanJob.objects.order_by().values_list('image_path', 'image_paths').iterator():
+        refs.add(os.path.abspath(image_path))
+        refs.update(os.path.abspath(p) for p in image_paths or ())
+    return refs
+
+
+def collect_garbage(max_age=None, grace=None, dry_run=False, storage=None):
+    """Delete stored images older than `max_age` seconds, or unreferenced ones older than `grace` seconds.
+
+    Files are visited with os.scandir one shard at a time, so memory stays flat; only the
+    set of paths referenced by ScanJob rows (bounded by SCAN_JOB_RETENTION) is held.
+    Emptied shard directories are removed. Returns a counters dict.
+    """
+    storage = storage or media_storage
+    max_age = _setting('MEDIA_RETENTION', 30 * 24 * 3600) if max_age is None else max_age
+    grace = _setting('MEDIA_GC_GRACE', 3600) if grace is None else grace
+    now = time.time()
+    refs = referenced_paths()
+    result = {'scanned': 0, 'expired': 0, 'unreferenced': 0, 'bytes_freed': 0, 'dirs_removed': 0}
+    parents = set()
+    for entry in storage.iter_files():
+        result['scanned'] += 1
+        st = entry.stat(follow_symlinks=False)
+        age = now - st.st_mtime
+        if age > max_age:
+            reason = 'expired'
+        elif age > grace and os.path.abspath(entry.path) not in refs:
+            reason = 'unreferenced'
+        else:
+            continue
+        result[reason] += 1
+        result['bytes_freed'] += st.st_size
+        if not dry_run:
+            try:
+                os.unlink(entry.path)
+                parents.add(os.path.dirname(entry.path))
+            except FileNotFoundError:
+                pass
+    if not dry_run:
+        root = storage.path(storage.scans_dir)
+        tmp_dir = os.path.join(root, 'tmp')
+        # deepest first, so an emptied ab/cd lets ab/ go too
+        for directory in sorted(parents, key=len, reverse=True):
+            while directory.startswith(root) and directory not in (root, tmp_dir):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+                result['dirs_removed'] += 1
+                directory = os.path.dirname(directory)
+    return result
@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import timezones
+from .models import DailyTotals, Profile
+
+STREAK_KEY = 'streak:{}'
+ONE_DAY = timezone.timedelta(days=1)
+
+
+def _key(user_id):
+    return STREAK_KEY.format(user_id)
+
+
+def _ttl():
+    return getattr(settings, 'STREAK_CACHE_TTL', 3600)
+
+
+def local_today(user_id):
+    return timezones.local_today(timezones.user_timezone(user_id))
+
+
+def compute(user_id):
+    """Cold path: walk the user's active days (DailyTotals, newest first) until the first gap.
+
+    Returns (count, last_active_date); (0, None) when nothing was ever logged.
+    """
+    days = (DailyTotals.objects.filter(user_id=user_id, calories__gt=0)
+            .order_by('-local_date').values_list('local_date', flat=True))
+    count, last = 0, None
+    for d in days.iterator(chunk_size=64):
+        if last is None:
+            last = d
+        elif d != last - count * ONE_DAY:
+            break
+        count += 1
+    return count, last
+
+
+def lock(user_id):
+    """Lock the user's Profile row until the end of the transaction; returns its stored (count, last)."""
+    return (Profile.objects.select_for_update().filter(user_id=user_id)
+            .values_list('streak_count', 'streak_last_date').first())
+
+
+def _store(user_id, count, last):
+    Profile.objects.filter(user_id=user_id).update(streak_count=count, streak_last_date=last)
+    # only once the row is committed: a rolled back refresh must not leave its value cached
+    transaction.on_commit(lambda: cache.set(_key(user_id), (count, last), _ttl()))
+
+
+def get_streak(user_id):
+    """(count, last_active_date) of the user's latest run of active days.
+
+    Read from the cache, then from the Profile columns, and only recomputed from
+    DailyTotals when neither has it.
+    """
+    state = cache.get(_key(user_id))
+    if state is not None:
+        return state
+    row = Profile.objects.filter(user_id=user_id).values_list('streak_count', 'streak_last_date').first()
+    if row and row[1] is not None:
+        state = row
+    else:
+        state = compute(user_id)
+        Profile.objects.filter(user_id=user_id).update(streak_count=state[0], streak_last_date=state[1])
+    cache.set(_key(user_id), state, _ttl())
+    return state
+
+
+def current_streak(user_id, today=None):
+    """Streak shown to the user: the stored run only counts while its last day is today."""
+    count, last = get_streak(user_id)
+    today = today or local_today(user_id)
+    return count if last == today else 0
+
+
+def note_day(user_id, d, active, stored=None):
+    """Apply one day's change (it became active, stayed active, or was emptied) in O(1).
+
+    Works from the Profile columns, locked for the rest of the transaction (`stored`
+    when the caller already holds the lock), never from the cached copy. Logging on
+    the last active day is a no-op, the day after extends the run and a later day
+    starts a new one; only edits inside or behind the run (backdated meals,
+    deletions) and streaks dropped by `forget` fall back to a recompute.
+    """
+    if stored is None:
+        stored = lock(user_id)
+    if stored is None:
+        return
+    count, last = stored
+    if last is None:
+        new = compute(user_id)
+        if new == (count, last):
+            return
+    elif active:
+        if last == d:
+            return
+        if d > last + ONE_DAY:
+            new = (1, d)
+        elif d == last + ONE_DAY:
+            new = (count + 1, d)
+        elif d >= last - (count - 1) * ONE_DAY:
+            return  # already inside the current run
+        else:
+            new = compute(user_id)
+    else:
+        if d > last or d < last - (count - 1) * ONE_DAY:
+            return
+        new = compute(user_id)
+    _store(user_id, *new)
+
+
+def forget(user_ids=None):
+    """Drop stored streaks (e.g. after a bulk rebuild of DailyTotals); they are recomputed on next read."""
+    profiles = Profile.objects.all() if user_ids is None else Profile.objects.filter(user_id__in=user_ids)
+    ids = list(profiles.values_list('user_id', flat=True))
+    profiles.update(streak_count=0, streak_last_date=None)
+    transaction.on_commit(lambda: cache.delete_many([_key(i) for i in ids]))
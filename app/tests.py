@@ -108,7 +108,7 @@ class HistoryGoalTests(TestCase):
             dt = timezone.datetime(d.year, d.month, d.day, 12, 0, 0, tzinfo=tz)
             m = MealLog.objects.create(user=u, meal_name=f'd{day_index}', meal_type='Other', calories=calories, protein_g=10, fat_g=10, carbs_g=10, fiber_g=1)
             # ensure created_at matches our intended local date (auto_now_add overrides on create), use update
-            MealLog.objects.filter(pk=m.pk).update(created_at=dt)
+            MealLog.objects.filter(pk=m.pk).update(created_at=dt, local_date=d)
 
         create_day_log(0, goal+50)
         create_day_log(1, goal-50)
@@ -161,9 +161,9 @@ class HistoryGoalTests(TestCase):
             return m
         # first log 100, second log goal
         m1 = make(100)
-        MealLog.objects.filter(pk=m1.pk).update(created_at=timezone.datetime(today.year, today.month, today.day, 9, 0, 0, tzinfo=tz))
+        MealLog.objects.filter(pk=m1.pk).update(created_at=timezone.datetime(today.year, today.month, today.day, 9, 0, 0, tzinfo=tz), local_date=today)
         m2 = make(goal)
-        MealLog.objects.filter(pk=m2.pk).update(created_at=timezone.datetime(today.year, today.month, today.day, 12, 0, 0, tzinfo=tz))
+        MealLog.objects.filter(pk=m2.pk).update(created_at=timezone.datetime(today.year, today.month, today.day, 12, 0, 0, tzinfo=tz), local_date=today)
 
         # recompute for today
         from .views import recompute_day_goal_for_date
@@ -199,9 +199,9 @@ class HistoryGoalTests(TestCase):
         today = timezone.localtime(timezone.now(), tz).date()
 
         m1 = MealLog.objects.create(user=u, meal_name='a', meal_type='Other', calories=100, protein_g=5, fat_g=5, carbs_g=5, fiber_g=1)
-        MealLog.objects.filter(pk=m1.pk).update(created_at=timezone.datetime(today.year, today.month, today.day, 9, 0, 0, tzinfo=tz))
+        MealLog.objects.filter(pk=m1.pk).update(created_at=timezone.datetime(today.year, today.month, today.day, 9, 0, 0, tzinfo=tz), local_date=today)
         m2 = MealLog.objects.create(user=u, meal_name='b', meal_type='Other', calories=goal, protein_g=5, fat_g=5, carbs_g=5, fiber_g=1)
-        MealLog.objects.filter(pk=m2.pk).update(created_at=timezone.datetime(today.year, today.month, today.day, 12, 0, 0, tzinfo=tz))
+        MealLog.objects.filter(pk=m2.pk).update(created_at=timezone.datetime(today.year, today.month, today.day, 12, 0, 0, tzinfo=tz), local_date=today)
 
         # before viewing history the running_calories should still be the default 0 (no recompute happened)
         m1.refresh_from_db(); m2.refresh_from_db()
@@ -228,10 +228,15 @@ class HistoryGoalTests(TestCase):
             self.assertEqual(resp.status_code, 200)
 
 class YOLOApiTests(TestCase):
+    def setUp(self):
+        from app import yolo
+        yolo.breaker.reset()
+        yolo.retry_budget.reset()
+
     def test_predict_foods_success(self):
         import tempfile, os
         from unittest.mock import patch, MagicMock
-        from app.yolo import predict_foods, YOLOApiError
+        from app.yolo import predict_foods, get_session, YOLOApiError
 
         with tempfile.NamedTemporaryFile(delete=False) as tf:
             tf.write(b'fake image data')
@@ -240,7 +245,7 @@ class YOLOApiTests(TestCase):
             mock_resp = MagicMock()
             mock_resp.status_code = 200
             mock_resp.json.return_value = {'foods': ['Rice', 'Curry', 'Rice']}
-            with patch('app.yolo.requests.post', return_value=mock_resp) as mpost:
+            with patch.object(get_session(), 'post', return_value=mock_resp) as mpost:
                 res = predict_foods(tf.name)
                 self.assertEqual(res, ['Rice', 'Curry'])
                 called_url = mpost.call_args[0][0]
@@ -248,10 +253,39 @@ class YOLOApiTests(TestCase):
         finally:
             os.unlink(tf.name)
 
+    def test_session_is_pooled_and_reused(self):
+        from app.yolo import get_session, YOLO_API_POOL_SIZE
+        s1 = get_session()
+        self.assertIs(s1, get_session())
+        self.assertEqual(s1.get_adapter('https://example.com')._pool_maxsize, YOLO_API_POOL_SIZE)
+
+    def test_deadline_bounds_retries(self):
+        import tempfile, os
+        import requests
+        from unittest.mock import patch
+        from app import yolo
+
+        with tempfile.NamedTemporaryFile(delete=False) as tf:
+            tf.write(b'fake')
+        try:
+            err = requests.exceptions.ConnectTimeout('slow')
+            with patch.object(yolo, 'YOLO_API_DEADLINE', 0.5), \
+                    patch.object(yolo.get_session(), 'post', side_effect=err) as mpost, \
+                    patch('app.yolo.time.sleep') as msleep:
+                with self.assertRaises(yolo.YOLOApiError):
+                    yolo.predict_foods(tf.name)
+                # a 1s backoff would overrun the 0.5s deadline, so there is no retry
+                self.assertEqual(mpost.call_count, 1)
+                msleep.assert_not_called()
+                connect, read = mpost.call_args[1]['timeout']
+                self.assertLessEqual(read, 0.5)
+        finally:
+            os.unlink(tf.name)
+
     def test_predict_foods_non_200_raises(self):
         import tempfile, os
         from unittest.mock import patch, MagicMock
-        from app.yolo import predict_foods, YOLOApiError
+        from app.yolo import predict_foods, get_session, YOLOApiError
 
         with tempfile.NamedTemporaryFile(delete=False) as tf:
             tf.write(b'fake')
@@ -260,9 +294,1425 @@ class YOLOApiTests(TestCase):
             mock_resp = MagicMock()
             mock_resp.status_code = 500
             mock_resp.text = 'oops'
-            with patch('app.yolo.requests.post', return_value=mock_resp):
+            with patch.object(get_session(), 'post', return_value=mock_resp):
                 with self.assertRaises(YOLOApiError):
                     predict_foods(tf.name)
         finally:
             os.unlink(tf.name)
 
+
+class NutritionTableTests(TestCase):
+    def setUp(self):
+        from .nutrition import nutrition_table
+        nutrition_table.invalidate()
+        self.table = nutrition_table
+
+    def test_recipe_lookup_uses_single_load(self):
+        from .models import Nutrition
+        from .nutrition import calculate_nutrition_from_recipe
+        Nutrition.objects.create(ingredient='rice', calories=130, protein_g=2.7, fat_g=0.3, carbs_g=28, fiber_g=0.4)
+        Nutrition.objects.create(ingredient='dal', calories=116, protein_g=9, fat_g=0.4, carbs_g=20, fiber_g=8)
+        before = self.table.stats()
+        # first call loads the whole table (1 query), the next ones are served from memory
+        with self.assertNumQueries(1):
+            res = calculate_nutrition_from_recipe({'rice': 50, 'dal': 50, 'ghee': 0}, 200)
+        with self.assertNumQueries(0):
+            calculate_nutrition_from_recipe({'rice': 50, 'dal': 50}, 200)
+        self.assertAlmostEqual(res['calories'], 246.0)
+        self.assertAlmostEqual(res['protein_g'], 11.7)
+        stats = self.table.stats()
+        self.assertEqual(stats['misses'] - before['misses'], 1)
+        self.assertEqual(stats['hits'] - before['hits'], 4)
+
+    def test_save_and_delete_refresh_table(self):
+        from .models import Nutrition
+        from .nutrition import calculate_nutrition_for_raw_ingredient
+        self.assertIsNone(calculate_nutrition_for_raw_ingredient('carrot', 100))
+        n = Nutrition.objects.create(ingredient='carrot', calories=41, protein_g=0.9, fat_g=0.2, carbs_g=10, fiber_g=2.8)
+        self.assertEqual(calculate_nutrition_for_raw_ingredient('carrot', 200)['calories'], 82.0)
+        n.calories = 50
+        n.save()
+        self.assertEqual(calculate_nutrition_for_raw_ingredient('carrot', 200)['calories'], 100.0)
+        n.delete()
+        self.assertIsNone(calculate_nutrition_for_raw_ingredient('carrot', 100))
+
+    def test_table_reloads_after_max_age_without_a_bump(self):
+        from .models import Nutrition
+        from .nutrition import calculate_nutrition_for_raw_ingredient
+        Nutrition.objects.create(ingredient='beet', calories=43, protein_g=1.6, fat_g=0.2, carbs_g=10, fiber_g=2.8)
+        self.assertEqual(calculate_nutrition_for_raw_ingredient('beet', 100)['calories'], 43.0)
+        # e.g. an edit made by another process whose version bump this worker cannot see
+        Nutrition.objects.filter(ingredient='beet').update(calories=50)
+        self.assertEqual(calculate_nutrition_for_raw_ingredient('beet', 100)['calories'], 43.0)
+        with self.settings(NUTRITION_TABLE_MAX_AGE=0):
+            self.assertEqual(calculate_nutrition_for_raw_ingredient('beet', 100)['calories'], 50.0)
+
+
+class RecipeEngineTests(TestCase):
+    def setUp(self):
+        from .models import Recipe, Nutrition
+        from .nutrition import nutrition_table
+        from .nutrition_engine import RecipeNutritionEngine
+        nutrition_table.invalidate()
+        Nutrition.objects.create(ingredient='rice', calories=130, protein_g=2.7, fat_g=0.3, carbs_g=28, fiber_g=0.4)
+        Nutrition.objects.create(ingredient='dal', calories=116, protein_g=9, fat_g=0.4, carbs_g=20, fiber_g=8)
+        Nutrition.objects.create(ingredient='ghee', calories=900, protein_g=0, fat_g=100, carbs_g=0, fiber_g=0)
+        Recipe.objects.create(name='Dal Rice', ingredients={'rice': 120, 'dal': 60, 'ghee': 5, 'salt': 1})
+        Recipe.objects.create(name='Ghee Rice', ingredients={'rice': 150, 'ghee': 15})
+        self.engine = RecipeNutritionEngine()
+        self.engine.build()
+
+    def assertMatchesLoop(self, name, grams):
+        from .models import Recipe
+        from .nutrition import calculate_nutrition_from_recipe
+        expected = calculate_nutrition_from_recipe(Recipe.objects.get(name=name).ingredients, grams)
+        got = self.engine.compute_meal([(name, grams)])[0]
+        for k, v in expected.items():
+            self.assertAlmostEqual(got[k], v, delta=0.01)
+
+    def test_matches_python_loop(self):
+        self.assertMatchesLoop('Dal Rice', 250)
+        self.assertMatchesLoop('Ghee Rice', 180)
+        self.assertEqual(self.engine.compute_meal([('dal-rice', 100), ('Unknown', 50)])[1], None)
+
+    def test_incremental_updates(self):
+        from .models import Recipe, Nutrition
+        self.engine.update_ingredient('ghee', [800, 0, 90, 0, 0])
+        res = self.engine.compute_meal([('Ghee Rice', 165)])[0]
+        self.assertAlmostEqual(res['calories'], 150 * 1.3 + 15 * 8, places=2)
+        r = Recipe.objects.create(name='Plain Rice', ingredients={'rice': 100})
+        self.engine.update_recipe(r)
+        self.assertAlmostEqual(self.engine.compute_meal([('plain-rice', 200)])[0]['calories'], 260.0)
+        self.engine.remove_recipe(r.pk)
+        self.assertIsNone(self.engine.resolve('plain-rice'))
+
+
+class CalculateMealTests(TestCase):
+    def setUp(self):
+        from .models import Recipe, Nutrition
+        from .nutrition import nutrition_table
+        nutrition_table.invalidate()
+        for i in range(12):
+            Nutrition.objects.create(ingredient=f'ing{i}', calories=100 + i, protein_g=i, fat_g=1, carbs_g=10, fiber_g=1)
+        for i in range(10):
+            Recipe.objects.create(name=f'Dish {i}', ingredients={f'ing{i}': 50, f'ing{i + 1}': 30, f'ing{i + 2}': 20})
+
+    def test_query_count_is_constant(self):
+        from .aliases import alias_index
+        from .nutrition import calculate_meal, nutrition_table
+        small = [('dish-0', 100)]
+        large = [(f'dish-{i}', 100 + i) for i in range(10)] + [('ing3', 50), ('Dish 4', 20)]
+        alias_index.ensure_loaded()
+        # recipes only: one query joined with the materialized per-100g rows
+        nutrition_table.invalidate()
+        with self.assertNumQueries(1):
+            calculate_meal(small)
+        # cold with raw ingredients: one recipe query + one nutrition table load
+        nutrition_table.invalidate()
+        with self.assertNumQueries(2):
+            res = calculate_meal(large)
+        # warm: recipes and ingredients both come from memory
+        with self.assertNumQueries(0):
+            calculate_meal(large)
+        # unresolved labels are reported with a fixed two-query upsert
+        with self.assertNumQueries(2):
+            calculate_meal(large + [('unknown', 10), ('mystery', 5)])
+        self.assertEqual(len(res['items']), 12)
+        self.assertAlmostEqual(res['items'][10]['nutrition']['calories'], 51.5)
+
+    def test_matches_per_item_functions(self):
+        from .models import Recipe
+        from .nutrition import calculate_meal, calculate_nutrition_from_recipe, calculate_nutrition_for_raw_ingredient
+        res = calculate_meal([('Dish 2', 180), ('ing5', 75)])
+        expected = calculate_nutrition_from_recipe(Recipe.objects.get(name='Dish 2').ingredients, 180)
+        for k, v in expected.items():
+            self.assertAlmostEqual(res['items'][0]['nutrition'][k], v, delta=0.01)
+        self.assertEqual(res['items'][1]['nutrition'], calculate_nutrition_for_raw_ingredient('ing5', 75))
+        self.assertEqual(res['total']['grams'], 255)
+
+    def test_dashboard_saves_meal(self):
+        u = User.objects.create_user(username='meal', password='pw')
+        self.client.login(username='meal', password='pw')
+        resp = self.client.post('/dashboard/', {'detected_items': ['dish-1', 'ing2', 'mystery'], 'grams_dish-1': '200', 'grams_ing2': '100', 'grams_mystery': '50'})
+        self.assertEqual(resp.status_code, 302)
+        meal = MealLog.objects.get(user=u)
+        self.assertEqual(meal.meal_name, 'dish-1, ing2, mystery')
+        self.assertAlmostEqual(meal.calories, round(2 * (101 * 0.5 + 102 * 0.3 + 103 * 0.2) + 102, 2))
+
+
+class RecipeNutritionTests(TestCase):
+    def setUp(self):
+        from .models import Recipe, Nutrition
+        Nutrition.objects.create(ingredient='rice', calories=130, protein_g=2.7, fat_g=0.3, carbs_g=28, fiber_g=0.4)
+        Nutrition.objects.create(ingredient='dal', calories=116, protein_g=9, fat_g=0.4, carbs_g=20, fiber_g=8)
+        self.dal_rice = Recipe.objects.create(name='Dal Rice', ingredients={'rice': 50, 'dal': 50})
+        self.dal_soup = Recipe.objects.create(name='Dal Soup', ingredients={'dal': 40, 'water': 60})
+
+    def test_recipe_save_materializes_per_100g(self):
+        from .models import RecipeNutrition
+        self.assertAlmostEqual(RecipeNutrition.objects.get(recipe=self.dal_rice).calories, 123.0)
+        self.assertAlmostEqual(RecipeNutrition.objects.get(recipe=self.dal_soup).calories, 46.4)
+
+    def test_nutrition_edit_recomputes_only_dependents(self):
+        from .models import Nutrition, RecipeNutrition
+        before = RecipeNutrition.objects.get(recipe=self.dal_soup).updated_at
+        rice = Nutrition.objects.get(ingredient='rice')
+        rice.calories = 150
+        rice.save()
+        self.assertAlmostEqual(RecipeNutrition.objects.get(recipe=self.dal_rice).calories, 133.0)
+        self.assertEqual(RecipeNutrition.objects.get(recipe=self.dal_soup).updated_at, before)
+        Nutrition.objects.create(ingredient='water', calories=0)
+        self.assertAlmostEqual(RecipeNutrition.objects.get(recipe=self.dal_soup).calories, 46.4)
+
+    def test_deferred_rebuild_runs_once(self):
+        from unittest.mock import patch
+        from .models import Recipe, Nutrition, RecipeNutrition
+        from .recipe_nutrition import deferred_rebuild
+        from . import recipe_nutrition
+        with patch.object(recipe_nutrition, 'rebuild_recipe_nutrition', wraps=recipe_nutrition.rebuild_recipe_nutrition) as rebuild:
+            with deferred_rebuild():
+                for i in range(5):
+                    Recipe.objects.create(name=f'Bulk {i}', ingredients={'rice': 10 + i})
+                Nutrition.objects.filter(ingredient='rice').delete()
+            self.assertEqual(rebuild.call_count, 1)
+        self.assertEqual(RecipeNutrition.objects.filter(recipe__name__startswith='Bulk').count(), 5)
+        self.assertAlmostEqual(RecipeNutrition.objects.get(recipe=self.dal_rice).calories, 58.0)
+
+
+class AliasIndexTests(TestCase):
+    def setUp(self):
+        from .models import Recipe, Nutrition
+        self.tomato = Nutrition.objects.create(ingredient='tomato', calories=18, protein_g=0.9, fat_g=0.2, carbs_g=3.9, fiber_g=1.2)
+        self.paneer = Recipe.objects.create(name='Paneer Butter Masala', ingredients={'tomato': 100})
+
+    def test_normalized_labels_resolve(self):
+        from .aliases import alias_index, normalize_label
+        self.assertEqual(normalize_label('  Paneer_Butter-Masala '), 'paneer butter masala')
+        self.assertEqual(alias_index.resolve('Tomatoes').pk, self.tomato.pk)
+        self.assertEqual(alias_index.resolve('paneer_butter_masala').kind, 'recipe')
+        self.assertEqual(alias_index.resolve('PANEER-BUTTER-MASALA').pk, self.paneer.pk)
+        self.assertIsNone(alias_index.resolve('pizza'))
+
+    def test_plurals_match_known_labels_only(self):
+        from .aliases import alias_index
+        from .models import Nutrition
+        cookie = Nutrition.objects.create(ingredient='cookie', calories=480)
+        berry = Nutrition.objects.create(ingredient='berry', calories=50)
+        peas = Nutrition.objects.create(ingredient='peas', calories=81)
+        self.assertEqual(alias_index.resolve('Cookies').pk, cookie.pk)
+        self.assertEqual(alias_index.resolve('berries').pk, berry.pk)
+        self.assertEqual(alias_index.resolve('pea').pk, peas.pk)
+        self.assertIsNone(alias_index.resolve('brownies'))
+
+    def test_index_reloads_after_max_age_without_a_bump(self):
+        from .aliases import alias_index
+        from .models import Nutrition
+        alias_index.ensure_loaded()
+        # e.g. a row added by another process whose version bump this worker cannot see
+        Nutrition.objects.bulk_create([Nutrition(ingredient='okra', calories=33)])
+        self.assertIsNone(alias_index.resolve('okra'))
+        with self.settings(ALIAS_INDEX_MAX_AGE=0):
+            self.assertIsNotNone(alias_index.resolve('okra'))
+
+    def test_admin_alias_and_unresolved_report(self):
+        from .aliases import alias_index
+        from .models import FoodAlias, UnresolvedLabel
+        from .nutrition import calculate_meal
+        FoodAlias.objects.create(alias='PBM', recipe=self.paneer)
+        self.assertEqual(alias_index.resolve('pbm').pk, self.paneer.pk)
+        res = calculate_meal([('pbm', 100), ('Pizza_Slice', 100)])
+        self.assertEqual([i['food'] for i in res['items']], ['pbm'])
+        calculate_meal([('Pizza_Slice', 50)])
+        self.assertEqual(UnresolvedLabel.objects.get(label='Pizza_Slice').count, 2)
+        self.assertEqual(alias_index.stats()['unresolved'], {'Pizza_Slice': 2})
+        # client-supplied labels are stored truncated to the column length
+        alias_index.report_unresolved(['x' * 500])
+        self.assertTrue(UnresolvedLabel.objects.filter(label='x' * 200).exists())
+
+
+class RecipeCacheTests(TestCase):
+    def setUp(self):
+        from .models import Recipe
+        from .recipe import recipe_cache
+        recipe_cache.clear()
+        self.recipe = Recipe.objects.create(name='Veg Pulao', ingredients={'rice': 80, 'peas': 20})
+
+    def test_single_query_and_negative_caching(self):
+        from .recipe import get_recipe
+        with self.assertNumQueries(1):
+            self.assertEqual(get_recipe('veg-pulao'), {'rice': 80, 'peas': 20})
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_recipe('Biryani'))
+        with self.assertNumQueries(0):
+            get_recipe('veg-pulao')
+            get_recipe('Biryani')
+
+    def test_save_delete_invalidate_and_lru_bound(self):
+        from .recipe import get_recipe, RecipeCache
+        get_recipe('Veg Pulao')
+        self.recipe.ingredients = {'rice': 100}
+        self.recipe.save()
+        self.assertEqual(get_recipe('Veg Pulao'), {'rice': 100})
+        self.recipe.delete()
+        self.assertIsNone(get_recipe('Veg Pulao'))
+
+        cache = RecipeCache(maxsize=2, ttl=60)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, {key: 1})
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_calculate_meal_reads_through_cache(self):
+        from django.core.cache import cache
+        from .models import Nutrition
+        from .nutrition import calculate_meal
+        from .recipe import RECIPE_VERSION_KEY, recipe_cache
+        Nutrition.objects.create(ingredient='rice', calories=130, protein_g=2.7, fat_g=0.3, carbs_g=28, fiber_g=0.4)
+        Nutrition.objects.create(ingredient='peas', calories=80, protein_g=5, fat_g=0.4, carbs_g=14, fiber_g=5)
+        self.assertEqual(calculate_meal([('veg-pulao', 100)])['total']['calories'], 120.0)
+        self.assertEqual(recipe_cache.get(('id', self.recipe.pk)).pk, self.recipe.pk)
+        # a nutrition edit rebuilds the materialized row and drops cached recipes
+        peas = Nutrition.objects.get(ingredient='peas')
+        peas.calories = 180
+        peas.save()
+        self.assertEqual(calculate_meal([('veg-pulao', 100)])['total']['calories'], 140.0)
+        # another worker bumping the shared version empties this worker's cache
+        cache.incr(RECIPE_VERSION_KEY)
+        recipe_cache.sync()
+        self.assertEqual(recipe_cache.stats()['size'], 0)
+
+    def test_metrics_endpoint_requires_staff(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        User.objects.create_user(username='ops', password='pw', is_staff=True)
+        self.client.login(username='ops', password='pw')
+        resp = self.client.get('/metrics/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('recipe_cache', resp.json())
+
+    def test_metrics_token_only_in_header(self):
+        with self.settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get('/metrics/?token=s3cret').status_code, 403)
+
+
+class DetectionCacheTests(TestCase):
+    def _image(self, data):
+        import tempfile, os
+        tf = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
+        tf.write(data)
+        tf.close()
+        self.addCleanup(os.unlink, tf.name)
+        return tf.name
+
+    def test_same_bytes_hit_cache_without_network(self):
+        from unittest.mock import patch
+        from .detection_cache import detect_foods
+        first = self._image(b'same photo')
+        second = self._image(b'same photo')
+        with patch('app.detection_cache.predict_foods', return_value=['Rice', 'Dal']) as mpredict:
+            self.assertEqual(detect_foods(first), ['Rice', 'Dal'])
+            self.assertEqual(detect_foods(second), ['Rice', 'Dal'])
+            self.assertEqual(mpredict.call_count, 1)
+            detect_foods(self._image(b'other photo'))
+            self.assertEqual(mpredict.call_count, 2)
+
+    def test_size_budget_and_ttl(self):
+        from unittest.mock import patch
+        from .detection_cache import detection_cache, file_sha256
+        from .models import DetectionResult
+        # each row is 64 bytes of key + 8 bytes of JSON: room for two
+        with self.settings(DETECTION_CACHE_MAX_BYTES=150):
+            with patch('app.detection_cache.predict_foods', return_value=['Idli']):
+                paths = [self._image(f'photo {i}'.encode()) for i in range(3)]
+                for path in paths:
+                    detection_cache.detect(path)
+            self.assertEqual(DetectionResult.objects.count(), 2)
+            self.assertEqual(set(DetectionResult.objects.values_list('size_bytes', flat=True)), {72})
+            self.assertFalse(DetectionResult.objects.filter(sha256=file_sha256(paths[0])).exists())
+        with self.settings(DETECTION_CACHE_TTL=0):
+            self.assertEqual(detection_cache.evict(), 2)
+
+    def test_empty_results_are_not_cached(self):
+        from unittest.mock import patch
+        from .detection_cache import detect_foods
+        from .models import DetectionResult
+        path = self._image(b'blurry photo')
+        with patch('app.detection_cache.predict_foods', side_effect=[[], ['Poha']]) as mpredict:
+            self.assertEqual(detect_foods(path), [])
+            self.assertFalse(DetectionResult.objects.exists())
+            self.assertEqual(detect_foods(path), ['Poha'])
+            self.assertEqual(mpredict.call_count, 2)
+
+    def test_eviction_runs_only_when_due(self):
+        from unittest.mock import patch
+        from .detection_cache import detection_cache
+        detection_cache.evict()
+        with self.settings(DETECTION_CACHE_MAX_BYTES=10_000, DETECTION_CACHE_EVICT_EVERY=1000), \
+                patch('app.detection_cache.predict_foods', return_value=['Idli']), \
+                patch.object(detection_cache, 'evict', wraps=detection_cache.evict) as mevict:
+            for i in range(3):
+                detection_cache.detect(self._image(f'small {i}'.encode()))
+            self.assertEqual(mevict.call_count, 0)
+            with self.settings(DETECTION_CACHE_MAX_BYTES=100):
+                detection_cache.detect(self._image(b'over budget'))
+            self.assertEqual(mevict.call_count, 1)
+
+    def test_concurrent_identical_calls_coalesce(self):
+        import threading
+        from .detection_cache import SingleFlight
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return ['Dosa']
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+        follower.start()
+        # give the follower time to attach to the in-flight call
+        import time
+        time.sleep(0.05)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertCountEqual(results, [(['Dosa'], False), (['Dosa'], True)])
+
+
+class ScanJobTests(TestCase):
+    def setUp(self):
+        import tempfile, shutil
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, True)
+        self.user = User.objects.create_user(username='scanner', password='pw')
+        self.client.login(username='scanner', password='pw')
+
+    def _upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return self.client.post('/dashboard/', {'image': SimpleUploadedFile('plate.jpg', b'jpeg bytes', content_type='image/jpeg')})
+
+    def test_upload_returns_immediately_and_result_shows_on_next_get(self):
+        from unittest.mock import patch
+        from .models import ScanJob
+        with self.settings(MEDIA_ROOT=self.media, SCAN_JOBS_MODE='sync'), \
+                patch('app.scan_jobs.detect_foods', return_value=['Idli', 'Sambar']):
+            resp = self._upload()
+            self.assertEqual(resp.status_code, 302)
+            job = ScanJob.objects.get(user=self.user)
+            self.assertEqual(job.status, ScanJob.DONE)
+            resp = self.client.get('/dashboard/')
+        self.assertEqual(resp.context['detected_items'], ['Idli', 'Sambar'])
+        self.assertEqual(resp.context['scan_count'], 2)
+
+    def test_worker_mode_status_endpoint(self):
+        from unittest.mock import patch
+        from .models import ScanJob
+        from .scan_jobs import run_pending
+        with self.settings(MEDIA_ROOT=self.media, SCAN_JOBS_MODE='worker'):
+            self._upload()
+            job = ScanJob.objects.get(user=self.user)
+            self.assertEqual(self.client.get(f'/scan/{job.token}/').json()['status'], 'pending')
+            self.assertIn('scan_job', self.client.get('/dashboard/').context)
+            with patch('app.scan_jobs.detect_foods', side_effect=RuntimeError('upstream down')):
+                self.assertEqual(run_pending(), 1)
+            data = self.client.get(f'/scan/{job.token}/').json()
+            self.assertEqual(data['status'], 'failed')
+            self.assertIn('upstream down', data['error'])
+            self.assertEqual(self.client.get('/dashboard/').context['scan_error'], 'upstream down')
+
+        User.objects.create_user(username='other', password='pw')
+        self.client.login(username='other', password='pw')
+        self.assertEqual(self.client.get(f'/scan/{job.token}/').status_code, 404)
+
+    def test_multi_photo_upload_detects_concurrently_and_merges(self):
+        import threading
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from unittest.mock import patch
+        from .models import ScanJob
+        labels = {'a': ['Rice', 'Dal'], 'b': ['Dal', 'Papad'], 'c': ['Curd'], 'd': ['Rice']}
+        # detections only get past the barrier in pairs, so they must run two at a time
+        barrier = threading.Barrier(2, timeout=5)
+        lock = threading.Lock()
+        in_flight = [0, 0]  # current, peak
+
+        def paired_detect(path, digest=None):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            try:
+                barrier.wait()
+                with open(path, 'rb') as fh:
+                    return labels[fh.read().decode()[-1]]
+            finally:
+                with lock:
+                    in_flight[0] -= 1
+
+        files = [SimpleUploadedFile(f'{n}.jpg', b'jpeg bytes ' + n.encode(), content_type='image/jpeg') for n in 'abcd']
+        with self.settings(MEDIA_ROOT=self.media, SCAN_JOBS_MODE='sync', SCAN_IMAGE_CONCURRENCY=2), \
+                patch('app.scan_jobs.detect_foods', side_effect=paired_detect):
+            self.client.post('/dashboard/', {'image': files})
+        job = ScanJob.objects.get(user=self.user)
+        self.assertEqual(len(job.paths), 4)
+        self.assertEqual(job.foods, ['Rice', 'Dal', 'Papad', 'Curd'])
+        self.assertEqual(job.status, ScanJob.DONE)
+        self.assertEqual(in_flight[1], 2)
+
+    def test_multi_photo_partial_failure_keeps_other_results(self):
+        from unittest.mock import patch
+        from .scan_jobs import detect_many
+
+        def detect(path, digest=None):
+            if path == 'bad':
+                raise RuntimeError('upstream down')
+            return ['Idli']
+
+        with patch('app.scan_jobs.detect_foods', side_effect=detect):
+            self.assertEqual(detect_many(['good', 'bad']), ['Idli'])
+            with self.assertRaises(RuntimeError):
+                detect_many(['bad', 'bad'])
+
+    def test_cleanup_times_out_and_deletes(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import ScanJob
+        from .scan_jobs import cleanup_stale_jobs
+        old = timezone.now() - timedelta(days=2)
+        stuck = ScanJob.objects.create(user=self.user, image_path='x', status=ScanJob.RUNNING, started_at=old)
+        finished = ScanJob.objects.create(user=self.user, image_path='y', status=ScanJob.DONE)
+        ScanJob.objects.filter(pk=finished.pk).update(created_at=old)
+        fresh = ScanJob.objects.create(user=self.user, image_path='z')
+        self.assertEqual(cleanup_stale_jobs(), (1, 1))
+        stuck.refresh_from_db()
+        self.assertEqual(stuck.status, ScanJob.FAILED)
+        self.assertTrue(ScanJob.objects.filter(pk=fresh.pk, status=ScanJob.PENDING).exists())
+        self.assertFalse(ScanJob.objects.filter(pk=finished.pk).exists())
+
+
+class ImagePreprocessingTests(TestCase):
+    def setUp(self):
+        from app import yolo
+        yolo.breaker.reset()
+        yolo.retry_budget.reset()
+
+    def _photo(self, size=(1600, 1000), orientation=None):
+        import io, os, tempfile
+        from PIL import Image
+        img = Image.effect_noise(size, 64).convert('RGB')
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        buf = io.BytesIO()
+        img.save(buf, format='JPEG', quality=98, exif=exif.tobytes())
+        tf = tempfile.NamedTemporaryFile(delete=False, suffix='.jpeg')
+        tf.write(buf.getvalue())
+        tf.close()
+        self.addCleanup(os.unlink, tf.name)
+        return tf.name
+
+    def test_downscales_and_applies_exif_orientation(self):
+        import io
+        from PIL import Image
+        from app.imaging import prepare_image, image_stats
+        before = image_stats.stats()['bytes_in']
+        prepared = prepare_image(self._photo(orientation=6), max_side=640)
+        self.assertLess(prepared.size, prepared.original_size)
+        self.assertEqual(prepared.content_type, 'image/jpeg')
+        with Image.open(io.BytesIO(prepared.data)) as img:
+            # 1600x1000 rotated by EXIF tag 6 becomes portrait
+            self.assertEqual(img.size, (400, 640))
+        self.assertEqual(image_stats.stats()['bytes_in'] - before, prepared.original_size)
+
+    def test_retries_post_the_same_buffer(self):
+        import requests
+        from unittest.mock import patch, MagicMock
+        from app import yolo
+        ok = MagicMock(status_code=200)
+        ok.json.return_value = {'foods': ['Rice']}
+        bodies = []
+
+        def post(url, files, timeout):
+            bodies.append(files['file'][1])
+            if len(bodies) == 1:
+                raise requests.exceptions.ConnectionError('reset')
+            return ok
+
+        with patch.object(yolo.get_session(), 'post', side_effect=post), patch('app.yolo.time.sleep'):
+            self.assertEqual(yolo.predict_foods(self._photo()), ['Rice'])
+        self.assertEqual(len(bodies), 2)
+        self.assertEqual(bodies[0], bodies[1])
+        self.assertGreater(len(bodies[1]), 0)
+
+
+class ResilienceTests(TestCase):
+    def setUp(self):
+        from app import yolo
+        yolo.breaker.reset()
+        yolo.retry_budget.reset()
+        self.addCleanup(yolo.breaker.reset)
+        self.addCleanup(yolo.retry_budget.reset)
+
+    def test_breaker_opens_and_recovers(self):
+        from unittest.mock import patch
+        from app.resilience import CircuitBreaker
+        cb = CircuitBreaker(failure_threshold=2, recovery_timeout=10)
+        with patch('app.resilience.time.monotonic', return_value=100.0):
+            self.assertTrue(cb.allow())
+            cb.record_failure()
+            cb.record_failure()
+            self.assertEqual(cb.state, CircuitBreaker.OPEN)
+            self.assertFalse(cb.allow())
+        with patch('app.resilience.time.monotonic', return_value=111.0):
+            # one half-open trial at a time
+            self.assertTrue(cb.allow())
+            self.assertFalse(cb.allow())
+            cb.record_success()
+            self.assertEqual(cb.state, CircuitBreaker.CLOSED)
+        self.assertEqual(cb.stats()['times_opened'], 1)
+        self.assertEqual(cb.stats()['rejected'], 2)
+
+    def test_open_circuit_fails_fast_without_posting(self):
+        import tempfile, os
+        import requests
+        from unittest.mock import patch
+        from app import yolo
+
+        with tempfile.NamedTemporaryFile(delete=False) as tf:
+            tf.write(b'fake')
+        self.addCleanup(os.unlink, tf.name)
+        err = requests.exceptions.ConnectionError('down')
+        with patch.object(yolo.breaker, 'failure_threshold', 2), \
+                patch.object(yolo.get_session(), 'post', side_effect=err) as mpost, \
+                patch('app.yolo.time.sleep'):
+            with self.assertRaises(yolo.YOLOApiError):
+                yolo.predict_foods(tf.name)
+            self.assertEqual(mpost.call_count, 2)
+            with self.assertRaises(yolo.YOLOApiError) as ctx:
+                yolo.predict_foods(tf.name)
+            self.assertIn('circuit open', str(ctx.exception))
+            self.assertEqual(mpost.call_count, 2)
+
+    def test_half_open_trial_is_settled_on_every_exit(self):
+        import tempfile, os
+        import requests
+        from unittest.mock import patch
+        from app import yolo
+        from app.resilience import CircuitBreaker
+
+        with tempfile.NamedTemporaryFile(delete=False) as tf:
+            tf.write(b'fake')
+        self.addCleanup(os.unlink, tf.name)
+        cb = CircuitBreaker(failure_threshold=1, recovery_timeout=10)
+        with patch.object(yolo, 'breaker', cb), patch('app.resilience.time.monotonic', return_value=100.0):
+            cb.record_failure()
+        session = yolo.get_session()
+        with patch.object(yolo, 'breaker', cb), patch('app.resilience.time.monotonic', return_value=111.0):
+            # a non-connection transport error during the trial re-opens the circuit
+            err = requests.exceptions.ChunkedEncodingError('truncated body')
+            with patch.object(session, 'post', side_effect=err):
+                with self.assertRaises(yolo.YOLOApiError):
+                    yolo.predict_foods(tf.name)
+            self.assertEqual(cb.state, CircuitBreaker.OPEN)
+        with patch.object(yolo, 'breaker', cb), patch('app.resilience.time.monotonic', return_value=122.0):
+            # an exception that is no upstream outcome hands the trial slot back
+            with patch.object(session, 'post', side_effect=RuntimeError('bug')):
+                with self.assertRaises(yolo.YOLOApiError):
+                    yolo.predict_foods(tf.name)
+            self.assertTrue(cb.allow())
+            cb.release()
+            # an exhausted deadline gives up before reserving the trial slot
+            with patch.object(yolo, 'YOLO_API_DEADLINE', 0), patch.object(session, 'post') as mpost:
+                with self.assertRaises(yolo.YOLOApiError):
+                    yolo.predict_foods(tf.name)
+            mpost.assert_not_called()
+            self.assertTrue(cb.allow())
+
+    def test_retry_budget_limits_retries(self):
+        import tempfile, os
+        import requests
+        from unittest.mock import patch
+        from app import yolo
+        from app.resilience import RetryBudget
+
+        with tempfile.NamedTemporaryFile(delete=False) as tf:
+            tf.write(b'fake')
+        self.addCleanup(os.unlink, tf.name)
+        err = requests.exceptions.ConnectionError('reset')
+        # 0.5 tokens after the deposit: not enough for a single retry
+        with patch.object(yolo, 'retry_budget', RetryBudget(ratio=0.5, initial_tokens=0)), \
+                patch.object(yolo.get_session(), 'post', side_effect=err) as mpost, \
+                patch('app.yolo.time.sleep') as msleep:
+            with self.assertRaises(yolo.YOLOApiError) as ctx:
+                yolo.predict_foods(tf.name)
+            self.assertIn('retry budget', str(ctx.exception))
+            self.assertEqual(mpost.call_count, 1)
+            msleep.assert_not_called()
+            self.assertEqual(yolo.retry_budget.stats()['exhausted'], 1)
+
+    def test_latency_window_percentiles(self):
+        from app.resilience import LatencyWindow
+        window = LatencyWindow()
+        for ms in range(1, 101):
+            window.record(ms / 1000.0, ok=ms % 10 != 0)
+        stats = window.stats()
+        self.assertEqual(stats['count'], 100)
+        self.assertEqual(stats['p50_ms'], 50.0)
+        self.assertEqual(stats['p95_ms'], 95.0)
+        self.assertEqual(stats['p99_ms'], 99.0)
+        self.assertEqual(stats['error_rate'], 0.1)
+
+    def test_hedged_request_takes_first_success(self):
+        import tempfile, os, threading
+        from unittest.mock import patch, MagicMock
+        from app import yolo
+
+        with tempfile.NamedTemporaryFile(delete=False) as tf:
+            tf.write(b'fake')
+        self.addCleanup(os.unlink, tf.name)
+        ok = MagicMock(status_code=200)
+        ok.json.return_value = {'foods': ['Dal']}
+        release = threading.Event()
+        calls = []
+
+        def post(url, files, timeout):
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(5)  # the first copy stalls
+            return ok
+
+        fired = yolo.hedge_stats['fired']
+        with patch.object(yolo, 'YOLO_HEDGE_AFTER', 0.05), \
+                patch.object(yolo.get_session(), 'post', side_effect=post):
+            self.assertEqual(yolo.predict_foods(tf.name), ['Dal'])
+        release.set()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(yolo.hedge_stats['fired'] - fired, 1)
+
+
+class WarmerTests(TestCase):
+    def _warmer(self, **kwargs):
+        from app.warmer import SpaceWarmer
+        return SpaceWarmer(url='http://space.test/', cold_threshold=5, min_gap=60, **kwargs)
+
+    def test_ping_classifies_warm_cold_and_down(self):
+        import requests
+        from unittest.mock import patch, MagicMock
+        from app.yolo import get_session
+        w = self._warmer()
+        with patch.object(get_session(), 'get', return_value=MagicMock(status_code=200)):
+            self.assertEqual(w.ping(), w.WARM)
+        with patch.object(get_session(), 'get', return_value=MagicMock(status_code=503)):
+            self.assertEqual(w.ping(), w.COLD)
+        # a slow answer is a cold start too
+        with patch.object(get_session(), 'get', return_value=MagicMock(status_code=404)), \
+                patch('app.warmer.time.monotonic', side_effect=[0.0, 12.0]):
+            self.assertEqual(w.ping(), w.COLD)
+        with patch.object(get_session(), 'get', side_effect=requests.exceptions.ConnectionError('no route')):
+            self.assertEqual(w.ping(), w.DOWN)
+        stats = w.stats()
+        self.assertEqual((stats['pings'], stats['cold_starts'], stats['failures']), (4, 2, 1))
+
+    def test_prewarm_skips_when_recently_warm(self):
+        import threading
+        from unittest.mock import patch, MagicMock
+        from app.yolo import get_session
+        w = self._warmer()
+        with patch.object(get_session(), 'get', return_value=MagicMock(status_code=200)) as mget:
+            self.assertTrue(w.prewarm())
+            for t in threading.enumerate():
+                if t.name == 'yolo-prewarm':
+                    t.join(5)
+            self.assertEqual(w.state, w.WARM)
+            self.assertFalse(w.prewarm())
+        self.assertEqual(mget.call_count, 1)
+
+    def test_upload_form_prewarm_endpoint(self):
+        from unittest.mock import patch
+        User.objects.create_user(username='warm', password='pw')
+        self.client.login(username='warm', password='pw')
+        self.assertEqual(self.client.get('/scan/warm/').status_code, 405)
+        with patch('app.views.warmer.prewarm', return_value=True) as mprewarm:
+            data = self.client.post('/scan/warm/').json()
+        mprewarm.assert_called_once()
+        self.assertTrue(data['started'])
+
+
+class DetectionBackendTests(TestCase):
+    def _image(self, data):
+        import os, tempfile
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tf:
+            tf.write(data)
+        self.addCleanup(os.unlink, tf.name)
+        return tf.name
+
+    def test_stub_is_deterministic(self):
+        from app.backends import StubBackend
+        stub = StubBackend(latency=0)
+        path = self._image(b'plate one')
+        labels = stub.predict(path)
+        self.assertTrue(1 <= len(labels) <= 3)
+        self.assertEqual(labels, StubBackend(latency=0).predict(self._image(b'plate one')))
+
+    def test_local_backend_loads_once_and_batches_concurrent_calls(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from app.backends import LocalBackend
+        loads, batches = [], []
+        gate = threading.Event()
+
+        def loader(model_path):
+            loads.append(model_path)
+
+            def run(paths):
+                gate.wait(5)  # hold the first batch so the others queue up
+                batches.append(list(paths))
+                return [[p.rsplit('/', 1)[-1], 'Rice', 'Rice'] for p in paths]
+            return run
+
+        backend = LocalBackend(model_path='food.pt', loader=loader, max_batch=8, max_wait_ms=50)
+        paths = [f'/tmp/img{i}' for i in range(6)]
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            futures = [pool.submit(backend.predict, p) for p in paths]
+            gate.set()
+            results = [f.result() for f in futures]
+        self.assertEqual(results, [[p.rsplit('/', 1)[-1], 'Rice'] for p in paths])
+        self.assertEqual(loads, ['food.pt'])
+        self.assertLess(len(batches), 6)
+        self.assertEqual(sorted(p for b in batches for p in b), sorted(paths))
+
+    def test_registry_selects_backend_from_settings(self):
+        from django.core.exceptions import ImproperlyConfigured
+        from app.backends import get_backend, StubBackend, RemoteBackend
+        with self.settings(DETECTION_BACKEND='stub'):
+            self.assertIsInstance(get_backend(), StubBackend)
+        self.assertIsInstance(get_backend(), RemoteBackend)
+        with self.settings(DETECTION_BACKEND='nope'):
+            with self.assertRaises(ImproperlyConfigured):
+                get_backend()
+
+    def test_cached_results_are_namespaced_per_backend(self):
+        from .detection_cache import detect_foods, file_sha256
+        from .models import DetectionResult
+        from app.backends import StubBackend
+        path = self._image(b'namespaced plate')
+        with self.settings(DETECTION_BACKEND='stub', DETECTION_STUB_LATENCY=0):
+            self.assertEqual(detect_foods(path), StubBackend(latency=0).predict(path))
+        self.assertEqual(DetectionResult.objects.count(), 1)
+        self.assertFalse(DetectionResult.objects.filter(sha256=file_sha256(path)).exists())
+
+
+class LoadHarnessTests(TestCase):
+    def test_standin_implements_predict_contract(self):
+        import tempfile, os
+        from unittest.mock import patch
+        from app import yolo
+        from app.standin import StandInConfig, start_in_thread
+        yolo.breaker.reset()
+        self.addCleanup(yolo.breaker.reset)
+        server = start_in_thread(StandInConfig(foods=['Idli', 'Sambar', 'Idli']))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with tempfile.NamedTemporaryFile(delete=False) as tf:
+            tf.write(b'fake')
+        self.addCleanup(os.unlink, tf.name)
+        with patch.object(yolo, 'YOLO_API_URL', server.url):
+            self.assertEqual(yolo.predict_foods(tf.name), ['Idli', 'Sambar'])
+            server.config.error_rate = 1.0
+            with self.assertRaises(yolo.YOLOApiError):
+                yolo.predict_foods(tf.name)
+        self.assertEqual((server.config.requests, server.config.errors), (2, 1))
+
+    def test_virtual_user_runs_every_step(self):
+        import tempfile, shutil
+        from app.backends import StubBackend
+        from app.loadtest import ScanLoadTest
+        from .models import Nutrition
+        for label in StubBackend.LABELS:
+            Nutrition.objects.create(ingredient=label, calories=100, protein_g=5, fat_g=2, carbs_g=15)
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, True)
+        test = ScanLoadTest(users=1, iterations=2, concurrency=1)
+        test.create_users()
+        with self.settings(MEDIA_ROOT=media, SCAN_JOBS_MODE='sync', DETECTION_BACKEND='stub', DETECTION_STUB_LATENCY=0):
+            result = test.run()
+        self.assertEqual(result['completed_meals'], 2)
+        steps = result['steps']
+        self.assertEqual([steps[s]['count'] for s in ('login', 'upload', 'weights')], [1, 2, 2])
+        self.assertEqual(sum(steps[s]['errors'] for s in steps), 0)
+        self.assertGreater(steps['weights']['avg_queries'], 0)
+        self.assertEqual(MealLog.objects.filter(user__username='loadtest_0').count(), 2)
+        from .models import DetectionResult
+        DetectionResult.objects.create(sha256='f' * 64, foods=['rice'])
+        self.assertEqual(test.delete_detections('stub'), 2)
+        self.assertEqual(list(DetectionResult.objects.values_list('sha256', flat=True)), ['f' * 64])
+        test.delete_users()
+        self.assertFalse(User.objects.filter(username__startswith='loadtest_').exists())
+
+    def test_standin_results_are_cached_apart_from_remote(self):
+        from app.backends import get_backend
+        from app.detection_cache import cache_key
+        self.assertEqual(cache_key('a' * 64, get_backend('remote').cache_namespace), 'a' * 64)
+        self.assertNotEqual(cache_key('a' * 64, get_backend('standin').cache_namespace), 'a' * 64)
+
+
+class MediaStorageTests(TestCase):
+    def setUp(self):
+        import tempfile, shutil
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, True)
+        override = self.settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _upload(self, data, name='plate.JPEG'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from app.storage import media_storage
+        return media_storage.save_upload(SimpleUploadedFile(name, data, content_type='image/jpeg'))
+
+    def test_identical_uploads_share_one_sharded_file(self):
+        import hashlib, os
+        path1, digest = self._upload(b'same bytes')
+        path2, _ = self._upload(b'same bytes', name='copy.jpg')
+        other, _ = self._upload(b'other bytes')
+        self.assertEqual(digest, hashlib.sha256(b'same bytes').hexdigest())
+        self.assertEqual(path1, path2)
+        self.assertNotEqual(path1, other)
+        self.assertTrue(path1.endswith(os.path.join('scans', digest[:2], digest[2:4], digest + '.jpg')))
+        with open(path1, 'rb') as fh:
+            self.assertEqual(fh.read(), b'same bytes')
+        self.assertEqual(os.listdir(os.path.join(self.media, 'scans', 'tmp')), [])
+
+    def test_gc_removes_expired_and_unreferenced_files(self):
+        import os, time
+        from django.core.management import call_command
+        from app.storage import collect_garbage
+        from .models import ScanJob
+        user = User.objects.create_user(username='gc', password='pw')
+        referenced, _ = self._upload(b'referenced')
+        orphan, _ = self._upload(b'orphan')
+        fresh_orphan, _ = self._upload(b'fresh orphan')
+        expired, _ = self._upload(b'expired but referenced')
+        ScanJob.objects.create(user=user, image_path=referenced)
+        ScanJob.objects.create(user=user, image_path=expired, image_paths=[expired, referenced])
+        hour_ago = time.time() - 7200
+        for path in (referenced, orphan):
+            os.utime(path, (hour_ago, hour_ago))
+        month_ago = time.time() - 40 * 86400
+        os.utime(expired, (month_ago, month_ago))
+
+        dry = collect_garbage(dry_run=True)
+        self.assertEqual((dry['expired'], dry['unreferenced']), (1, 1))
+        self.assertTrue(os.path.exists(orphan))
+        call_command('gc_media', stdout=open(os.devnull, 'w'))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertFalse(os.path.exists(expired))
+        self.assertTrue(os.path.exists(referenced))
+        self.assertTrue(os.path.exists(fresh_orphan))
+        self.assertFalse(os.path.exists(os.path.dirname(orphan)))
+
+    def test_dashboard_upload_links_stored_file_to_scan_job(self):
+        import hashlib
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from unittest.mock import patch
+        from .models import ScanJob
+        User.objects.create_user(username='cas', password='pw')
+        self.client.login(username='cas', password='pw')
+        with self.settings(SCAN_JOBS_MODE='sync'), patch('app.scan_jobs.detect_foods', return_value=['Rice']) as mdetect:
+            for _ in range(2):
+                self.client.post('/dashboard/', {'image': SimpleUploadedFile('p.jpg', b'plate', content_type='image/jpeg')})
+        paths = set(ScanJob.objects.values_list('image_path', flat=True))
+        self.assertEqual(len(paths), 1)
+        path = paths.pop()
+        self.assertIn('/scans/', path)
+        # the upload digest reaches the detection cache, which then skips hashing the file
+        mdetect.assert_called_with(path, digest=hashlib.sha256(b'plate').hexdigest())
+
+    def test_upload_survives_gc_removing_the_existing_copy(self):
+        import os
+        from unittest.mock import patch
+        from app.storage import media_storage
+        path, digest = self._upload(b'raced bytes')
+
+        def collected(target, *args):
+            os.unlink(target)  # gc_media deletes the file between the lookup and the touch
+            raise FileNotFoundError(target)
+
+        with patch('app.storage.os.utime', side_effect=collected):
+            again, _ = self._upload(b'raced bytes')
+        self.assertEqual(again, path)
+        with open(path, 'rb') as fh:
+            self.assertEqual(fh.read(), b'raced bytes')
+        self.assertEqual(media_storage.digest_of(path), digest)
+        self.assertIsNone(media_storage.digest_of(os.path.join(self.media, 'plate.jpg')))
+
+
+class DailyAggregationTests(TestCase):
+    def _log(self, user, local_dt, calories):
+        return MealLog.objects.create(user=user, meal_name='x', calories=calories, protein_g=1, fat_g=2, carbs_g=3, fiber_g=0,
+                                      created_at=local_dt)
+
+    def test_series_and_calendar_group_by_local_day_in_one_query(self):
+        from zoneinfo import ZoneInfo
+        from django.utils import timezone
+        from .logs import date_range_series, calendar_heatmap
+        tz = ZoneInfo('Asia/Kolkata')
+        u = User.objects.create_user(username='agg', password='pw')
+        today = timezone.localtime(timezone.now(), tz).date()
+        yesterday = today - timezone.timedelta(days=1)
+        # 23:30 IST is still the same local day although it is 18:00 UTC
+        self._log(u, timezone.datetime(yesterday.year, yesterday.month, yesterday.day, 23, 30, tzinfo=tz), 300)
+        self._log(u, timezone.datetime(yesterday.year, yesterday.month, yesterday.day, 0, 15, tzinfo=tz), 200.555)
+        self._log(u, timezone.datetime(today.year, today.month, today.day, 0, 5, tzinfo=tz), 50)
+        old = today - timezone.timedelta(days=40)
+        self._log(u, timezone.datetime(old.year, old.month, old.day, 12, 0, tzinfo=tz), 999)
+
+        with self.assertNumQueries(1):
+            series = date_range_series(u, days=7)
+        self.assertEqual([s['date'] for s in series], [today - timezone.timedelta(days=i) for i in range(6, -1, -1)])
+        self.assertEqual(series[-2]['calories'], 500.56)
+        self.assertEqual(series[-2]['protein_g'], 2)
+        self.assertEqual(series[-1]['calories'], 50)
+        self.assertEqual(sum(s['calories'] for s in series[:-2]), 0)
+
+        with self.assertNumQueries(1):
+            cal = calendar_heatmap(u, days=7)
+        self.assertEqual(cal['max'], 500.56)
+        self.assertEqual(len(cal['days']), 7)
+        self.assertEqual(cal['days'][-1]['date'], today.isoformat())
+
+
+class DailyTotalsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='rollup', password='pw')
+
+    def _meal(self, calories, **kw):
+        return MealLog.objects.create(user=self.user, meal_name='m', calories=calories, protein_g=kw.get('protein_g', 1),
+                                      fat_g=1, carbs_g=1, fiber_g=0)
+
+    def test_rollup_follows_create_edit_delete(self):
+        from .models import DailyTotals
+        a = self._meal(1500, protein_g=10)
+        b = self._meal(700, protein_g=5)
+        row = DailyTotals.objects.get(user=self.user)
+        self.assertEqual(row.local_date, a.local_date)
+        self.assertEqual((row.calories, row.protein_g, row.meal_count), (2200, 15, 2))
+        self.assertTrue(row.goal_achieved)  # default goal 2000 kcal without a profile BMR
+
+        b.calories = 100
+        b.save()
+        row.refresh_from_db()
+        self.assertEqual((row.calories, row.goal_achieved), (1600, False))
+
+        a.delete()
+        row.refresh_from_db()
+        self.assertEqual((row.calories, row.meal_count), (100, 1))
+        b.delete()
+        self.assertFalse(DailyTotals.objects.filter(user=self.user).exists())
+
+    def test_profile_change_reevaluates_goal(self):
+        from .models import DailyTotals
+        self._meal(1800)
+        self.assertFalse(DailyTotals.objects.get(user=self.user).goal_achieved)
+        p = self.user.profile
+        p.age, p.height_cm, p.weight_kg, p.sex = 30, 160, 55, 'F'  # BMR ~1250
+        p.save()
+        self.assertTrue(DailyTotals.objects.get(user=self.user).goal_achieved)
+
+    def test_checker_detects_and_fixes_drift(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import DailyTotals
+        from .rollups import check_consistency
+        self._meal(500)
+        self.assertEqual(check_consistency(), [])
+        MealLog.objects.filter(user=self.user).update(calories=900)  # bypasses signals
+        problems = check_consistency()
+        self.assertEqual(len(problems), 1)
+        self.assertIn('calories', problems[0][2])
+        out = StringIO()
+        call_command('check_daily_totals', '--fix', stdout=out)
+        self.assertEqual(DailyTotals.objects.get(user=self.user).calories, 900)
+        self.assertEqual(check_consistency(), [])
+
+        DailyTotals.objects.all().delete()
+        call_command('rebuild_daily_totals', stdout=out)
+        self.assertEqual(DailyTotals.objects.get(user=self.user).meal_count, 1)
+
+    def test_saves_that_keep_totals_skip_the_refresh(self):
+        from unittest.mock import patch
+        meal = self._meal(500)
+        with patch('app.rollups.refresh_day') as mrefresh:
+            meal.meal_name = 'renamed'
+            meal.day_goal_achieved = True
+            meal.save()
+            mrefresh.assert_not_called()
+            meal.calories = 600
+            meal.save()
+            mrefresh.assert_called_once_with(self.user.pk, meal.local_date)
+
+    def test_refresh_locks_the_user_before_aggregating(self):
+        from unittest.mock import Mock, patch
+        from . import rollups
+        meal = self._meal(500)
+        calls = Mock()
+        calls.lock.side_effect = rollups.streaks.lock
+        calls.daily_totals.side_effect = rollups.daily_totals
+        with patch('app.rollups.streaks.lock', calls.lock), patch('app.rollups.daily_totals', calls.daily_totals):
+            rollups.refresh_day(self.user.pk, meal.local_date)
+        self.assertEqual([c[0] for c in calls.mock_calls[:2]], ['lock', 'daily_totals'])
+        calls.lock.assert_called_once_with(self.user.pk)
+
+    def test_migration_backfills_existing_meals(self):
+        from importlib import import_module
+        from django.apps import apps
+        from .models import DailyTotals
+        self._meal(1500)
+        self._meal(700)
+        p = self.user.profile
+        p.age, p.height_cm, p.weight_kg, p.sex = 30, 180, 80, 'M'  # BMR 1780
+        p.save()
+        expected = list(DailyTotals.objects.values_list('local_date', 'calories', 'meal_count', 'goal_achieved'))
+        DailyTotals.objects.all().delete()
+        import_module('app.migrations.0014_daily_totals').backfill_daily_totals(apps, None)
+        self.assertEqual(list(DailyTotals.objects.values_list('local_date', 'calories', 'meal_count', 'goal_achieved')), expected)
+        self.assertEqual(expected[0][1:], (2200, 2, True))
+
+
+class StreakTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='streaky', password='pw')
+
+    def _meal(self, calories=300):
+        # the streak cache is only written once the meal's transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return MealLog.objects.create(user=self.user, meal_name='m', calories=calories, protein_g=1, fat_g=1, carbs_g=1, fiber_g=0)
+
+    def _backdate(self, meal, days):
+        from django.utils import timezone
+        from .rollups import rebuild
+        MealLog.objects.filter(pk=meal.pk).update(created_at=meal.created_at - timezone.timedelta(days=days),
+                                                  local_date=meal.local_date - timezone.timedelta(days=days))
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild(user_ids=[self.user.pk])
+
+    def _render_context(self):
+        from django.test import RequestFactory
+        from .context_processors import streak
+        request = RequestFactory().get('/')
+        request.user = self.user
+        return streak(request)
+
+    def test_logging_extends_run_and_warm_read_is_free(self):
+        from . import streaks
+        self._backdate(self._meal(), 1)
+        self._backdate(self._meal(), 2)
+        self.assertEqual(self._render_context()['streak']['count'], 0)  # nothing today yet
+        self._meal()
+        with self.assertNumQueries(0):
+            ctx = self._render_context()
+        self.assertEqual(ctx['streak']['count'], 3)
+        self.user.profile.refresh_from_db()
+        self.assertEqual((self.user.profile.streak_count, self.user.profile.streak_last_date), (3, streaks.local_today(self.user.pk)))
+
+        # a second meal the same day neither recomputes nor writes: one locked read of the profile
+        with self.assertNumQueries(1):
+            streaks.note_day(self.user.pk, streaks.local_today(self.user.pk), active=True)
+
+    def test_rollover_and_delete(self):
+        from django.utils import timezone
+        from . import streaks
+        today = streaks.local_today(self.user.pk)
+        meal = self._meal()
+        self.assertEqual(streaks.current_streak(self.user.pk), 1)
+        self.assertEqual(streaks.current_streak(self.user.pk, today + timezone.timedelta(days=1)), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            meal.delete()
+        self.assertEqual(streaks.get_streak(self.user.pk), (0, None))
+
+    def test_cold_read_recomputes_from_rollup(self):
+        from django.core.cache import cache
+        from . import streaks
+        self._backdate(self._meal(), 1)
+        self._meal()
+        cache.clear()
+        streaks.forget([self.user.pk])
+        self.assertEqual(streaks.current_streak(self.user.pk), 2)
+        cache.delete(streaks.STREAK_KEY.format(self.user.pk))
+        with self.assertNumQueries(1):  # stored on the profile now
+            self.assertEqual(streaks.current_streak(self.user.pk), 2)
+
+
+    def test_write_path_ignores_the_cache_and_rollbacks_leave_it_alone(self):
+        from django.core.cache import cache
+        from django.db import transaction
+        from django.utils import timezone
+        from . import streaks
+        self._meal()
+        today = streaks.local_today(self.user.pk)
+        key = streaks.STREAK_KEY.format(self.user.pk)
+        cache.set(key, (40, today - streaks.ONE_DAY))  # stale copy from another worker
+        self._meal()
+        self.user.profile.refresh_from_db()
+        self.assertEqual((self.user.profile.streak_count, self.user.profile.streak_last_date), (1, today))
+
+        cache.delete(key)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    MealLog.objects.create(user=self.user, meal_name='m', calories=300, protein_g=1, fat_g=1, carbs_g=1,
+                                           fiber_g=0, created_at=timezone.now() - streaks.ONE_DAY)
+                    self.assertEqual(streaks.lock(self.user.pk), (2, today))
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(streaks.get_streak(self.user.pk), (1, today))
+
+
+class WindowedAnalyticsTests(TestCase):
+    def test_sql_grouping_matches_local_time_rules(self):
+        from django.utils import timezone
+        from .logs import hourly_heatmap, macros_totals, meal_type_breakdown
+        from .timezones import DEFAULT_TIMEZONE, get_zone
+        tz = get_zone(DEFAULT_TIMEZONE)
+        u = User.objects.create_user(username='windowed', password='pw')
+        today = timezone.localtime(timezone.now(), tz).date()
+        start = today - timezone.timedelta(days=6)
+        # (days ago, local hour, calories): breakfast, lunch, snack, dinner, late night, and one outside the window
+        for days_ago, hour, cal in ((0, 8, 100), (1, 12, 200), (2, 16, 50), (3, 19, 300), (4, 23, 40), (5, 2, 10), (9, 12, 999)):
+            d = today - timezone.timedelta(days=days_ago)
+            m = MealLog.objects.create(user=u, meal_name='m', calories=cal, protein_g=cal / 10, fat_g=1, carbs_g=2, fiber_g=0)
+            MealLog.objects.filter(pk=m.pk).update(created_at=timezone.datetime(d.year, d.month, d.day, hour, 30, tzinfo=tz), local_date=d)
+
+        with self.assertNumQueries(1):
+            items = meal_type_breakdown(u, start)
+        self.assertEqual(items, [('Breakfast', 100.0), ('Lunch', 200.0), ('Snack', 50.0), ('Dinner', 300.0), ('Other', 50.0)])
+
+        with self.assertNumQueries(1):
+            totals = macros_totals(u, start)
+        self.assertEqual(totals, {'protein_g': 70.0, 'fat_g': 6.0, 'carbs_g': 12.0})
+        self.assertEqual(macros_totals(u, today + timezone.timedelta(days=1)), {'protein_g': 0, 'fat_g': 0, 'carbs_g': 0})
+
+        with self.assertNumQueries(1):
+            heat = hourly_heatmap(u, start)
+        dinner_day = today - timezone.timedelta(days=3)
+        self.assertEqual(heat[dinner_day.weekday()][19], 300)
+        self.assertEqual(sum(map(sum, heat)), 700)
+
+
+class LocalDateTests(TestCase):
+    def test_local_date_follows_profile_timezone(self):
+        from datetime import datetime, timezone as dt_timezone
+        from .logs import daily_totals
+        from .models import DailyTotals
+        u = User.objects.create_user(username='tzuser', password='pw')
+        # 03:00 UTC on Mar 10 is still Mar 9 in Los Angeles, but Mar 10 in India
+        at = datetime(2026, 3, 10, 3, 0, tzinfo=dt_timezone.utc)
+        m = MealLog.objects.create(user=u, meal_name='m', calories=400, protein_g=1, fat_g=1, carbs_g=1, fiber_g=0, created_at=at)
+        self.assertEqual(str(m.local_date), '2026-03-10')
+
+        p = u.profile
+        p.timezone = 'America/Los_Angeles'
+        p.save()
+        m.refresh_from_db()
+        self.assertEqual(str(m.local_date), '2026-03-09')
+        self.assertEqual(list(DailyTotals.objects.filter(user=u).values_list('local_date', flat=True)), [m.local_date])
+        self.assertEqual(list(daily_totals(u, m.local_date, m.local_date)), [m.local_date])
+
+        later = MealLog.objects.create(user=u, meal_name='m', calories=1, protein_g=1, fat_g=1, carbs_g=1, fiber_g=0, created_at=at)
+        self.assertEqual(later.local_date, m.local_date)
+
+    def test_meal_save_ignores_a_stale_cached_timezone(self):
+        from datetime import datetime, timezone as dt_timezone
+        from django.core.cache import cache
+        from .models import Profile
+        from .timezones import USER_TZ_KEY
+        u = User.objects.create_user(username='tzstale', password='pw')
+        # another worker changed the zone: this process still has the old one cached
+        cache.set(USER_TZ_KEY.format(u.pk), 'Asia/Kolkata')
+        Profile.objects.filter(user=u).update(timezone='America/Los_Angeles')
+        at = datetime(2026, 3, 10, 3, 0, tzinfo=dt_timezone.utc)
+        m = MealLog.objects.create(user=u, meal_name='m', calories=400, protein_g=1, fat_g=1, carbs_g=1, fiber_g=0, created_at=at)
+        self.assertEqual(str(m.local_date), '2026-03-09')
+        self.assertEqual(cache.get(USER_TZ_KEY.format(u.pk)), 'America/Los_Angeles')
+
+    def test_timezone_and_goal_change_in_one_save(self):
+        from .models import DailyTotals
+        u = User.objects.create_user(username='tzgoal', password='pw')
+        MealLog.objects.create(user=u, meal_name='m', calories=1800, protein_g=1, fat_g=1, carbs_g=1, fiber_g=0)
+        self.assertFalse(DailyTotals.objects.get(user=u).goal_achieved)
+        p = u.profile
+        p.timezone = 'Europe/Berlin'
+        p.age, p.height_cm, p.weight_kg, p.sex = 30, 160, 55, 'F'  # BMR ~1250
+        p.save()
+        self.assertTrue(DailyTotals.objects.get(user=u).goal_achieved)
+
+    def test_profile_form_validates_timezone(self):
+        u = User.objects.create_user(username='tzform', password='pw')
+        self.client.login(username='tzform', password='pw')
+        self.client.post(reverse('profile'), {'timezone': 'Europe/Berlin'})
+        u.profile.refresh_from_db()
+        self.assertEqual(u.profile.timezone, 'Europe/Berlin')
+        self.client.post(reverse('profile'), {'timezone': 'Not/AZone'})
+        u.profile.refresh_from_db()
+        self.assertEqual(u.profile.timezone, 'Europe/Berlin')
+
+
+class HistoryAnalyticsTests(TestCase):
+    def test_single_pass_matches_the_per_chart_helpers(self):
+        from django.utils import timezone
+        from .analytics import history_analytics
+        from .logs import calendar_heatmap, date_range_series, hourly_heatmap, macros_totals, meal_type_breakdown
+        from .timezones import local_today, user_timezone
+        u = User.objects.create_user(username='onepass', password='pw')
+        tz = user_timezone(u)
+        today = local_today(tz)
+        for days_ago, hour, cal in ((0, 8, 120), (0, 20, 480), (2, 13, 300), (6, 1, 90), (7, 12, 700), (13, 9, 50), (20, 9, 999)):
+            d = today - timezone.timedelta(days=days_ago)
+            MealLog.objects.create(user=u, meal_name='m', meal_type='Dinner', calories=cal, protein_g=cal / 20, fat_g=cal / 50,
+                                   carbs_g=cal / 8, fiber_g=1, created_at=timezone.datetime(d.year, d.month, d.day, hour, 0, tzinfo=tz))
+
+        with self.assertNumQueries(1):
+            stats = history_analytics(u, 7)
+        start = today - timezone.timedelta(days=6)
+        self.assertEqual(stats['series'], date_range_series(u, 7))
+        self.assertEqual(stats['calendar_heatmap'], calendar_heatmap(u, 7))
+        self.assertEqual(stats['meal_type_items'], meal_type_breakdown(u, start))
+        self.assertEqual(stats['hourly_heatmap'], hourly_heatmap(u, start))
+        for k, v in macros_totals(u, start).items():
+            self.assertAlmostEqual(stats['macros_totals'][k], v)
+        self.assertEqual(stats['total_today']['calories'], 600)
+        self.assertEqual(stats['prev_total'], 750)  # days 7..13 only; day 20 is outside both periods
+        self.assertEqual([d['date'] for d in stats['days']], [today, today - timezone.timedelta(days=2), today - timezone.timedelta(days=6)])
+        self.assertEqual(len(stats['logs']), 4)
+        # 01:00 falls outside the meal windows, so the list shows the stored meal type
+        self.assertEqual(stats['days'][-1]['items'][0]['computed_type'], 'Dinner')
+        self.assertEqual(stats['logs'][-1].computed_type, 'Other')
+
+
+class HistoryQueryBudgetTests(TestCase):
+    # session, user, profile, day flags, the one-pass window query
+    BUDGET = 5
+
+    def test_history_query_count_does_not_grow_with_the_window(self):
+        from django.utils import timezone
+        from .timezones import local_today, user_timezone
+        u = User.objects.create_user(username='budget', password='pw')
+        tz = user_timezone(u)
+        today = local_today(tz)
+        for i in range(30):
+            d = today - timezone.timedelta(days=i)
+            MealLog.objects.create(user=u, meal_name='m', calories=2500, protein_g=10, fat_g=10, carbs_g=10, fiber_g=1,
+                                   created_at=timezone.datetime(d.year, d.month, d.day, 12, 0, tzinfo=tz))
+        self.client.login(username='budget', password='pw')
+        self.client.get('/history/?days=30')  # first render fills running totals for every day
+
+        for days in (7, 14, 30):
+            with self.assertNumQueries(self.BUDGET):
+                resp = self.client.get(f'/history/?days={days}')
+            self.assertEqual(resp.context['goal_hit_rate'], 100.0)
+            self.assertEqual(resp.context['days_with_data'], days)
+
+
+class RunningTotalsTests(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+        from .timezones import local_today, user_timezone
+        self.user = User.objects.create_user(username='running', password='pw')
+        tz = user_timezone(self.user)
+        self.today = local_today(tz)
+        self.days = [self.today - timezone.timedelta(days=i) for i in range(3)]
+        # per day: 500 + 800 + 900 kcal; the goal (2000) is crossed by the third meal
+        for d in self.days:
+            for hour, cal in ((8, 500), (13, 800), (20, 900)):
+                MealLog.objects.create(user=self.user, meal_name='m', calories=cal, protein_g=1, fat_g=1, carbs_g=1, fiber_g=0,
+                                       created_at=timezone.datetime(d.year, d.month, d.day, hour, 0, tzinfo=tz))
+
+    def _state(self):
+        return list(MealLog.objects.filter(user=self.user).order_by('local_date', 'created_at')
+                    .values_list('running_calories', 'day_goal_achieved'))
+
+    def test_range_recompute_is_one_read_and_one_write(self):
+        from .goals import recompute_running_totals
+        with self.assertNumQueries(2):
+            achieved = recompute_running_totals(self.user, self.days[-1], self.today, goal=2000)
+        self.assertEqual(achieved, {d: True for d in self.days})
+        self.assertEqual(self._state(), [(500, False), (1300, False), (2200, True)] * 3)
+        with self.assertNumQueries(1):  # nothing changed: no write
+            recompute_running_totals(self.user, self.days[-1], self.today, goal=2000)
+
+    def test_numpy_fallback_matches_window_function(self):
+        from unittest import mock
+        from django.db import connection
+        from .goals import recompute_running_totals
+        from .views import recompute_day_goal_for_date
+        with mock.patch.object(connection.features, 'supports_over_clause', False):
+            achieved = recompute_running_totals(self.user, self.days[-1], self.today, goal=2500)
+        self.assertEqual(achieved, {d: False for d in self.days})
+        self.assertEqual(self._state(), [(500, False), (1300, False), (2200, False)] * 3)
+        self.assertTrue(recompute_day_goal_for_date(self.user, self.today))  # profile without BMR -> 2000
+
+
+class GoalFlagMaintenanceTests(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+        from .timezones import local_today, user_timezone
+        self.user = User.objects.create_user(username='flags', password='pw')
+        tz = user_timezone(self.user)
+        today = local_today(tz)
+        # 1400 kcal on each of 5 days, far apart so several recompute chunks are needed
+        for i in range(5):
+            d = today - timezone.timedelta(days=i * 40)
+            MealLog.objects.create(user=self.user, meal_name='m', calories=1400, protein_g=1, fat_g=1, carbs_g=1, fiber_g=0,
+                                   created_at=timezone.datetime(d.year, d.month, d.day, 12, 0, tzinfo=tz))
+
+    def _achieved(self):
+        return list(MealLog.objects.filter(user=self.user).values_list('day_goal_achieved', flat=True).distinct())
+
+    def test_profile_change_recomputes_whole_history(self):
+        from .goals import recompute_user_history
+        recompute_user_history(self.user.pk, chunk_days=30)
+        self.assertEqual(self._achieved(), [False])  # default goal 2000
+
+        p = self.user.profile
+        p.age, p.height_cm, p.weight_kg, p.sex = 30, 160, 55, 'F'  # BMR ~1250
+        with self.settings(GOAL_RECOMPUTE_MODE='sync', GOAL_RECOMPUTE_CHUNK_DAYS=30), \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            p.save()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self._achieved(), [True])
+
+        # saving without touching the goal inputs schedules nothing
+        with self.captureOnCommitCallbacks() as callbacks:
+            p.save()
+        self.assertEqual(callbacks, [])
+
+    def test_thread_mode_coalesces_queued_users(self):
+        from unittest import mock
+        from . import goals
+        with self.settings(GOAL_RECOMPUTE_MODE='thread'), mock.patch.object(goals, 'get_executor') as get_executor:
+            self.assertTrue(goals.enqueue_history_recompute(self.user.pk))
+            self.assertFalse(goals.enqueue_history_recompute(self.user.pk))
+            self.assertEqual(get_executor.return_value.submit.call_count, 1)
+            goals._queued.discard(self.user.pk)
+
+    def test_backfill_command_reports_progress(self):
+        from io import StringIO
+        from django.core.management import call_command
+        MealLog.objects.filter(user=self.user).update(day_goal_achieved=True, running_calories=0)
+        out = StringIO()
+        call_command('backfill_goal_flags', '--processes', '1', '--chunk-days', '30', stdout=out)
+        self.assertEqual(self._achieved(), [False])
+        self.assertEqual(list(MealLog.objects.filter(user=self.user).values_list('running_calories', flat=True).distinct()), [1400])
+        self.assertIn('[1/1 users] 5 day(s) recomputed', out.getvalue())
@@ -0,0 +1,60 @@
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+DEFAULT_TIMEZONE = 'Asia/Kolkata'
+USER_TZ_KEY = 'user_tz:{}'
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    """ZoneInfo for an IANA name, falling back to DEFAULT_TIMEZONE for unknown or empty names."""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def is_valid_timezone(name):
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return False
+    return True
+
+
+def _user_id(user):
+    return getattr(user, 'pk', user)
+
+
+def user_timezone(user, fresh=False):
+    """The user's ZoneInfo (Profile.timezone).
+
+    Cached for USER_TZ_CACHE_TTL seconds so repeat reads cost no queries; `fresh`
+    reads the profile (and refreshes the cache) for writes that must not use a zone
+    another worker has already changed.
+    """
+    user_id = _user_id(user)
+    key = USER_TZ_KEY.format(user_id)
+    name = None if fresh else cache.get(key)
+    if name is None:
+        from .models import Profile
+        name = Profile.objects.filter(user_id=user_id).values_list('timezone', flat=True).first() or DEFAULT_TIMEZONE
+        cache.set(key, name, getattr(settings, 'USER_TZ_CACHE_TTL', 60))
+    return get_zone(name)
+
+
+def forget_user_timezone(user):
+    cache.delete(USER_TZ_KEY.format(_user_id(user)))
+
+
+def local_date(dt, tz):
+    return timezone.localtime(dt, tz).date()
+
+
+def local_today(tz):
+    return timezone.localtime(timezone.now(), tz).date()
+
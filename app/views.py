@@ -1,14 +1,14 @@
-from django.shortcuts import render, redirect
-from django.core.files.storage import FileSystemStorage
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
 from django.utils.timezone import now
-from .yolo import predict_foods
-from .recipe import get_recipe
-from .nutrition import (
-    calculate_nutrition_from_recipe,
-    calculate_nutrition_for_raw_ingredient
-)
-from .models import MealLog
+from .scan_jobs import submit_scan, is_expired
+from .warmer import warmer
+from .storage import media_storage
+from .nutrition import calculate_meal
+from .models import MealLog, ScanJob
 import json
 
 
@@ -32,11 +32,12 @@ def pricing(request):
         {"name": "Team", "price": "$12/mo", "notes": ["Shared goals", "CSV export"]},
     ]
     return render(request, "pricing.html", {"plans": plans})
-from collections import OrderedDict
 from django.db.models import Sum
 from django.utils import timezone
-from zoneinfo import ZoneInfo
-from .logs import date_range_series, meal_type_breakdown, macros_totals, hourly_heatmap, calendar_heatmap, recent_logs
+from datetime import timezone as dt_timezone
+from .timezones import user_timezone
+from .analytics import day_flags, history_analytics
+from .goals import recompute_running_totals, user_goal
 
 
 @login_required
@@ -74,39 +75,39 @@ def dashboard(request):
         context['goal_total'] = goal_total
         context['goal_val'] = goal_val
 
-    # STEP 1: IMAGE UPLOAD → DETECT ITEMS
+    # A background scan started by a previous upload: show its result once it has finished
+    scan_token = request.session.get('scan_job')
+    if scan_token and request.method == "GET":
+        job = ScanJob.objects.filter(token=scan_token, user=request.user).first()
+        if job is None or job.finished or is_expired(job):
+            request.session.pop('scan_job', None)
+        if job is not None and job.status == ScanJob.DONE:
+            context['detected_items'] = job.foods
+            context['scan_count'] = len(job.foods)
+        elif job is not None and (job.status == ScanJob.FAILED or is_expired(job)):
+            context['detected_items'] = []
+            context['scan_error'] = job.error or 'Scan timed out'
+            context['scan_count'] = 0
+        elif job is not None:
+            context['scan_job'] = job.as_dict()
+
+    # STEP 1: IMAGE UPLOAD → QUEUE DETECTION (the page polls the job status)
+    # Several photos of one meal may be uploaded together; they are detected concurrently
     if request.method == "POST" and "image" in request.FILES:
-        image = request.FILES["image"]
+        images = request.FILES.getlist("image")[:settings.SCAN_MAX_IMAGES]
 
-        fs = FileSystemStorage()
-        filename = fs.save(image.name, image)
-        image_path = fs.path(filename)
+        # stored by content hash: re-uploading the same photo reuses the file
+        image_paths = [media_storage.save_upload(image)[0] for image in images]
 
-        try:
-            foods = predict_foods(image_path)
-            request.session['detected_items'] = foods
-            request.session['scan_count'] = len(foods)
-        except Exception as e:
-            # store a one-time scan error for display
-            request.session['detected_items'] = []
-            request.session['scan_error'] = str(e)
-            request.session['scan_count'] = 0
+        job = submit_scan(request.user, image_paths)
+        request.session['scan_job'] = str(job.token)
         return redirect('dashboard')
 
     # STEP 2: WEIGHTS SUBMITTED → CALCULATE + SAVE
     elif request.method == "POST" and "detected_items" in request.POST:
         foods = request.POST.getlist("detected_items")
 
-        items = []
-        total = {
-            "grams": 0,
-            "calories": 0,
-            "protein_g": 0,
-            "fat_g": 0,
-            "carbs_g": 0,
-            "fiber_g": 0
-        }
-
+        weighed = []
         for food in foods:
             raw = (request.POST.get(f"grams_{food}", "") or "").strip()
             # If the user left this field blank, skip it (do not count in totals)
@@ -120,37 +121,18 @@ def dashboard(request):
             # ignore zero or negative values
             if grams <= 0:
                 continue
+            weighed.append((food, grams))
 
-            recipe = get_recipe(food)
-            if recipe:
-                nutrition = calculate_nutrition_from_recipe(recipe, grams)
-            else:
-                nutrition = calculate_nutrition_for_raw_ingredient(food, grams)
-
-            if nutrition:
-                items.append({
-                    "food": food,
-                    "grams": grams,
-                    "nutrition": nutrition
-                })
-
-                # accumulate grams as well as nutrition totals
-                total["grams"] += grams
-                for k in ("calories","protein_g","fat_g","carbs_g","fiber_g"):
-                    total[k] += nutrition[k]
+        # resolve every food and its ingredients in a constant number of queries
+        meal_result = calculate_meal(weighed)
+        items = meal_result["items"]
+        total = meal_result["total"]
 
         # If the user submitted but left all weights blank / invalid, do not save an empty meal
         if not items:
             request.session['scan_error'] = 'No weights entered — nothing was saved. Leave fields blank to ignore detected items.'
             return redirect('dashboard')
 
-        # round totals
-        for k in total:
-            total[k] = round(total[k], 2)
-        # round totals
-        for k in total:
-            total[k] = round(total[k], 2)
-
         # Determine meal type (from form or default)
         meal_type = request.POST.get('meal_type', 'Other')
 
@@ -172,27 +154,16 @@ def dashboard(request):
 
         # Recompute whether the user's goal was achieved for this meal's date and update all logs for that day
         try:
-            tz = ZoneInfo('Asia/Kolkata')
-            local_date = timezone.localtime(meal.created_at, tz).date()
-            day_start = timezone.datetime(local_date.year, local_date.month, local_date.day, 0, 0, 0, tzinfo=tz)
-            day_end = day_start + timezone.timedelta(days=1)
+            local_date = meal.local_date
 
             # Determine user's goal (BMR-based if available)
-            goal_val = 2000
-            try:
-                profile = getattr(request.user, 'profile', None)
-                bmr = profile.bmr() if profile else None
-                if bmr:
-                    goal_val = int(bmr)
-            except Exception:
-                goal_val = 2000
-
-            day_total = MealLog.objects.filter(user=request.user, created_at__gte=day_start, created_at__lt=day_end).aggregate(total=Sum('calories'))['total'] or 0
+            goal_val = user_goal(request.user)
+
+            day_total = MealLog.objects.filter(user=request.user, local_date=local_date).aggregate(total=Sum('calories'))['total'] or 0
             # Check whether the day was already marked as achieved before this save
-            prev_achieved = MealLog.objects.filter(user=request.user, created_at__gte=day_start, created_at__lt=day_end, day_goal_achieved=True).exists()
-            # Consider goal reached when daily total is >= the goal
-            achieved = True if (day_total >= goal_val and day_total > 0) else False
-            MealLog.objects.filter(user=request.user, created_at__gte=day_start, created_at__lt=day_end).update(day_goal_achieved=achieved)
+            prev_achieved = MealLog.objects.filter(user=request.user, local_date=local_date, day_goal_achieved=True).exists()
+            # Refresh the day's running totals and flags; the day is achieved once its total reaches the goal
+            achieved = recompute_running_totals(request.user, local_date, goal=goal_val).get(local_date, False)
             # If this save crossed the goal (wasn't achieved before but is now), set a session flag to show a celebration modal
             if achieved and not prev_achieved:
                 request.session['goal_reached'] = True
@@ -209,42 +180,33 @@ def dashboard(request):
     return render(request, "dashboard.html", context)
 
 
+@login_required
+@require_POST
+def scan_warm(request):
+    """Pre-warm the detection Space when the upload form is shown (fire-and-forget)."""
+    started = warmer.prewarm()
+    return JsonResponse({'state': warmer.state, 'started': started})
+
+
+@login_required
+def scan_status(request, token):
+    """JSON status of a background scan job (polled by the dashboard)."""
+    job = get_object_or_404(ScanJob, token=token, user=request.user)
+    data = job.as_dict()
+    if is_expired(job):
+        data.update(status=ScanJob.FAILED, error='Scan timed out')
+    return JsonResponse(data)
+
+
 # helper: recompute the day_goal_achieved flag for a specific date for a user
 def recompute_day_goal_for_date(user, d):
     """Recompute running_calories and day_goal_achieved flags for all MealLog rows for a given user/date.
-    - Builds per-day chronological running totals.
+    - Builds per-day chronological running totals (one window-function query, see app.goals).
     - Once running total reaches/exceeds the user's goal, marks that row and all subsequent rows for that day as achieved.
     Returns True if the day is achieved, False otherwise.
     """
     try:
-        tz = ZoneInfo('Asia/Kolkata')
-        day_start = timezone.datetime(d.year, d.month, d.day, 0, 0, 0, tzinfo=tz)
-        day_end = day_start + timezone.timedelta(days=1)
-
-        # determine the goal for the user (BMR if available)
-        goal_val = 2000
-        try:
-            profile = getattr(user, 'profile', None)
-            bmr = profile.bmr() if profile else None
-            if bmr:
-                goal_val = int(bmr)
-        except Exception:
-            goal_val = 2000
-
-        # iterate logs in chronological order, compute running total and set flags
-        day_logs = list(MealLog.objects.filter(user=user, created_at__gte=day_start, created_at__lt=day_end).order_by('created_at'))
-        running = 0.0
-        achieved_once = False
-        for ml in day_logs:
-            running += float(ml.calories or 0)
-            # mark achieved once running >= goal_val
-            if not achieved_once and running >= goal_val and running > 0:
-                achieved_once = True
-            ml.running_calories = round(running, 2)
-            ml.day_goal_achieved = bool(achieved_once)
-            ml.save()
-
-        return bool(achieved_once)
+        return recompute_running_totals(user, d, goal=user_goal(user)).get(d, False)
     except Exception:
         return False
     
@@ -260,67 +222,35 @@ def history(request):
     if days_param not in (7, 14, 30):
         days_param = 30
 
-    tz = ZoneInfo('Asia/Kolkata')
+    tz = user_timezone(request.user)
     today = timezone.localtime(now(), tz).date()
     # compute start_date for requested range (inclusive)
     start_date = today - timezone.timedelta(days=days_param-1)
 
-    logs = list(MealLog.objects.filter(user=request.user).order_by("-created_at"))
-    # logs within the requested range (used for list display and CSV export)
-    logs_in_range = [l for l in logs if start_date <= timezone.localtime(l.created_at, tz).date() <= today]
-
-    # annotate each log with a localized timestamp (Asia/Kolkata) and compute meal type
-    MEAL_ICONS = {'Breakfast':'🍳','Lunch':'🍛','Dinner':'🍽','Snack':'🍪','Other':'🍽'}
-    IST = ZoneInfo('Asia/Kolkata')
-    UTC = ZoneInfo('UTC')
-    for _l in logs:
+    # Ensure running_calories and day_goal_achieved are computed for each day in the range
+    # (this handles cases where logs were added/updated without triggering recompute);
+    # totals, pending rows and achieved flags for every day come from one grouped query
+    flags = day_flags(request.user, start_date, today)
+    # recompute when there are logs with positive calories but running_calories still zero;
+    # all such days are recomputed together in one ranged pass
+    stale = [d for d, row in flags.items() if (row['calories'] or 0) > 0 and row['pending']]
+    if stale:
         try:
-            dt = _l.created_at
-            # if naive, assume it's stored in UTC and make it aware
-            if timezone.is_naive(dt):
-                dt = timezone.make_aware(dt, UTC)
-            # convert to India time
-            _l.local_created = dt.astimezone(IST)
+            achieved = recompute_running_totals(request.user, min(stale), max(stale), goal=user_goal(request.user))
+            for d in stale:
+                flags[d]['achieved'] = achieved.get(d, False)
         except Exception:
-            _l.local_created = _l.created_at
+            pass
 
-        # rule-based meal type per local time
-        try:
-            hh = _l.local_created.hour
-            if 4 <= hh < 11:
-                _l.computed_type = 'Breakfast'
-            elif 11 <= hh < 15:
-                _l.computed_type = 'Lunch'
-            elif 15 <= hh < 18:
-                _l.computed_type = 'Snack'
-            elif 18 <= hh < 23:
-                _l.computed_type = 'Dinner'
-            else:
-                _l.computed_type = 'Other'
-        except Exception:
-            _l.computed_type = getattr(_l, 'meal_type', 'Other') or 'Other'
-        _l.computed_icon = MEAL_ICONS.get(_l.computed_type, '🍽')
-
-    # today's totals
-    today_logs = [l for l in logs if timezone.localtime(l.created_at, tz).date() == today]
-    total_today = {
-        "calories": round(sum(l.calories for l in today_logs), 2),
-        "protein_g": round(sum(l.protein_g for l in today_logs), 2),
-        "fat_g": round(sum(l.fat_g for l in today_logs), 2),
-        "carbs_g": round(sum(l.carbs_g for l in today_logs), 2),
-        "fiber_g": round(sum(l.fiber_g for l in today_logs), 2),
-    }
+    # one pass over the window (and the previous period) fills every chart, list and total below
+    stats = history_analytics(request.user, days_param, today=today, tz=tz)
+    # logs within the requested range (used for list display and CSV export), newest first
+    logs_in_range = stats['logs']
+    total_today = stats['total_today']
+    series = stats['series']
 
     # Default goal is 2000 kcal/day; if the user has a profile with a BMR estimate, use that as their personal goal
-    goal = 2000
-    try:
-        profile = getattr(request.user, 'profile', None)
-        bmr = profile.bmr() if profile else None
-        if bmr:
-            goal = int(bmr)
-    except Exception:
-        # keep default goal
-        goal = 2000
+    goal = user_goal(request.user)
 
     if total_today["calories"] <= goal:
         status = "under"
@@ -332,91 +262,6 @@ def history(request):
     # Remaining calories to reach today's goal (non-negative)
     remaining_goal = max(0, round(goal - total_today["calories"], 2))
 
-    # MEALS grouped by date for the detailed list (only include logs inside the selected range)
-    grouped = OrderedDict()
-    for log in logs_in_range:
-        d = timezone.localtime(log.created_at, tz).date()
-        grouped.setdefault(d, []).append(log)
-
-    days = []
-    MEAL_ICONS = {'Breakfast':'🍳','Lunch':'🍛','Dinner':'🍽','Snack':'🍪','Other':'🍽'}
-    for d, items in grouped.items():
-        meals = []
-        for log in items:
-            try:
-                parsed_items = json.loads(log.items_json) if log.items_json else []
-            except Exception:
-                parsed_items = []
-            hints = []
-            if log.calories and (log.protein_g * 4) < (log.calories * 0.1):
-                hints.append('⚠️ Low protein')
-            if log.calories and (log.fat_g * 9) > (log.calories * 0.35):
-                hints.append('⚠️ High fat')
-
-            lt = timezone.localtime(log.created_at, tz)
-            hour = lt.hour
-            if 4 <= hour < 11:
-                computed_type = 'Breakfast'
-            elif 11 <= hour < 15:
-                computed_type = 'Lunch'
-            elif 15 <= hour < 18:
-                computed_type = 'Snack'
-            elif 18 <= hour < 23:
-                computed_type = 'Dinner'
-            else:
-                computed_type = getattr(log, 'meal_type', 'Other') or 'Other'
-
-            meals.append({
-                'log': log,
-                'items': parsed_items,
-                'hints': hints,
-                'icon': MEAL_ICONS.get(computed_type, '🍽'),
-                'computed_type': computed_type,
-                'local_time': lt.strftime('%H:%M (%Z)')
-            })
-
-        day_total = {
-            'date': d,
-            'items': meals,
-            'total': {
-                'calories': round(sum(i['log'].calories for i in meals), 2),
-                'protein_g': round(sum(i['log'].protein_g for i in meals), 2),
-                'fat_g': round(sum(i['log'].fat_g for i in meals), 2),
-                'carbs_g': round(sum(i['log'].carbs_g for i in meals), 2),
-                'fiber_g': round(sum(i['log'].fiber_g for i in meals), 2),
-            }
-        }
-        days.append(day_total)
-
-    # build timeseries for requested range (oldest->newest)
-    start_date = today - timezone.timedelta(days=days_param-1)
-    date_range = [(start_date + timezone.timedelta(days=i)) for i in range(days_param)]
-
-    # Ensure running_calories and day_goal_achieved are computed for each day in the range
-    # (this handles cases where logs were added/updated without triggering recompute)
-    for d in date_range:
-        try:
-            day_start = timezone.datetime(d.year, d.month, d.day, 0, 0, 0, tzinfo=tz)
-            day_end = day_start + timezone.timedelta(days=1)
-            day_qs = MealLog.objects.filter(user=request.user, created_at__gte=day_start, created_at__lt=day_end)
-            total = day_qs.aggregate(total=Sum('calories'))['total'] or 0
-            # recompute when there are logs with positive calories but running_calories still zero
-            if total > 0 and day_qs.filter(running_calories=0).exists():
-                recompute_day_goal_for_date(request.user, d)
-        except Exception:
-            pass
-
-    series = []
-    for d in date_range:
-        day_logs = [l for l in logs if timezone.localtime(l.created_at, tz).date() == d]
-        series.append({
-            'date': d,
-            'calories': round(sum(l.calories for l in day_logs), 2),
-            'protein_g': round(sum(l.protein_g for l in day_logs), 2),
-            'fat_g': round(sum(l.fat_g for l in day_logs), 2),
-            'carbs_g': round(sum(l.carbs_g for l in day_logs), 2),
-        })
-
     total_calories = round(sum(s['calories'] for s in series), 2)
     avg_calories = round(total_calories / days_param, 2) if days_param > 0 else 0
 
@@ -424,15 +269,7 @@ def history(request):
     days_with_data = sum(1 for s in series if s['calories'] > 0)
 
     # Count days where the per-day goal was achieved (using the day_goal_achieved flag stored on MealLog)
-    days_achieved = 0
-    for d in date_range:
-        try:
-            day_start = timezone.datetime(d.year, d.month, d.day, 0, 0, 0, tzinfo=tz)
-            day_end = day_start + timezone.timedelta(days=1)
-            if MealLog.objects.filter(user=request.user, created_at__gte=day_start, created_at__lt=day_end, day_goal_achieved=True).exists():
-                days_achieved += 1
-        except Exception:
-            continue
+    days_achieved = sum(1 for row in flags.values() if row['achieved'])
 
     # Hit rate over days with logged calories only (exclude days without logs)
     goal_hit_rate = round(days_achieved / days_with_data * 100, 1) if days_with_data > 0 else 0
@@ -440,35 +277,13 @@ def history(request):
     max_daily_calories = max((s['calories'] for s in series), default=0)
 
     # previous period comparison
-    prev_start = start_date - timezone.timedelta(days=days_param)
-    prev_end = start_date - timezone.timedelta(days=1)
-    prev_total = 0
-    for l in logs:
-        ld = timezone.localtime(l.created_at, tz).date()
-        if ld >= prev_start and ld <= prev_end:
-            prev_total += l.calories
-    prev_total = round(prev_total, 2)
+    prev_total = stats['prev_total']
     pct_change = None
     if prev_total > 0:
         pct_change = round(((total_calories - prev_total) / prev_total) * 100, 1)
 
-    # meal-type breakdown for range (rule-based by local time)
-    meal_type_items = meal_type_breakdown(request.user, start_date)  # returns sorted list of (label, calories)
-
-    # macros totals for range
-    macros_totals = {'protein_g': 0, 'fat_g': 0, 'carbs_g': 0}
-    for l in logs:
-        ld = timezone.localtime(l.created_at, tz).date()
-        if ld < start_date: continue
-        macros_totals['protein_g'] += l.protein_g
-        macros_totals['fat_g'] += l.fat_g
-        macros_totals['carbs_g'] += l.carbs_g
-
-    # calendar heatmap (LeetCode-style monthly view — daily totals for the requested range)
-    cal_heat = calendar_heatmap(request.user, days=days_param)
-
     # recent logs (limit) — limited to the selected range
-    recent_logs = list(logs_in_range[:50])
+    recent_logs = logs_in_range[:50]
 
     # expose profile BMR and a simple TDEE suggestion (sedentary 1.2 multiplier) when available
     profile_bmr = None
@@ -500,12 +315,12 @@ def history(request):
         'goal_hit_rate': goal_hit_rate,
         'status': status,
         'diff': diff,
-        'days': days,
+        'days': stats['days'],
         'series': series,            # requested series for charts
         'series_days': days_param,
-        'meal_type_items': meal_type_items,
-        'macros_totals': macros_totals,
-        'calendar_heatmap': cal_heat,
+        'meal_type_items': stats['meal_type_items'],
+        'macros_totals': stats['macros_totals'],
+        'calendar_heatmap': stats['calendar_heatmap'],
         'remaining_goal': remaining_goal,
         'weekly_max_adj': max(100, round(max((s['calories'] for s in series), default=0) * 1.1, 2)),
         'days_with_data': days_with_data,
@@ -526,25 +341,24 @@ def analytics(request):
 #Analytics_Logs
 @login_required
 def analytics_logs(request):
-    tz = ZoneInfo('Asia/Kolkata')
+    tz = user_timezone(request.user)
     qdate = request.GET.get('date')
     logs_qs = list(MealLog.objects.filter(user=request.user).order_by('-created_at'))
     if qdate:
         try:
             from datetime import datetime
             d = datetime.strptime(qdate, '%Y-%m-%d').date()
-            logs_qs = [l for l in logs_qs if timezone.localtime(l.created_at, tz).date() == d]
+            logs_qs = [l for l in logs_qs if l.local_date == d]
         except Exception:
             pass
     # annotate with localized timestamps
-    IST = ZoneInfo('Asia/Kolkata')
-    UTC = ZoneInfo('UTC')
+    UTC = dt_timezone.utc
     for _l in logs_qs:
         try:
             dt = _l.created_at
             if timezone.is_naive(dt):
                 dt = timezone.make_aware(dt, UTC)
-            _l.local_created = dt.astimezone(IST)
+            _l.local_created = dt.astimezone(tz)
         except Exception:
             _l.local_created = _l.created_at
         # computed meal type
@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+
+import requests
+
+from . import metrics
+from .yolo import YOLO_API_URL, YOLO_API_CONNECT_TIMEOUT, get_session
+
+logger = logging.getLogger(__name__)
+
+
+def _build_health_url(base_url: str) -> str:
+    base = base_url.rstrip('/')
+    if base.endswith('/predict'):
+        base = base[:-len('/predict')]
+    return base + '/'
+
+
+# Endpoint pinged to keep the Space awake; any non-5xx answer means it is up
+YOLO_HEALTH_URL = os.environ.get('YOLO_HEALTH_URL', '') or _build_health_url(YOLO_API_URL)
+# Default seconds between pings of `manage.py warm_yolo` (0 = its own default of 300)
+YOLO_WARM_INTERVAL = float(os.environ.get('YOLO_WARM_INTERVAL', '0'))
+# A ping slower than this (or a 503 while the Space boots) counts as a cold start
+YOLO_COLD_THRESHOLD = float(os.environ.get('YOLO_COLD_THRESHOLD', '5'))
+# Dashboard pre-warms are skipped if the Space was pinged less than this many seconds ago
+YOLO_PREWARM_MIN_GAP = float(os.environ.get('YOLO_PREWARM_MIN_GAP', '60'))
+YOLO_WARM_TIMEOUT = float(os.environ.get('YOLO_WARM_TIMEOUT', '90'))
+
+
+class SpaceWarmer:
+    """Keeps the remote detection Space awake and tracks whether it is warm.
+
+    - `ping()` requests the health URL once and classifies the Space as warm, cold
+      (slow answer or 503 while booting) or down (connection error / 5xx).
+    - `prewarm()` fires a ping in the background unless one ran recently or is in flight.
+    - `start(interval)` runs a daemon thread pinging on a schedule.
+    """
+    UNKNOWN = 'unknown'
+    WARM = 'warm'
+    COLD = 'cold'
+    DOWN = 'down'
+
+    def __init__(self, url=None, cold_threshold=None, min_gap=None):
+        self.url = url or YOLO_HEALTH_URL
+        self.cold_threshold = YOLO_COLD_THRESHOLD if cold_threshold is None else cold_threshold
+        self.min_gap = YOLO_PREWARM_MIN_GAP if min_gap is None else min_gap
+        self._lock = threading.Lock()
+        self._in_flight = False
+        self._thread = None
+        self._stop = threading.Event()
+        self.state = self.UNKNOWN
+        self.last_ping_at = None
+        self.last_latency = None
+        self.pings = 0
+        self.cold_starts = 0
+        self.failures = 0
+        self.prewarms = 0
+
+    def ping(self):
+        """Ping the Space once and return the resulting state."""
+        started = time.monotonic()
+        try:
+            resp = get_session().get(self.url, timeout=(YOLO_API_CONNECT_TIMEOUT, YOLO_WARM_TIMEOUT))
+            status = resp.status_code
+        except requests.exceptions.RequestException as e:
+            logger.info('Warm-up ping to %s failed: %s', self.url, e)
+            status = None
+        latency = time.monotonic() - started
+        with self._lock:
+            self.pings += 1
+            self.last_ping_at = time.time()
+            self.last_latency = latency
+            if status is None or (status >= 500 and status != 503):
+                self.failures += 1
+                self.state = self.DOWN
+            elif status == 503 or latency >= self.cold_threshold:
+                # the Space was asleep (or still booting): this ping paid the cold start
+                self.cold_starts += 1
+                self.state = self.COLD
+            else:
+                self.state = self.WARM
+            return self.state
+
+    def prewarm(self):
+        """Ping in the background unless a ping ran recently or is running. Returns True if one was started."""
+        with self._lock:
+            recent = self.last_ping_at is not None and time.time() - self.last_ping_at < self.min_gap
+            if self._in_flight or (recent and self.state == self.WARM):
+                return False
+            self._in_flight = True
+            self.prewarms += 1
+        threading.Thread(target=self._prewarm, name='yolo-prewarm', daemon=True).start()
+        return True
+
+    def _prewarm(self):
+        try:
+            self.ping()
+        finally:
+            with self._lock:
+                self._in_flight = False
+
+    def start(self, interval):
+        """Start the background pinger (idempotent)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self._thread
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name='yolo-warmer', daemon=True)
+            self._thread.start()
+            return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, interval):
+        while not self._stop.is_set():
+            self.ping()
+            self._stop.wait(interval)
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'url': self.url,
+            'last_latency_ms': round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+            'seconds_since_ping': round(time.time() - self.last_ping_at, 1) if self.last_ping_at else None,
+            'pings': self.pings,
+            'cold_starts': self.cold_starts,
+            'failures': self.failures,
+            'prewarms': self.prewarms,
+            'background': bool(self._thread and self._thread.is_alive()),
+        }
+
+
+warmer = SpaceWarmer()
+metrics.register('yolo_warmer', warmer.stats)
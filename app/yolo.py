@@ -1,6 +1,14 @@
 import os
+import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+from .imaging import prepare_image
+from .resilience import CircuitBreaker, Counters, RetryBudget, LatencyWindow
 
 logger = logging.getLogger(__name__)
 
@@ -9,6 +17,20 @@ logger = logging.getLogger(__name__)
 YOLO_API_URL = os.environ.get('YOLO_API_URL', 'https://amashtce-food-yolo-api.hf.space')
 YOLO_API_TIMEOUT = int(os.environ.get('YOLO_API_TIMEOUT', '30'))
 YOLO_API_MAX_RETRIES = int(os.environ.get('YOLO_API_MAX_RETRIES', '3'))
+# Separate connect/read timeouts (seconds); read defaults to YOLO_API_TIMEOUT
+YOLO_API_CONNECT_TIMEOUT = float(os.environ.get('YOLO_API_CONNECT_TIMEOUT', '5'))
+YOLO_API_READ_TIMEOUT = float(os.environ.get('YOLO_API_READ_TIMEOUT', str(YOLO_API_TIMEOUT)))
+# Total time budget for one scan, covering every retry and backoff sleep
+YOLO_API_DEADLINE = float(os.environ.get('YOLO_API_DEADLINE', '45'))
+# Keep-alive connection pool size of the per-process session
+YOLO_API_POOL_SIZE = int(os.environ.get('YOLO_API_POOL_SIZE', '10'))
+# Circuit breaker: consecutive failures before opening, seconds before a half-open trial
+YOLO_CB_FAILURES = int(os.environ.get('YOLO_CB_FAILURES', '5'))
+YOLO_CB_RESET = float(os.environ.get('YOLO_CB_RESET', '30'))
+# Retries allowed per first attempt across the process (token bucket ratio)
+YOLO_RETRY_BUDGET = float(os.environ.get('YOLO_RETRY_BUDGET', '0.2'))
+# Fire a second identical request if the first has not answered after this many seconds (0 = off)
+YOLO_HEDGE_AFTER = float(os.environ.get('YOLO_HEDGE_AFTER', '0'))
 
 
 class YOLOApiError(Exception):
@@ -22,6 +44,122 @@ def _build_predict_url(base_url: str) -> str:
     return base_url.rstrip('/') + '/predict'
 
 
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the per-process pooled keep-alive session used for YOLO API calls."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=YOLO_API_POOL_SIZE, pool_maxsize=YOLO_API_POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+breaker = CircuitBreaker(failure_threshold=YOLO_CB_FAILURES, recovery_timeout=YOLO_CB_RESET)
+retry_budget = RetryBudget(ratio=YOLO_RETRY_BUDGET)
+latency = LatencyWindow()
+hedge_stats = Counters('fired', 'won')
+
+_hedge_pool = None
+
+
+def _get_hedge_pool():
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _session_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(max_workers=YOLO_API_POOL_SIZE, thread_name_prefix='yolo-hedge')
+    return _hedge_pool
+
+
+def _post(session, url, prepared, timeout):
+    files = {'file': (prepared.filename, prepared.data, prepared.content_type)}
+    return session.post(url, files=files, timeout=timeout)
+
+
+def _send(session, url, prepared, timeout):
+    """POST once, or hedge: if no answer within YOLO_HEDGE_AFTER, race a second copy and take the first success."""
+    if YOLO_HEDGE_AFTER <= 0:
+        return _post(session, url, prepared, timeout)
+    pool = _get_hedge_pool()
+    first = pool.submit(_post, session, url, prepared, timeout)
+    done, _ = wait([first], timeout=YOLO_HEDGE_AFTER)
+    if done:
+        return first.result()
+    hedge_stats.incr('fired')
+    second = pool.submit(_post, session, url, prepared, timeout)
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.exception() is None:
+                if fut is second:
+                    hedge_stats.incr('won')
+                return fut.result()
+            error = fut.exception()
+    raise error
+
+
+def _attempt(session, url, prepared, timeout):
+    """One POST under a slot reserved by `breaker.allow()`; settles the slot however it exits.
+
+    Responses and requests errors are recorded as the upstream outcome (5xx and
+    transport errors count as failures). Any other exception hands a half-open trial
+    slot back, so the breaker cannot stay stuck waiting for a result.
+    """
+    started = time.monotonic()
+    ok = None
+    try:
+        resp = _send(session, url, prepared, timeout)
+        ok = resp.status_code < 500
+        return resp
+    except requests.exceptions.RequestException:
+        ok = False
+        raise
+    finally:
+        if ok is None:
+            breaker.release()
+        else:
+            latency.record(time.monotonic() - started, ok=ok)
+            if ok:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+
+
+def yolo_stats():
+    return {
+        'circuit': breaker.stats(),
+        'retry_budget': retry_budget.stats(),
+        'latency': latency.stats(),
+        'hedges': hedge_stats.stats(),
+    }
+
+
+metrics.register('yolo', yolo_stats)
+
+
+def dedupe_foods(foods):
+    """Normalize and deduplicate detected labels while preserving order."""
+    seen = set()
+    out = []
+    for f in foods:
+        s = str(f).strip()
+        if not s or s in seen:
+            continue
+        seen.add(s)
+        out.append(s)
+    return out
+
+
 def predict_foods(image_path):
     """
     POST the image file to the remote YOLO API (field name `file`) and return the
@@ -29,43 +167,46 @@ def predict_foods(image_path):
     if parsing fails.
     """
     url = _build_predict_url(YOLO_API_URL)
+    deadline = time.monotonic() + YOLO_API_DEADLINE
+    session = get_session()
+    retry_budget.deposit()
     try:
-        with open(image_path, 'rb') as fh:
-            files = {'file': (os.path.basename(image_path), fh, 'application/octet-stream')}
-            # Retry loop for transient network issues
-            last_exc = None
-            for attempt in range(1, YOLO_API_MAX_RETRIES+1):
-                try:
-                    resp = requests.post(url, files=files, timeout=YOLO_API_TIMEOUT)
-                    if resp.status_code != 200:
-                        raise YOLOApiError(f'YOLO API returned status {resp.status_code}: {resp.text[:500]}')
-                    data = resp.json()
-                    break
-                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-                    logger.warning('YOLO API request attempt %s failed: %s', attempt, e)
-                    last_exc = e
-                    if attempt < YOLO_API_MAX_RETRIES:
-                        import time
-                        time.sleep(2 ** (attempt-1))
-                        continue
-                    raise YOLOApiError(f'YOLO API request failed after {YOLO_API_MAX_RETRIES} attempts: {e}')
-                except ValueError as e:
-                    # JSON parse error
-                    raise YOLOApiError('YOLO API returned invalid JSON')
-            foods = data.get('foods', []) if isinstance(data, dict) else []
-            if not isinstance(foods, list):
-                raise YOLOApiError('YOLO API returned invalid payload')
-
-            # normalize and deduplicate while preserving order
-            seen = set()
-            out = []
-            for f in foods:
-                s = str(f).strip()
-                if not s or s in seen:
+        # decode/shrink once; the same in-memory buffer is posted on every retry
+        prepared = prepare_image(image_path)
+        # Retry loop for transient network issues, bounded by the total deadline
+        last_exc = None
+        for attempt in range(1, YOLO_API_MAX_RETRIES+1):
+            # checked before allow(): giving up here must not hold a half-open trial slot
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise YOLOApiError(f'YOLO API deadline of {YOLO_API_DEADLINE}s exceeded after {attempt-1} attempts: {last_exc}')
+            timeout = (min(YOLO_API_CONNECT_TIMEOUT, remaining), min(YOLO_API_READ_TIMEOUT, remaining))
+            if not breaker.allow():
+                raise YOLOApiError('YOLO API is unavailable (circuit open); please try again shortly')
+            try:
+                resp = _attempt(session, url, prepared, timeout)
+                if resp.status_code != 200:
+                    raise YOLOApiError(f'YOLO API returned status {resp.status_code}: {resp.text[:500]}')
+                data = resp.json()
+                break
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                logger.warning('YOLO API request attempt %s failed: %s', attempt, e)
+                last_exc = e
+                backoff = 2 ** (attempt-1)
+                if attempt < YOLO_API_MAX_RETRIES and time.monotonic() + backoff < deadline:
+                    if not retry_budget.withdraw():
+                        raise YOLOApiError(f'YOLO API request failed and the retry budget is exhausted: {e}')
+                    time.sleep(backoff)
                     continue
-                seen.add(s)
-                out.append(s)
-            return out
+                raise YOLOApiError(f'YOLO API request failed after {attempt} attempts: {e}')
+            except ValueError as e:
+                # JSON parse error
+                raise YOLOApiError('YOLO API returned invalid JSON')
+        foods = data.get('foods', []) if isinstance(data, dict) else []
+        if not isinstance(foods, list):
+            raise YOLOApiError('YOLO API returned invalid payload')
+
+        return dedupe_foods(foods)
 
     except requests.exceptions.RequestException as e:
         logger.warning('YOLO API request failed: %s', e)
@@ -147,3 +147,63 @@ SERVE_DATA_LOCALLY = os.environ.get('SERVE_DATA_LOCALLY', '1') in ('1','true','T
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
+
+# Shared cache used for the version counters of the in-process lookup tables, user timezones
+# and streaks. The default LocMemCache is private to each process: with several web workers,
+# or with management commands editing data, point it at a shared backend, e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# In-process caches and metrics
+# Seconds after which the in-memory nutrition table is reloaded even if no version bump was seen
+NUTRITION_TABLE_MAX_AGE = int(os.environ.get('NUTRITION_TABLE_MAX_AGE', '60'))
+# Same bound for the detected label -> recipe/ingredient alias index
+ALIAS_INDEX_MAX_AGE = int(os.environ.get('ALIAS_INDEX_MAX_AGE', '60'))
+RECIPE_CACHE_SIZE = int(os.environ.get('RECIPE_CACHE_SIZE', '512'))
+RECIPE_CACHE_TTL = int(os.environ.get('RECIPE_CACHE_TTL', '300'))
+# Seconds a user's streak stays cached before it is re-read from their profile
+STREAK_CACHE_TTL = int(os.environ.get('STREAK_CACHE_TTL', '3600'))
+# Seconds a user's timezone stays cached for reads (meal saves always read it from the profile)
+USER_TZ_CACHE_TTL = int(os.environ.get('USER_TZ_CACHE_TTL', '60'))
+# Bearer token for scraping /metrics/ without a staff session (empty = staff only)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Detection result cache (keyed by image SHA-256)
+DETECTION_CACHE_TTL = int(os.environ.get('DETECTION_CACHE_TTL', str(7 * 24 * 3600)))
+# Size budget of the stored results, least recently used rows are evicted first
+DETECTION_CACHE_MAX_BYTES = int(os.environ.get('DETECTION_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+# Stores between budget checks when the running size estimate is under budget
+DETECTION_CACHE_EVICT_EVERY = int(os.environ.get('DETECTION_CACHE_EVICT_EVERY', '100'))
+
+# Background scan jobs: 'thread' (in-process pool), 'worker' (manage.py scan_worker) or 'sync'
+SCAN_JOBS_MODE = os.environ.get('SCAN_JOBS_MODE', 'thread')
+SCAN_JOB_WORKERS = int(os.environ.get('SCAN_JOB_WORKERS', '4'))
+# Seconds before a pending/running job is reported as timed out, and how long finished jobs are kept
+SCAN_JOB_TIMEOUT = int(os.environ.get('SCAN_JOB_TIMEOUT', '120'))
+SCAN_JOB_RETENTION = int(os.environ.get('SCAN_JOB_RETENTION', str(24 * 3600)))
+# Multi-photo scans: most images per upload and how many are detected at once
+SCAN_MAX_IMAGES = int(os.environ.get('SCAN_MAX_IMAGES', '4'))
+SCAN_IMAGE_CONCURRENCY = int(os.environ.get('SCAN_IMAGE_CONCURRENCY', '3'))
+# Goal-flag recompute after a profile change: 'thread' (in-process), 'sync' or 'off', in chunks of N local days
+GOAL_RECOMPUTE_MODE = os.environ.get('GOAL_RECOMPUTE_MODE', 'thread')
+GOAL_RECOMPUTE_CHUNK_DAYS = int(os.environ.get('GOAL_RECOMPUTE_CHUNK_DAYS', '90'))
+
+# Detection backend: 'remote' (YOLO Space over HTTP), 'stub' (deterministic fake) or 'local' (in-process model)
+DETECTION_BACKEND = os.environ.get('DETECTION_BACKEND', 'remote')
+DETECTION_MODEL_PATH = os.environ.get('DETECTION_MODEL_PATH', '')
+# 'local' backend: images per inference call, and how long to wait for a batch to fill
+DETECTION_BATCH_SIZE = int(os.environ.get('DETECTION_BATCH_SIZE', '8'))
+DETECTION_BATCH_WAIT_MS = float(os.environ.get('DETECTION_BATCH_WAIT_MS', '10'))
+# 'stub' backend: simulated inference time in seconds
+DETECTION_STUB_LATENCY = float(os.environ.get('DETECTION_STUB_LATENCY', '0'))
+
+# Uploaded scan images: content-addressed under MEDIA_ROOT/<MEDIA_SCANS_DIR>/ab/cd/<sha256>.<ext>
+MEDIA_SCANS_DIR = os.environ.get('MEDIA_SCANS_DIR', 'scans')
+# `manage.py gc_media` deletes images older than MEDIA_RETENTION seconds, and unreferenced ones after MEDIA_GC_GRACE
+MEDIA_RETENTION = int(os.environ.get('MEDIA_RETENTION', str(30 * 24 * 3600)))
+MEDIA_GC_GRACE = int(os.environ.get('MEDIA_GC_GRACE', '3600'))